@@ -1,19 +1,35 @@
+import os
 import sys
+import json
 
 from dash import Dash
 import dash_bootstrap_components as dbc
-from dash_bootstrap_templates import load_figure_template
 
 sys.path.append("./")
-from src.app.page.layout import init_layout
+from src.app.page.layout import init_layout, validation_layout
 from src.app.page.callbacks import init_callbacks
+from src.app.appdata import appdata
+from src.app.metrics import init_metrics
+from src.app.health import init_health
+from src.app.responses import init_responses
 
 
-load_figure_template("minty")
 app = Dash(external_stylesheets=[dbc.themes.MINTY])
 
+# Set first, so that Dash checks the callbacks against it rather than loading the data to call init_layout
+app.validation_layout = validation_layout()
 app.layout = init_layout
 init_callbacks(app)
+init_metrics(app.server, lambda: appdata.current().figure_cache)
+init_health(app.server)
+init_responses(app)
+# WSGI entry point for production servers, see gunicorn.conf.py
+server = app.server
 
 if __name__ == "__main__":
-    app.run_server(debug=True)
\ No newline at end of file
+    # With debug on, this process only restarts the server when the code changes - the server runs in a child process, that runs this again with WERKZEUG_RUN_MAIN set
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        if json.load(open("config.json")).get("FAST_START"):
+            appdata.warm_up()
+        appdata.start_reloader()
+    app.run(debug=True)
\ No newline at end of file
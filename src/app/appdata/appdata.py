@@ -1,30 +1,395 @@
+import os
 import sys
+import copy
+import json
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
 sys.path.append("./")
-from src.data_utils.transformer import DataTransformer
-from src.data_utils.extractor import DataExtractor
+from src.app.appdata.figure_cache import FigureCache
+from src.app.appdata.response_cache import ResponseCache
+from src.app import metrics
 
+# The data modules import pandas and plotly.express, which are only imported once the data is loaded, so that the server can start without waiting for them
+if TYPE_CHECKING:
+    from src.data_utils.transformer import DataTransformer
+    from src.data_utils.extractor import DataExtractor, KpiBundle
 
-transformer = DataTransformer()
-transformer.apply_transformations()
-extractor = DataExtractor(transformer.df)
 
-START, END = extractor.date_range()
-NUM_OF_DAYS = extractor.number_of_days()
-TOT_REVENUE = extractor.total_revenue()
-TOT_ORDERS = extractor.total_orders()
-TOT_ITEMS = extractor.total_items()
-DAILY_REVENUE = round(TOT_REVENUE / NUM_OF_DAYS, 2)
-DAILY_ORDERS = round(TOT_ORDERS / NUM_OF_DAYS, 2)
+# The KPIs and cached figures of the last load of the data, served at the next start while the data loads, see warm_up
+STARTUP_SNAPSHOT_PATH = "src/data/.cache/startup.pickle"
+# Bump whenever the KPIs or the cached figures change (e.g. fields are added to KpiBundle), so that a startup snapshot saved by older code is not served
+STARTUP_SNAPSHOT_VERSION = 4
 
-TOP_ORDERS_DATE, TOP_ORDERS_DATE_CT = extractor.best_datetime_performance("orders", "date")
-TOP_REVENUE_DATE, TOP_REVENUE_DATE_CT = extractor.best_datetime_performance("revenue", "date")
 
-TOP_ORDERS_DAY, TOP_ORDERS_DAY_CT = extractor.best_datetime_performance("orders", "weekday")
-TOP_REVENUE_DAY, TOP_REVENUE_DAY_CT = extractor.best_datetime_performance("revenue", "weekday")
+@dataclass(frozen=True)
+class Snapshot:
+    """Everything the dashboard serves for one load of the data. A snapshot is never modified once built - reloading the data builds a new snapshot and swaps it in, so a page load or callback that holds a snapshot sees consistent data throughout.
 
-TOP_ORDERS_MONTH, TOP_ORDERS_DAY_MONTH = extractor.best_datetime_performance("orders", "month")
-TOP_REVENUE_MONTH, TOP_REVENUE_MONTH_CT = extractor.best_datetime_performance("revenue", "month")
+    The transformer and extractor of a startup snapshot (see load_startup_snapshot) are stand-ins, that wait for the data to load on first use.
 
-TOP_ORDERS_COUNTRY, TOP_ORDERS_COUNTRY_CT = extractor.country_grouping("orders").agg(["idxmax", "max"])
-TOP_REVENUE_COUNTRY, TOP_REVENUE_COUNTRY_CT = extractor.country_grouping("revenue").agg(["idxmax", "max"])
\ No newline at end of file
+    The fingerprint identifies the configuration and data files the snapshot was loaded from (see _fingerprint), and the ETags of the responses served from it are derived from it, see response_cache.
+    """
+    transformer: "DataTransformer"
+    extractor: "DataExtractor"
+    kpis: "KpiBundle"
+    figure_cache: FigureCache
+    source_stat: tuple
+    fingerprint: str
+    response_cache: ResponseCache
+    client_data: dict|None = None
+
+
+class _Deferred:
+    """Stand-in for the transformer or extractor of a startup snapshot. Any use of it waits for the data to load, and is then passed on to the transformer or extractor of the loaded data.
+
+    Args:
+        name (str): Name of the stood-in attribute of Snapshot.
+    """
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def __getattr__(self, attribute: str):
+        if not _ready.is_set() and (_warmer is None or not _warmer.is_alive()):
+            # Nothing is loading the data - it failed to load in the background, or this is a process forked while it was loading (e.g. the job of a background callback) - so it is loaded here, raising the error if it fails again
+            with _lock:
+                if not _ready.is_set():
+                    _serve(build_snapshot())
+        _ready.wait()
+
+        return getattr(getattr(current(), self._name), attribute)
+
+
+def _stat(paths: list) -> tuple:
+    """Size and modification time of files.
+
+    Args:
+        paths (list): Paths of the files.
+
+    Returns:
+        tuple: Path, size and modification time of each file.
+    """
+    stats = []
+    for path in paths:
+        stat = os.stat(path)
+        stats.append((path, stat.st_size, stat.st_mtime_ns))
+
+    return tuple(stats)
+
+
+def _source_stat(transformer: "DataTransformer") -> tuple:
+    """Size and modification time of every configured data file.
+
+    Args:
+        transformer (DataTransformer): Transformer that loaded the data.
+
+    Returns:
+        tuple: Path, size and modification time of each data file, empty if the data is randomly generated.
+    """
+    return _stat(transformer.source_paths())
+
+
+def _fingerprint(config: dict) -> str:
+    """Identifies a configuration together with the size and modification time of its data files (or of the saved random data), without loading them. A startup snapshot is only served for the fingerprint it was saved under.
+
+    Args:
+        config (dict): Configuration, as in config.json.
+
+    Returns:
+        str: Hex digest of the configuration and data files.
+    """
+    from src.data_utils.transformer import DataTransformer, SAMPLE_PATH
+
+    paths = DataTransformer.config_source_paths(config)
+    if config["FILENAME"] is None:
+        paths = [SAMPLE_PATH] if os.path.isfile(SAMPLE_PATH) else []
+    key = json.dumps({"config": config, "files": _stat(paths)}, sort_keys=True)
+
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def build_snapshot(config: dict|None=None) -> Snapshot:
+    """Loads and transforms the data, and computes the KPIs, the date-range index (and figures, if "PRERENDER_FIGURES" is enabled, and the chart data held by the browser, if "CLIENT_DATA" is enabled) of the dashboard from it.
+
+    Args:
+        config (dict | None, optional): Configuration to use instead of config.json. Defaults to None.
+
+    Returns:
+        Snapshot: The loaded data.
+    """
+    from dash_bootstrap_templates import load_figure_template
+    from src.data_utils.transformer import DataTransformer
+    from src.data_utils.extractor import DataExtractor
+    from src.app.appdata.figures import prerender_figures, client_chart_data
+
+    # Themes every figure like the page. Set here, before any figure is built, rather than when the app is created, as it imports plotly
+    load_figure_template("minty")
+    config = config if config is not None else json.load(open("config.json"))
+    # Fingerprinted before loading, as the transformer merges the column overrides of a data file into its config - a startup snapshot is looked up by the configuration as loaded from config.json, see load_startup_snapshot
+    fingerprint = _fingerprint(config)
+    transformer = DataTransformer(config=copy.deepcopy(config))
+    source_stat = _source_stat(transformer)
+    transformer.apply_transformations()
+
+    extractor = metrics.instrument_extractor(DataExtractor(transformer.df, rollup=transformer.rollup, sketches=transformer.sketches))
+    # Built before serving, so that the workers of a preforked server share it, see gunicorn.conf.py
+    extractor.time_index()
+    if transformer.config.get("BACKGROUND_CALLBACKS"):
+        # Background callbacks run in forked processes, that would each build the cross-filter index for themselves
+        extractor.bitmap_index()
+    figure_cache = FigureCache(max_bytes=transformer.config.get("FIGURE_CACHE_MB", 64) * 1024**2)
+    if transformer.config.get("PRERENDER_FIGURES"):
+        prerender_figures(extractor, figure_cache)
+    client_data = None
+    if transformer.config.get("CLIENT_DATA"):
+        client_data = client_chart_data(extractor, figure_cache)
+
+    return Snapshot(
+        transformer=transformer,
+        extractor=extractor,
+        kpis=extractor.kpi_bundle(),
+        figure_cache=figure_cache,
+        source_stat=source_stat,
+        fingerprint=fingerprint,
+        response_cache=ResponseCache(max_bytes=transformer.config.get("RESPONSE_CACHE_MB", 16) * 1024**2),
+        client_data=client_data
+    )
+
+
+def save_startup_snapshot(snapshot: Snapshot) -> None:
+    """Saves the KPIs, cached figures and chart data of a snapshot, to be served at the next start while the data loads (see warm_up). The file is written to a temporary file first and then moved into place, so a reader never sees a partially written file.
+
+    Args:
+        snapshot (Snapshot): Snapshot of the loaded data.
+    """
+    state = {
+        "version": STARTUP_SNAPSHOT_VERSION,
+        "fingerprint": snapshot.fingerprint,
+        "kpis": snapshot.kpis,
+        "figures": snapshot.figure_cache.entries(),
+        "client_data": snapshot.client_data,
+        "source_stat": snapshot.source_stat
+    }
+    os.makedirs(os.path.dirname(STARTUP_SNAPSHOT_PATH), exist_ok=True)
+    tmp_path = f"{STARTUP_SNAPSHOT_PATH}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, STARTUP_SNAPSHOT_PATH)
+
+
+def load_startup_snapshot(config: dict) -> Snapshot|None:
+    """Loads the startup snapshot saved by the last load of the data (see save_startup_snapshot), if neither the configuration, the data files nor STARTUP_SNAPSHOT_VERSION have changed since. Its transformer and extractor are stand-ins that wait for the data to load, see _Deferred - so the page and every figure that was cached are served straight away, and anything else once the data has loaded.
+
+    Args:
+        config (dict): Configuration the data is loaded with.
+
+    Returns:
+        Snapshot | None: The startup snapshot, or None if there is none or it is stale.
+    """
+    if not os.path.isfile(STARTUP_SNAPSHOT_PATH):
+        return None
+    with open(STARTUP_SNAPSHOT_PATH, "rb") as f:
+        state = pickle.load(f)
+    fingerprint = _fingerprint(config)
+    if state.get("version") != STARTUP_SNAPSHOT_VERSION or state.get("fingerprint") != fingerprint:
+        return None
+
+    figure_cache = FigureCache(max_bytes=config.get("FIGURE_CACHE_MB", 64) * 1024**2)
+    figure_cache.restore(state["figures"])
+
+    return Snapshot(
+        transformer=_Deferred("transformer"),
+        extractor=_Deferred("extractor"),
+        kpis=state["kpis"],
+        figure_cache=figure_cache,
+        source_stat=state["source_stat"],
+        fingerprint=fingerprint,
+        response_cache=ResponseCache(max_bytes=config.get("RESPONSE_CACHE_MB", 16) * 1024**2),
+        client_data=state["client_data"]
+    )
+
+
+def _serve(snapshot: Snapshot, loaded: bool=True) -> None:
+    """Swaps in a snapshot.
+
+    Args:
+        snapshot (Snapshot): Snapshot to serve.
+        loaded (bool, optional): Whether the snapshot is of the loaded data, rather than a startup snapshot. Defaults to True.
+    """
+    global _snapshot
+    _snapshot = snapshot
+    _served.set()
+    if loaded:
+        _ready.set()
+
+
+def _save_startup(snapshot: Snapshot) -> None:
+    """Saves the startup snapshot of a snapshot if "FAST_START" is enabled in its configuration, see save_startup_snapshot. The dashboard keeps running if it cannot be saved.
+
+    Args:
+        snapshot (Snapshot): Snapshot of the loaded data.
+    """
+    if not snapshot.transformer.config.get("FAST_START"):
+        return
+    try:
+        save_startup_snapshot(snapshot)
+    except Exception as e:
+        logging.error(f"Failed to save the startup snapshot. Error: {e}")
+
+
+def current() -> Snapshot:
+    """The snapshot that is currently being served. The data is loaded on first use - unless it is being loaded in the background (see warm_up), in which case this waits for it, or for the startup snapshot if there is one.
+
+    Returns:
+        Snapshot: Current snapshot.
+    """
+    while _snapshot is None:
+        with _lock:
+            warming = _warmer is not None
+            if _snapshot is None and not warming:
+                _serve(build_snapshot())
+        if warming:
+            _served.wait()
+
+    return _snapshot
+
+
+def ready() -> bool:
+    """Whether the data is loaded - rather than not yet loaded, or only a startup snapshot being served.
+
+    Returns:
+        bool: Whether the data is loaded.
+    """
+    return _ready.is_set()
+
+
+def failed() -> bool:
+    """Whether the data failed to load in the background (see warm_up), and has not been loaded since.
+
+    Returns:
+        bool: Whether the data failed to load.
+    """
+    return _failed.is_set() and not _ready.is_set()
+
+
+def warm_up() -> threading.Thread:
+    """Loads the data in a background thread, so that the server can start (and answer health checks, see src/app/health.py) straight away. If there is a startup snapshot of the same configuration and data files, it is served while the data loads, see load_startup_snapshot. Once loaded, the startup snapshot is saved for the next start. If the data fails to load, it is not ready (see failed) until a later use of the data loads it.
+
+    Returns:
+        threading.Thread: The thread loading the data.
+    """
+    global _warmer
+
+    def warm() -> None:
+        global _warmer
+        start = time.perf_counter()
+        try:
+            startup = load_startup_snapshot(json.load(open("config.json")))
+            if startup is not None:
+                _serve(startup, loaded=False)
+                logging.info(f"Serving the startup snapshot after {time.perf_counter() - start:.2f}s.")
+            snapshot = build_snapshot()
+        except Exception as e:
+            # Left to the first page load or callback to load the data (and raise the error) itself - through current() if no startup snapshot is served, and through its stand-ins otherwise, see _Deferred
+            logging.error(f"Failed to load data in the background. Error: {e}")
+            with _lock:
+                _warmer = None
+            _failed.set()
+            _served.set()
+            return
+
+        _serve(snapshot)
+        logging.info(f"Loaded data in {time.perf_counter() - start:.2f}s.")
+        _save_startup(snapshot)
+
+    with _lock:
+        if _warmer is None and _snapshot is None:
+            _warmer = threading.Thread(target=warm, daemon=True, name="DataWarmer")
+            _warmer.start()
+
+    return _warmer
+
+
+def reload(config: dict|None=None) -> None:
+    """Builds a new snapshot, while the current one keeps being served, and then swaps it in.
+
+    Args:
+        config (dict | None, optional): Configuration to use instead of config.json. Defaults to None.
+    """
+    snapshot = build_snapshot(config)
+    _serve(snapshot)
+    _save_startup(snapshot)
+
+
+class DataReloader(threading.Thread):
+    """Background thread that watches the configured data files and reloads the data once they have changed. The files must be unchanged for one whole interval before they are reloaded, so that a file that is still being written is not loaded. If a reload fails, the current snapshot keeps being served.
+
+    Args:
+        interval (float): Number of seconds between checks of the data files.
+    """
+    def __init__(self, interval: float) -> None:
+        super().__init__(daemon=True, name="DataReloader")
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        pending_stat = None
+        while not self._stop_event.wait(self.interval):
+            try:
+                # Loads the data if it has not loaded yet, e.g. after it failed to load at the start
+                snapshot = current()
+                stat = _source_stat(snapshot.transformer)
+            except Exception as e:
+                # Checked again at the next interval, e.g. once a missing data file is back
+                logging.error(f"Failed to check the data files for changes. Error: {e}")
+                continue
+
+            if stat == snapshot.source_stat:
+                pending_stat = None
+            elif stat != pending_stat:
+                pending_stat = stat
+            else:
+                try:
+                    start = time.perf_counter()
+                    reload()
+                    logging.info(f"Reloaded data in {time.perf_counter() - start:.2f}s.")
+                except Exception as e:
+                    logging.error(f"Failed to reload data, still serving the previous data. Error: {e}")
+                pending_stat = None
+
+    def stop(self) -> None:
+        """Stops watching the data files.
+        """
+        self._stop_event.set()
+
+
+def start_reloader() -> DataReloader|None:
+    """Starts watching the configured data files, if "RELOAD_INTERVAL" is set in config.json and the data is not randomly generated.
+
+    Returns:
+        DataReloader | None: The started reloader, or None if reloading is disabled.
+    """
+    config = json.load(open("config.json"))
+    if not config.get("RELOAD_INTERVAL") or config["FILENAME"] is None:
+        return None
+
+    reloader = DataReloader(interval=config["RELOAD_INTERVAL"])
+    reloader.start()
+
+    return reloader
+
+
+# The snapshot being served, None until the data (or a startup snapshot) is loaded, see current
+_snapshot = None
+# Thread loading the data in the background, see warm_up
+_warmer = None
+_lock = threading.Lock()
+# Set once a snapshot is served (or the data failed to load in the background), once the data is loaded, and once it failed to load in the background
+_served = threading.Event()
+_ready = threading.Event()
+_failed = threading.Event()
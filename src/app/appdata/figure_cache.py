@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import weakref
+import threading
+from collections import OrderedDict
+from typing import Callable, TYPE_CHECKING
+
+sys.path.append("./")
+from src.app import metrics
+
+# Only imported for type checking, so that the server can start before plotly is imported, see appdata
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+
+# Every figure cache, so that their locks can be reset in forked processes, see _reset_locks
+_caches = weakref.WeakSet()
+
+
+class FigureCache:
+    """Size-bounded, least recently used cache of Plotly figures, held as the dictionaries returned from the Dash callbacks. The figures only depend on the loaded data, so a figure is built once per input combination and every repeat request is a dictionary lookup. Must be cleared whenever the data is reloaded.
+
+    Args:
+        max_bytes (int, optional): Maximum total size of the figures serialised as JSON - the least recently used figures are evicted beyond it. Defaults to 64MB.
+    """
+    def __init__(self, max_bytes: int=64 * 1024**2) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def get(self, key: tuple, build: Callable[[], "go.Figure"]) -> dict:
+        """Gets the figure of a key as a dictionary that can be returned from a Dash callback, building and caching it if it is not cached. The cached dictionary itself is returned, so it must not be modified.
+
+        Args:
+            key (tuple): Key of the figure, e.g. the callback name and its inputs.
+            build (Callable[[], go.Figure]): Function that builds the figure.
+
+        Returns:
+            dict: Figure as a dictionary.
+        """
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return self._figures[key][0]
+            self.misses += 1
+
+        with metrics.stage("figure"):
+            figure = build()
+        with metrics.stage("serialize"):
+            # Serialised once, so that the dictionary only holds JSON types, and to measure the figure
+            figure_json = figure.to_json()
+            figure_dict = json.loads(figure_json)
+        self._store(key, figure_dict, len(figure_json))
+
+        return figure_dict
+
+    def _store(self, key: tuple, figure: dict, size: int) -> None:
+        """Stores a figure, evicting the least recently used figures until the cache is within its size bound. Figures larger than the bound are not stored.
+
+        Args:
+            key (tuple): Key of the figure.
+            figure (dict): Figure as a dictionary.
+            size (int): Size of the figure serialised as JSON.
+        """
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._figures:
+                self.size -= self._figures.pop(key)[1]
+            self._figures[key] = (figure, size)
+            self.size += size
+
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._figures.popitem(last=False)
+                self.size -= evicted_size
+
+    def entries(self) -> list:
+        """Every cached figure, least recently used first, e.g. to persist the cache.
+
+        Returns:
+            list: Key, figure and serialised size of each cached figure.
+        """
+        with self._lock:
+            return [(key, figure, size) for key, (figure, size) in self._figures.items()]
+
+    def restore(self, entries: list) -> None:
+        """Stores figures that were cached before, see entries.
+
+        Args:
+            entries (list): Key, figure and serialised size of each figure, least recently used first.
+        """
+        for key, figure, size in entries:
+            self._store(key, figure, size)
+
+    def clear(self) -> None:
+        """Removes every cached figure, e.g. when the data is reloaded.
+        """
+        with self._lock:
+            self._figures.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._figures)
+
+
+def _reset_locks() -> None:
+    """Gives every figure cache a new lock in a forked process (e.g. the job of a background callback), as a lock held by another thread of the parent at the fork would never be released in the child.
+    """
+    for cache in _caches:
+        cache._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_locks)
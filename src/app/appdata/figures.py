@@ -0,0 +1,219 @@
+import sys
+from typing import TYPE_CHECKING
+
+sys.path.append("./")
+from src.app.appdata.figure_cache import FigureCache
+
+# Only imported for type checking, so that the server can start before pandas and plotly.express are imported, see appdata
+if TYPE_CHECKING:
+    from src.data_utils.extractor import DataExtractor
+
+
+# Key and title of each position of the granularity slider
+GRANULARITIES = {1: ("day", "Daily"), 2: ("week", "Weekly"), 3: ("month", "Monthly")}
+
+
+def day_title(analytic: str, granularity: int) -> str:
+    """Title of the 'days' figure of an analytic and granularity.
+
+    Args:
+        analytic (str): 'orders' or 'revenue'.
+        granularity (int): 1 - daily, 2 - weekly, or 3 - monthly.
+
+    Returns:
+        str: Title of the figure.
+    """
+    return f"{GRANULARITIES[granularity][1]} {analytic.capitalize()}"
+
+
+def country_title(figure: dict) -> str:
+    """Title of a 'country' figure, after the title of its x-axis.
+
+    Args:
+        figure (dict): Bar plot figure, see country_figure.
+
+    Returns:
+        str: Title of the figure.
+    """
+    return f"{figure['layout']['xaxis']['title']['text']} per Country"
+
+
+def without_filter(filters: dict|None, dimension: str) -> dict|None:
+    """Cross-filter of a chart that breaks the data down by a dimension. A chart is not filtered by its own dimension, so that the other values stay visible (and clickable) once one is selected.
+
+    Args:
+        filters (dict | None): Value that each filtered dimension must have.
+        dimension (str): Dimension of the chart.
+
+    Returns:
+        dict | None: Filters of the other dimensions, None if there are none.
+    """
+    filters = {name: value for name, value in (filters or {}).items() if name != dimension}
+
+    return filters or None
+
+
+def _cache_key(key: tuple, date_range: tuple|None, filters: dict|None=None) -> tuple:
+    """Key of a figure in the figure cache, with its date range and filters if it has any.
+
+    Args:
+        key (tuple): Name of the figure and its inputs.
+        date_range (tuple | None): First and last day of the date range of the figure, None for the whole data.
+        filters (dict | None, optional): Value that each filtered dimension of the figure must have. Defaults to None, every order.
+
+    Returns:
+        tuple: Key of the figure.
+    """
+    if date_range is not None:
+        key = key + tuple(date_range)
+    if filters:
+        key = key + tuple(sorted(filters.items()))
+
+    return key
+
+
+def day_figure(extractor: "DataExtractor", figure_cache: FigureCache, analytic: str, granularity: int, date_range: tuple|None=None, filters: dict|None=None) -> dict:
+    """Gets the 'days' figure of an analytic and granularity from the figure cache, building it if it is not cached.
+
+    Args:
+        extractor (DataExtractor): Extractor of the loaded data.
+        figure_cache (FigureCache): Figure cache of the loaded data.
+        analytic (str): 'orders' or 'revenue'.
+        granularity (int): 1 - daily, 2 - weekly, or 3 - monthly.
+        date_range (tuple | None, optional): First and last day of the date range to plot. Defaults to None, the whole data.
+        filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+
+    Returns:
+        dict: Bar plot figure.
+    """
+    bucket = GRANULARITIES[granularity][0]
+    start, end = date_range or (None, None)
+    if analytic == "orders":
+        build = lambda: extractor.orders_per_day(granularity=bucket, start=start, end=end, filters=filters)
+    else:
+        build = lambda: extractor.revenue_per_day(granularity=bucket, start=start, end=end, filters=filters)
+
+    return figure_cache.get(_cache_key(("day", analytic, granularity), date_range, filters), build)
+
+
+def country_figure(extractor: "DataExtractor", figure_cache: FigureCache, analytic: str, head_tail: str, date_range: tuple|None=None, filters: dict|None=None) -> dict:
+    """Gets the 'country' figure of an analytic and order from the figure cache, building it if it is not cached.
+
+    Args:
+        extractor (DataExtractor): Extractor of the loaded data.
+        figure_cache (FigureCache): Figure cache of the loaded data.
+        analytic (str): 'orders', 'revenue' or 'mean_revenue'.
+        head_tail (str): 'head' or 'tail'.
+        date_range (tuple | None, optional): First and last day of the date range to plot. Defaults to None, the whole data.
+        filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+
+    Returns:
+        dict: Bar plot figure.
+    """
+    build = lambda: extractor.country_plots(analytic, head_tail, *(date_range or (None, None)), filters=filters)
+
+    return figure_cache.get(_cache_key(("country", analytic, head_tail), date_range, filters), build)
+
+
+def dispatch_figure(extractor: "DataExtractor", figure_cache: FigureCache, date_range: tuple|None=None, filters: dict|None=None) -> dict:
+    """Gets the 'days to dispatch' figure from the figure cache, building it if it is not cached.
+
+    Args:
+        extractor (DataExtractor): Extractor of the loaded data.
+        figure_cache (FigureCache): Figure cache of the loaded data.
+        date_range (tuple | None, optional): First and last day of the date range to plot. Defaults to None, the whole data.
+        filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+
+    Returns:
+        dict: Bar plot figure.
+    """
+    build = lambda: extractor.days_to_dispatch(*(date_range or (None, None)), filters=filters)
+
+    return figure_cache.get(_cache_key(("dispatch",), date_range, filters), build)
+
+
+def delivery_figure(extractor: "DataExtractor", figure_cache: FigureCache, analytic: str, date_range: tuple|None=None, filters: dict|None=None) -> dict:
+    """Gets the 'delivery' figure of an analytic from the figure cache, building it if it is not cached.
+
+    Args:
+        extractor (DataExtractor): Extractor of the loaded data.
+        figure_cache (FigureCache): Figure cache of the loaded data.
+        analytic (str): 'orders' or 'revenue'.
+        date_range (tuple | None, optional): First and last day of the date range to plot. Defaults to None, the whole data.
+        filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+
+    Returns:
+        dict: Pie chart figure.
+    """
+    if analytic == "orders":
+        build = lambda: extractor.order_delivery_charge(*(date_range or (None, None)), filters=filters)
+    else:
+        build = lambda: extractor.revenue_delivery_charge(*(date_range or (None, None)), filters=filters)
+
+    return figure_cache.get(_cache_key(("delivery", analytic), date_range, filters), build)
+
+
+def prerender_figures(extractor: "DataExtractor", figure_cache: FigureCache) -> None:
+    """Renders the figures of every input combination of the callbacks into the figure cache, so that no interaction has to build a figure.
+
+    Args:
+        extractor (DataExtractor): Extractor of the loaded data.
+        figure_cache (FigureCache): Figure cache of the loaded data.
+    """
+    for analytic in ["orders", "revenue"]:
+        for granularity in GRANULARITIES:
+            day_figure(extractor, figure_cache, analytic, granularity)
+
+    for analytic in ["orders", "revenue", "mean_revenue"]:
+        for head_tail in ["head", "tail"]:
+            country_figure(extractor, figure_cache, analytic, head_tail)
+
+    dispatch_figure(extractor, figure_cache)
+
+    for analytic in ["orders", "revenue"]:
+        delivery_figure(extractor, figure_cache, analytic)
+
+
+def _without_template(figure: dict, template: dict|None) -> tuple:
+    """Splits the template off a figure, leaving the cached figure as it is.
+
+    Args:
+        figure (dict): Figure as a dictionary, as returned by the figure cache.
+        template (dict | None): Template to return if the figure has none.
+
+    Returns:
+        tuple: Figure without its template, and its template.
+    """
+    layout = dict(figure["layout"])
+    template = layout.pop("template", template)
+
+    return {**figure, "layout": layout}, template
+
+
+def client_chart_data(extractor: "DataExtractor", figure_cache: FigureCache, date_range: tuple|None=None, filters: dict|None=None) -> dict:
+    """The 'days' and 'country' figures of every input combination of the callbacks, with their titles, to be held by the browser in a dcc.Store so that switching between them needs no round trip to the server. The Plotly template, which is the same for every figure, is sent once rather than with each figure.
+
+    Args:
+        extractor (DataExtractor): Extractor of the loaded data.
+        figure_cache (FigureCache): Figure cache of the loaded data.
+        date_range (tuple | None, optional): First and last day of the date range to plot. Defaults to None, the whole data.
+        filters (dict | None, optional): Value that each filtered dimension must have (the 'country' figures are not filtered by country, see without_filter). Defaults to None, every order.
+
+    Returns:
+        dict: Template of the figures, and the title and figure (without its template) of each input combination, keyed by its inputs joined with "|".
+    """
+    chart_data = {"template": None, "day": {}, "country": {}}
+
+    for analytic in ["orders", "revenue"]:
+        for granularity in GRANULARITIES:
+            figure = day_figure(extractor, figure_cache, analytic, granularity, date_range, filters)
+            figure, chart_data["template"] = _without_template(figure, chart_data["template"])
+            chart_data["day"][f"{analytic}|{granularity}"] = {"title": day_title(analytic, granularity), "figure": figure}
+
+    for analytic in ["orders", "revenue", "mean_revenue"]:
+        for head_tail in ["head", "tail"]:
+            figure = country_figure(extractor, figure_cache, analytic, head_tail, date_range, without_filter(filters, "country"))
+            figure, chart_data["template"] = _without_template(figure, chart_data["template"])
+            chart_data["country"][f"{analytic}|{head_tail}"] = {"title": country_title(figure), "figure": figure}
+
+    return chart_data
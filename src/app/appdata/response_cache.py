@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import threading
+import importlib.util
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+# Brotli compresses the JSON of the figures around a fifth smaller than gzip, but is an optional dependency - without it, responses are only compressed with gzip
+BROTLI = importlib.util.find_spec("brotli") is not None
+# Responses smaller than this are not worth compressing, and are stored as they are
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """Body of a response, compressed with each supported encoding, and its strong ETag.
+
+    The ETag of each encoding is the ETag of the response suffixed with the encoding (e.g. "<etag>-gzip"), as a strong ETag must differ between encodings of the same response.
+    """
+    etag: str
+    mimetype: str
+    bodies: dict
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+    def encoding_etag(self, encoding: str) -> str:
+        """ETag of the response in an encoding.
+
+        Args:
+            encoding (str): "identity", "gzip" or "br".
+
+        Returns:
+            str: ETag of the encoded response, unquoted.
+        """
+        return self.etag if encoding == "identity" else f"{self.etag}-{encoding}"
+
+    def body(self, encoding: str) -> bytes:
+        """Body of the response in an encoding. The uncompressed body is decompressed from gzip if it is not stored, as nearly every client accepts a compressed one.
+
+        Args:
+            encoding (str): "identity", or an encoding of the stored bodies.
+
+        Returns:
+            bytes: Encoded body.
+        """
+        if encoding == "identity" and "identity" not in self.bodies:
+            return gzip.decompress(self.bodies["gzip"])
+
+        return self.bodies[encoding]
+
+
+def compress_response(body: bytes, mimetype: str, fingerprint: str) -> CachedResponse:
+    """Compresses a response body with gzip (and Brotli, if installed), and derives its strong ETag from the fingerprint of the loaded data and the body - so the ETag only changes when the data (or the page itself) does.
+
+    Args:
+        body (bytes): Uncompressed body.
+        mimetype (str): Mimetype of the body.
+        fingerprint (str): Fingerprint of the loaded data, see appdata.Snapshot.
+
+    Returns:
+        CachedResponse: Compressed response.
+    """
+    etag = hashlib.blake2b(fingerprint.encode() + body, digest_size=16).hexdigest()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return CachedResponse(etag=etag, mimetype=mimetype, bodies={"identity": body})
+
+    bodies = {"gzip": gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)}
+    if BROTLI:
+        import brotli
+
+        bodies["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+
+    return CachedResponse(etag=etag, mimetype=mimetype, bodies=bodies)
+
+
+class ResponseCache:
+    """Size-bounded, least recently used cache of compressed responses - the page layout, and the responses of the callbacks keyed by their request. The responses only depend on the loaded data, so each is serialised and compressed once and every repeat request is a dictionary lookup. Must be cleared whenever the data is reloaded.
+
+    Args:
+        max_bytes (int, optional): Maximum total size of the compressed responses - the least recently used responses are evicted beyond it. Defaults to 16MB.
+    """
+    def __init__(self, max_bytes: int=16 * 1024**2) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> CachedResponse|None:
+        """Gets the cached response of a key.
+
+        Args:
+            key (tuple): Key of the response, e.g. the route and a digest of the request body.
+
+        Returns:
+            CachedResponse | None: Cached response, or None if it is not cached.
+        """
+        with self._lock:
+            response = self._responses.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self._responses.move_to_end(key)
+            self.hits += 1
+
+            return response
+
+    def store(self, key: tuple, response: CachedResponse) -> None:
+        """Stores a response, evicting the least recently used responses until the cache is within its size bound. Responses larger than the bound are not stored.
+
+        Args:
+            key (tuple): Key of the response.
+            response (CachedResponse): Compressed response.
+        """
+        size = response.size
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._responses:
+                self.size -= self._responses.pop(key).size
+            self._responses[key] = response
+            self.size += size
+
+            while self.size > self.max_bytes:
+                _, evicted = self._responses.popitem(last=False)
+                self.size -= evicted.size
+
+    def clear(self) -> None:
+        """Removes every cached response, e.g. when the data is reloaded.
+        """
+        with self._lock:
+            self._responses.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._responses)
@@ -0,0 +1,39 @@
+// Clientside callbacks of the dashboard, see src/app/page/callbacks.py. Dash serves every file in the assets folder, so these run in the browser without a round trip to the server.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    dashboard: {
+        // Opens or closes an offcanvas when its button is clicked
+        toggle_off_canvas: function(n_clicks, is_open) {
+            if (n_clicks) {
+                return !is_open;
+            }
+            return is_open;
+        },
+
+        // Title and 'days' figure of an analytic and granularity, from the chart data held in the dcc.Store. Zooming is left to the server, which re-bins the zoomed range - resetting the zoom goes back to the figure of the slider.
+        update_day_fig: function(analytic, granularity, relayout_data, chart_data) {
+            const triggered = dash_clientside.callback_context.triggered.map(trigger => trigger.prop_id);
+            if (triggered.includes("day_plot_fig.relayoutData") && !(relayout_data && "xaxis.autorange" in relayout_data)) {
+                return [dash_clientside.no_update, dash_clientside.no_update];
+            }
+
+            return chart_output(chart_data, "day", analytic + "|" + granularity);
+        },
+
+        // Title and 'country' figure of an analytic and order, from the chart data held in the dcc.Store
+        update_country_fig: function(analytic, head_tail, chart_data) {
+            return chart_output(chart_data, "country", analytic + "|" + head_tail);
+        }
+    }
+});
+
+// Title (as an H4 element) and figure (with the shared template put back) of a chart in the chart data
+function chart_output(chart_data, chart, key) {
+    const entry = chart_data[chart][key];
+    const title = {type: "H4", namespace: "dash_html_components", props: {children: entry.title}};
+    const figure = {
+        data: entry.figure.data,
+        layout: Object.assign({}, entry.figure.layout, {template: chart_data.template})
+    };
+
+    return [title, figure];
+}
@@ -0,0 +1,125 @@
+import sys
+import json
+import importlib.util
+
+from dash import DiskcacheManager
+
+sys.path.append("./")
+from src.app.appdata import appdata
+
+
+# Results and job records of the background callbacks, shared by every worker of the dashboard
+JOBS_PATH = "src/data/.cache/jobs"
+JOBS_SIZE_LIMIT = 256 * 1024**2
+# Seconds a result is kept after it was last used, and a job is tracked after it was started
+RESULT_EXPIRE = 3600
+JOB_EXPIRE = 600
+# Job id of a callback whose result was already cached, so no process was started for it
+CACHED_JOB = -1
+# Background callbacks need the diskcache extra of Dash (pip install "dash[diskcache]"), which is optional
+AVAILABLE = all(importlib.util.find_spec(module) is not None for module in ["diskcache", "multiprocess", "psutil"])
+
+
+class SharedJobManager(DiskcacheManager):
+    """DiskcacheManager that shares background callback jobs, and their results, between every user (and worker) of the dashboard. Each callback runs in a process of its own, with its result stored in an on-disk cache, so no broker is needed.
+
+    A result is cached under the callback, its inputs and the fingerprint of the loaded data, so a request for a figure that was already computed is answered without starting a job, and one for a figure that is being computed waits for the running job rather than starting another.
+
+    A job is only terminated once every request waiting for it has been superseded - the browser cancels the job of its previous request whenever it sends a new one (e.g. while the slider is dragged). A job whose result is ready is left to exit by itself.
+
+    Args:
+        cache (diskcache.Cache): Cache that holds the results, progress and job records.
+    """
+    def __init__(self, cache) -> None:
+        super().__init__(cache, cache_by=[lambda: appdata.current().fingerprint], expire=RESULT_EXPIRE)
+        # Job records are only valid for the processes of this run
+        self.handle.evict("job")
+
+    def call_job_fn(self, key: str, job_fn, args, context) -> int:
+        """Starts the job of a request, unless its result is cached or a job for it is already running.
+
+        Args:
+            key (str): Cache key of the result.
+            job_fn (Callable): Job function of the callback.
+            args (list | dict): Arguments of the callback.
+            context (dict): Callback context of the request.
+
+        Returns:
+            int: Process id of the job, or CACHED_JOB if the result is cached.
+        """
+        if self.result_ready(key):
+            return CACHED_JOB
+
+        with self.handle.transact():
+            job = self.handle.get(f"{key}-job")
+            if job is not None and self.handle.get(f"job-{job}") == key and super().job_running(job):
+                self.handle.incr(f"job-{job}-users", default=1)
+                return job
+
+        job = super().call_job_fn(key, job_fn, args, context)
+        with self.handle.transact():
+            self.handle.set(f"{key}-job", job, expire=JOB_EXPIRE, tag="job")
+            self.handle.set(f"job-{job}", key, expire=JOB_EXPIRE, tag="job")
+            self.handle.set(f"job-{job}-users", 1, expire=JOB_EXPIRE, tag="job")
+
+        return job
+
+    def terminate_job(self, job) -> None:
+        """Terminates a job, once no other request is waiting for it and its result is not ready.
+
+        Args:
+            job (int | str | None): Process id of the job.
+        """
+        if job is None or int(job) == CACHED_JOB:
+            return
+
+        job = int(job)
+        with self.handle.transact():
+            key = self.handle.get(f"job-{job}")
+            if key is None or self.result_ready(key):
+                return
+            if self.handle.decr(f"job-{job}-users", default=1) > 0:
+                return
+            for record in [f"{key}-job", f"job-{job}", f"job-{job}-users"]:
+                self.handle.delete(record)
+
+        super().terminate_job(job)
+
+    def job_running(self, job) -> bool:
+        return int(job) != CACHED_JOB and super().job_running(job)
+
+    def terminate_unhealthy_job(self, job) -> bool:
+        return int(job) != CACHED_JOB and super().terminate_unhealthy_job(job)
+
+    def get_result(self, key: str, job):
+        result = super().get_result(key, job)
+        if result is not self.UNDEFINED:
+            self.clear_cache_entry(self._make_set_props_key(key))
+
+        return result
+
+    def get_progress(self, key: str) -> list|None:
+        # Kept rather than cleared once read, as every request waiting for the job polls it
+        return self.handle.get(self._make_progress_key(key))
+
+    def get_updated_props(self, key: str) -> dict:
+        return self.handle.get(self._make_set_props_key(key), {})
+
+
+def job_manager() -> SharedJobManager|None:
+    """Background callback manager of the dashboard, if "BACKGROUND_CALLBACKS" is enabled in config.json.
+
+    Returns:
+        SharedJobManager | None: Manager of the background callbacks, or None if they are disabled.
+
+    Raises:
+        ImportError: If background callbacks are enabled but the diskcache extra of Dash is not installed.
+    """
+    if not json.load(open("config.json")).get("BACKGROUND_CALLBACKS"):
+        return None
+    if not AVAILABLE:
+        raise ImportError('"BACKGROUND_CALLBACKS" needs the diskcache extra of Dash: pip3 install "dash[diskcache]"')
+
+    import diskcache
+
+    return SharedJobManager(diskcache.Cache(JOBS_PATH, size_limit=JOBS_SIZE_LIMIT))
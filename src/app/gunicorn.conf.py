@@ -0,0 +1,36 @@
+import gc
+import sys
+import json
+import multiprocessing
+
+sys.path.append("./")
+
+
+# Gunicorn configuration of the dashboard, run from the repository root with:
+#     gunicorn -c src/app/gunicorn.conf.py src.app.app:server
+#
+# The app (and so the data) is loaded once, in the master process, before the workers are forked - every worker then shares the master's copy of the data, the rollup, the KPIs and the prerendered figures rather than loading its own. With "CACHE" enabled the data and rollup are memory-mapped from src/data/.cache/, so they are shared through the page cache and never copied. Otherwise the pages of the master's copy are shared until written to, which the workers never do.
+# Named so as not to clash with gunicorn's own "config" setting
+app_config = json.load(open("config.json"))
+
+bind = app_config.get("SERVER_BIND") or "0.0.0.0:8050"
+workers = app_config.get("SERVER_WORKERS") or multiprocessing.cpu_count()
+preload_app = True
+
+
+def when_ready(server) -> None:
+    """Called in the master process once the app is loaded, before the workers are forked. Loads the data (which the app only loads on first use, see appdata.current), so that every worker shares it rather than loading its own, and then moves every object into the permanent generation of the garbage collector, so that collections in the workers do not write to (and so copy) the pages of the shared data.
+    """
+    from src.app.appdata import appdata
+
+    appdata.current()
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker) -> None:
+    """Called in each worker once it is forked. Threads are not inherited by forked processes, so each worker watches the data files for changes itself, see appdata.start_reloader.
+    """
+    from src.app.appdata import appdata
+
+    appdata.start_reloader()
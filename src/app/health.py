@@ -0,0 +1,35 @@
+import sys
+import json
+
+from flask import Flask
+
+sys.path.append("./")
+from src.app.appdata import appdata
+
+
+def init_health(server: Flask) -> None:
+    """Adds the /health route to the Flask server of the dashboard. It answers straight away, without loading the data or waiting for it to load - with "loading" until the data is loaded (while a startup snapshot may already be served, see appdata.warm_up), and "ready" after. If the data failed to load, it answers "error" with a 503 status, until a page load or callback loads it.
+
+    The route is answered before the request reaches Flask, as Dash builds the layout (and so loads the data) before the first request it handles, whichever route it is for.
+
+    Args:
+        server (Flask): Flask server of the dashboard.
+    """
+    wsgi_app = server.wsgi_app
+
+    def health_app(environ: dict, start_response):
+        if environ.get("PATH_INFO") != "/health":
+            return wsgi_app(environ, start_response)
+
+        if appdata.ready():
+            status, code = "ready", "200 OK"
+        elif appdata.failed():
+            status, code = "error", "503 Service Unavailable"
+        else:
+            status, code = "loading", "200 OK"
+        body = json.dumps({"status": status}).encode()
+        start_response(code, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+
+        return [body]
+
+    server.wsgi_app = health_app
@@ -0,0 +1,298 @@
+import json
+import time
+import bisect
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager, nullcontext
+from typing import Callable
+
+from flask import Flask, Response, g, request
+from dash.exceptions import PreventUpdate
+
+
+# Metrics are only collected if "METRICS" is enabled in config.json - otherwise every hook below is a no-op, and callbacks and extractors are left unwrapped
+ENABLED = bool(json.load(open("config.json")).get("METRICS"))
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = tuple(1024 * 4**power for power in range(8))
+# Names of the histograms, with their help text, label name and buckets
+HISTOGRAMS = {
+    "dashboard_callback_seconds": ("Latency of the Dash callbacks.", "callback", SECONDS_BUCKETS),
+    "dashboard_extractor_seconds": ("Latency of the DataExtractor methods (nested calls included).", "method", SECONDS_BUCKETS),
+    "dashboard_stage_seconds": ("Time spent building and serialising figures.", "stage", SECONDS_BUCKETS),
+    "dashboard_request_seconds": ("Server time of the HTTP requests.", "route", SECONDS_BUCKETS),
+    "dashboard_response_bytes": ("Size of the HTTP responses.", "route", BYTES_BUCKETS)
+}
+COUNTERS = {
+    "dashboard_callback_errors_total": ("Callbacks that raised an error.", "callback")
+}
+
+# Time spent in each stage of the current request, None outside of requests
+_timings = contextvars.ContextVar("timings", default=None)
+_local = threading.local()
+_null_stage = nullcontext()
+
+
+class MetricsRegistry:
+    """Thread-safe store of histograms and counters, rendered in the Prometheus text format.
+    """
+    def __init__(self) -> None:
+        self._histograms = {name: {} for name in HISTOGRAMS}
+        self._counters = {name: {} for name in COUNTERS}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, label: str, value: float) -> None:
+        """Adds an observation to a histogram.
+
+        Args:
+            name (str): Name of the histogram, see HISTOGRAMS.
+            label (str): Value of the label of the histogram.
+            value (float): Observed value.
+        """
+        buckets = HISTOGRAMS[name][2]
+        with self._lock:
+            series = self._histograms[name].get(label)
+            if series is None:
+                series = self._histograms[name][label] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(buckets, value)
+            if index < len(buckets):
+                series["buckets"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def increment(self, name: str, label: str) -> None:
+        """Increments a counter.
+
+        Args:
+            name (str): Name of the counter, see COUNTERS.
+            label (str): Value of the label of the counter.
+        """
+        with self._lock:
+            self._counters[name][label] = self._counters[name].get(label, 0) + 1
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text format.
+
+        Returns:
+            str: Prometheus text exposition of the metrics.
+        """
+        lines = []
+        with self._lock:
+            for name, (help_text, label_name, buckets) in HISTOGRAMS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for label, series in sorted(self._histograms[name].items()):
+                    labels = f'{label_name}="{_escape(label)}"'
+                    cumulative = 0
+                    for bound, count in zip(buckets, series["buckets"]):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {series["count"]}')
+                    lines.append(f"{name}_sum{{{labels}}} {series['sum']}")
+                    lines.append(f"{name}_count{{{labels}}} {series['count']}")
+
+            for name, (help_text, label_name) in COUNTERS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for label, count in sorted(self._counters[name].items()):
+                    lines.append(f'{name}{{{label_name}="{_escape(label)}"}} {count}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(label: str) -> str:
+    """Escapes a label value for the Prometheus text format.
+
+    Args:
+        label (str): Label value.
+
+    Returns:
+        str: Escaped label value.
+    """
+    return label.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _add_timing(stage: str, seconds: float) -> None:
+    """Adds time spent in a stage to the Server-Timing of the current request, if there is one.
+
+    Args:
+        stage (str): Name of the stage.
+        seconds (float): Time spent in the stage.
+    """
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+registry = MetricsRegistry()
+
+
+def timed_callback(callback: Callable) -> Callable:
+    """Decorator that records the latency and errors of a Dash callback. Must be applied below app.callback.
+
+    Args:
+        callback (Callable): Callback function.
+
+    Returns:
+        Callable: Instrumented callback function, or the callback itself if metrics are disabled.
+    """
+    if not ENABLED:
+        return callback
+
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    def wrapper(*args, **kwargs):
+        timings = _timings.get()
+        if timings is not None:
+            timings["_callback"] = name
+        start = time.perf_counter()
+        try:
+            return callback(*args, **kwargs)
+        except PreventUpdate:
+            raise
+        except Exception:
+            registry.increment("dashboard_callback_errors_total", name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            registry.observe("dashboard_callback_seconds", name, elapsed)
+            _add_timing("callback", elapsed)
+
+    return wrapper
+
+
+def instrument_extractor(extractor: object) -> object:
+    """Records the latency of every public method of a DataExtractor. Only the outermost extractor call of a request counts towards its "extract" Server-Timing, so nested calls are not counted twice.
+
+    Args:
+        extractor (object): Extractor to instrument - its methods are wrapped in place.
+
+    Returns:
+        object: The extractor.
+    """
+    if not ENABLED:
+        return extractor
+
+    for name in dir(type(extractor)):
+        method = getattr(extractor, name)
+        if name.startswith("_") or not callable(method):
+            continue
+        setattr(extractor, name, _timed_method(name, method))
+
+    return extractor
+
+
+def _timed_method(name: str, method: Callable) -> Callable:
+    """Wraps an extractor method to record its latency, see instrument_extractor.
+
+    Args:
+        name (str): Name of the method.
+        method (Callable): Bound method.
+
+    Returns:
+        Callable: Instrumented method.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        depth = getattr(_local, "depth", 0)
+        _local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _local.depth = depth
+            registry.observe("dashboard_extractor_seconds", name, elapsed)
+            if depth == 0:
+                _add_timing("extract", elapsed)
+
+    return wrapper
+
+
+def stage(name: str):
+    """Context manager that records the time spent in a stage of serving a figure (e.g. "figure" or "serialize").
+
+    Args:
+        name (str): Name of the stage.
+
+    Returns:
+        ContextManager: Context manager that times its body, or one that does nothing if metrics are disabled.
+    """
+    if not ENABLED:
+        return _null_stage
+
+    return _timed_stage(name)
+
+
+@contextmanager
+def _timed_stage(name: str):
+    """Times the body of a stage, see stage.
+
+    Args:
+        name (str): Name of the stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("dashboard_stage_seconds", name, elapsed)
+        _add_timing(name, elapsed)
+
+
+def init_metrics(server: Flask, figure_cache: Callable) -> None:
+    """Adds the /metrics route, in the Prometheus text format, to the Flask server of the dashboard, and a Server-Timing header (the time spent in the callback, extracting data, building figures, serialising them, and in total) to every response. Does nothing if metrics are disabled.
+
+    Args:
+        server (Flask): Flask server of the dashboard.
+        figure_cache (Callable): Function that returns the FigureCache currently being served, whose hit rate and size are reported.
+    """
+    if not ENABLED:
+        return
+
+    @server.before_request
+    def start_timing() -> None:
+        g.metrics_start = time.perf_counter()
+        g.metrics_token = _timings.set({})
+
+    @server.after_request
+    def record_timing(response: Response) -> Response:
+        if "metrics_start" not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        timings = _timings.get() or {}
+        _timings.reset(g.metrics_token)
+
+        # Callbacks are all served by the same route, so they are told apart by the name of the callback
+        route = timings.pop("_callback", None)
+        if route is None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        registry.observe("dashboard_request_seconds", route, elapsed)
+        if response.content_length is not None:
+            registry.observe("dashboard_response_bytes", route, response.content_length)
+
+        timings["total"] = elapsed
+        response.headers["Server-Timing"] = ", ".join(
+            f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()
+        )
+
+        return response
+
+    @server.route("/metrics")
+    def metrics() -> Response:
+        cache = figure_cache()
+        lines = [
+            "# HELP dashboard_figure_cache_hits_total Figure cache hits since the data was last loaded.",
+            "# TYPE dashboard_figure_cache_hits_total counter",
+            f"dashboard_figure_cache_hits_total {cache.hits}",
+            "# HELP dashboard_figure_cache_misses_total Figure cache misses since the data was last loaded.",
+            "# TYPE dashboard_figure_cache_misses_total counter",
+            f"dashboard_figure_cache_misses_total {cache.misses}",
+            "# HELP dashboard_figure_cache_bytes Size of the cached figures.",
+            "# TYPE dashboard_figure_cache_bytes gauge",
+            f"dashboard_figure_cache_bytes {cache.size}",
+            "# HELP dashboard_figure_cache_figures Number of cached figures.",
+            "# TYPE dashboard_figure_cache_figures gauge",
+            f"dashboard_figure_cache_figures {len(cache)}"
+        ]
+
+        return Response(registry.render() + "\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
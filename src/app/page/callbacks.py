@@ -1,81 +1,403 @@
 import sys
+import json
 
-from dash import Dash, html, Input, Output, State
+from dash import Dash, html, ctx, set_props, Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 
 sys.path.append("./")
 from src.app.appdata import appdata
+from src.app.appdata.figures import (
+    day_title, country_title, without_filter, day_figure, country_figure, dispatch_figure, delivery_figure, client_chart_data
+)
+from src.app.page.layout import KPI_CARDS, kpi_values, filter_text
+from src.app import metrics
+from src.app.background import SharedJobManager, job_manager
+
+
+# Title of each granularity that zooming into the timeline can pick
+ZOOM_TITLES = {"hour": "Hourly", "day": "Daily", "week": "Weekly", "month": "Monthly", "quarter": "Quarterly"}
+# Milliseconds between the polls of the browser for the result of a background callback
+BACKGROUND_POLL_MS = 250
+
+
+def zoom_range(relayout_data: dict|None) -> tuple|None:
+    """Extracts the x-axis range from the relayoutData of a zoom or pan of a graph.
+
+    Args:
+        relayout_data (dict | None): relayoutData of the graph.
+
+    Returns:
+        tuple | None: Start and end of the x-axis range, or None if the relayout did not set one.
+    """
+    if not relayout_data:
+        return None
+    if "xaxis.range[0]" in relayout_data and "xaxis.range[1]" in relayout_data:
+        return relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]
+    if "xaxis.range" in relayout_data:
+        return tuple(relayout_data["xaxis.range"])
+
+    return None
+
+
+def selected_range(start_date: str|None, end_date: str|None) -> tuple|None:
+    """Date range selected in the date range picker.
+
+    Args:
+        start_date (str | None): Start date of the picker.
+        end_date (str | None): End date of the picker.
+
+    Returns:
+        tuple | None: First and last day of the selected range, as yyyy-mm-dd, or None if the range covers the whole data.
+    """
+    kpis = appdata.current().kpis
+    # The picker sends ISO dates, with a time if the date was set to a datetime
+    start = kpis.start if start_date is None else start_date[:10]
+    end = kpis.end if end_date is None else end_date[:10]
+    if start <= kpis.start and end >= kpis.end:
+        return None
+
+    return start, end
+
+
+def clicked_filter(click_data: dict|None, dimension: str) -> tuple|None:
+    """Dimension and value of the bar or slice clicked in a chart.
+
+    Args:
+        click_data (dict | None): clickData of the chart.
+        dimension (str): Dimension of the chart - "country" for the 'country' bar plot, "paid" for the 'delivery' pie charts.
+
+    Returns:
+        tuple | None: Dimension and its clicked value, or None if nothing was clicked.
+    """
+    if not click_data or not click_data.get("points"):
+        return None
+
+    point = click_data["points"][0]
+    if dimension == "country":
+        return "country", point["y"]
+
+    return "paid", point["label"] == "Paid"
+
+
+def zoomed_day_fig(analytic: str, relayout_data: dict|None, filters: dict|None=None) -> tuple:
+    """Title and figure of the 'days' figure zoomed into the x-axis range of a relayout. The zoomed range is re-binned at the finest granularity that keeps the number of bars within ZOOM_MAX_POINTS (config.json).
+
+    Args:
+        analytic (str): 'orders' or 'revenue'.
+        relayout_data (dict | None): relayoutData of the figure.
+        filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+
+    Raises:
+        PreventUpdate: If the relayout did not set an x-axis range.
+
+    Returns:
+        tuple: Header element to update the title and a bar plot figure.
+    """
+    x_range = zoom_range(relayout_data)
+    if x_range is None:
+        raise PreventUpdate
+
+    snapshot = appdata.current()
+    max_points = snapshot.transformer.config.get("ZOOM_MAX_POINTS", 400)
+    zoom_granularity, fig = snapshot.extractor.zoomed_plot(analytic, *x_range, max_points=max_points, filters=filters or None)
+
+    return html.H4(f"{ZOOM_TITLES[zoom_granularity]} {analytic.capitalize()}"), fig
+
+
+def background_options(manager: SharedJobManager|None, progress_id: str) -> dict:
+    """Options of a chart callback that run it as a background job (see src/app/background.py), with the progress bar of the chart shown while it runs. The browser cancels the job of its previous request whenever it sends a new one, so dragging a slider does not queue up every figure it passes.
+
+    Args:
+        manager (SharedJobManager | None): Manager of the background callbacks, None if they are disabled.
+        progress_id (str): Id of the progress bar of the chart.
+
+    Returns:
+        dict: Keyword arguments of app.callback, empty if background callbacks are disabled.
+    """
+    if manager is None:
+        return {}
+
+    return {
+        "background": True,
+        "manager": manager,
+        "interval": BACKGROUND_POLL_MS,
+        "running": [
+            (Output(progress_id, "style"), {"visibility": "visible"}, {"visibility": "hidden"}),
+            (Output(progress_id, "value"), 0, 0),
+            (Output(progress_id, "label"), "", "")
+        ]
+    }
 
 
 def init_callbacks(app: Dash) -> None:
+    """Registers the callbacks of the dashboard. The offcanvas toggles always run in the browser. If "CLIENT_DATA" is enabled in config.json, switching between the timeline and country charts does too, from the chart data held in a dcc.Store (see init_layout) - only zooming into the timeline, changing the date range and cross-filtering go to the server. Otherwise every chart is served by a callback on the server.
+
+    Clicking a country bar or a delivery slice cross-filters every other chart (and the KPIs) to that country or delivery type, and clicking it again removes the filter. Each chart is filtered by every dimension but its own, see without_filter.
+
+    Args:
+        app (Dash): Dashboard app.
+    """
+    if json.load(open("config.json")).get("CLIENT_DATA"):
+        init_client_chart_callbacks(app)
+    else:
+        init_server_chart_callbacks(app)
+
+    @app.callback(
+        Output(component_id="cross_filter", component_property="data"),
+        Output(component_id="cross_filter_text", component_property="children"),
+        Input(component_id="country_plot_fig", component_property="clickData"),
+        Input(component_id="delivery_orders_fig", component_property="clickData"),
+        Input(component_id="delivery_revenue_fig", component_property="clickData"),
+        Input(component_id="clear_filters_button", component_property="n_clicks"),
+        State(component_id="cross_filter", component_property="data"),
+        prevent_initial_call=True
+    )
+    def update_cross_filter(country_click: dict|None, delivery_orders_click: dict|None, delivery_revenue_click: dict|None, n_clicks: int, filters: dict|None) -> tuple:
+        """Callback function to update the cross-filter of the dashboard when a country bar or delivery slice is clicked. Clicking the value that is already filtered to removes its filter.
+
+        Args:
+            country_click (dict | None): clickData of the 'country' figure.
+            delivery_orders_click (dict | None): clickData of the orders 'delivery' figure.
+            delivery_revenue_click (dict | None): clickData of the revenue 'delivery' figure.
+            n_clicks (int): Number of clicks of the clear filters button.
+            filters (dict | None): Current value that each filtered dimension must have.
+
+        Returns:
+            tuple: Value that each filtered dimension must have, and the description of the filter.
+        """
+        if ctx.triggered_id == "clear_filters_button":
+            return {}, filter_text(None)
+
+        click_data, dimension = {
+            "country_plot_fig": (country_click, "country"),
+            "delivery_orders_fig": (delivery_orders_click, "paid"),
+            "delivery_revenue_fig": (delivery_revenue_click, "paid")
+        }[ctx.triggered_id]
+        clicked = clicked_filter(click_data, dimension)
+        if clicked is None:
+            raise PreventUpdate
+
+        filters = dict(filters or {})
+        dimension, value = clicked
+        if filters.get(dimension) == value:
+            del filters[dimension]
+        else:
+            filters[dimension] = value
+
+        return filters, filter_text(filters)
+
+    @app.callback(
+        *[Output(component_id=card_id, component_property="children") for card_id, _ in KPI_CARDS],
+        Output(component_id="dispatch_fig", component_property="figure"),
+        Output(component_id="delivery_orders_fig", component_property="figure"),
+        Output(component_id="delivery_revenue_fig", component_property="figure"),
+        Input(component_id="date_range_picker", component_property="start_date"),
+        Input(component_id="date_range_picker", component_property="end_date"),
+        Input(component_id="cross_filter", component_property="data"),
+        prevent_initial_call=True
+    )
+    @metrics.timed_callback
+    def update_summary(start_date: str|None, end_date: str|None, filters: dict|None) -> tuple:
+        """Callback function to update the KPI cards, the 'days to dispatch' figure and the 'delivery' figures to the selected date range and cross-filter.
+
+        Args:
+            start_date (str | None): Start date of the date range picker.
+            end_date (str | None): End date of the date range picker.
+            filters (dict | None): Value that each filtered dimension must have.
+
+        Returns:
+            tuple: Value of each KPI card, a bar plot figure and two pie chart figures.
+        """
+        snapshot = appdata.current()
+        extractor, figure_cache = snapshot.extractor, snapshot.figure_cache
+        date_range = selected_range(start_date, end_date)
+        if date_range is None and not filters:
+            kpis = snapshot.kpis
+        else:
+            kpis = extractor.kpi_bundle(*(date_range or (None, None)), filters=filters or None)
+        delivery_filters = without_filter(filters, "paid")
+
+        return (
+            *kpi_values(kpis),
+            dispatch_figure(extractor, figure_cache, date_range, filters or None),
+            delivery_figure(extractor, figure_cache, "orders", date_range, delivery_filters),
+            delivery_figure(extractor, figure_cache, "revenue", date_range, delivery_filters)
+        )
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="toggle_off_canvas"),
+        Output("date_off_canvas", "is_open"),
+        Input("date_off_canvas_button", "n_clicks"),
+        State("date_off_canvas", "is_open"),
+    )
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="toggle_off_canvas"),
+        Output("country_off_canvas", "is_open"),
+        Input("country_off_canvas_button", "n_clicks"),
+        State("country_off_canvas", "is_open"),
+    )
+
+
+def init_server_chart_callbacks(app: Dash) -> None:
+    """Registers the callbacks that serve the timeline and country charts from the server. If "BACKGROUND_CALLBACKS" is enabled in config.json, they run as background jobs rather than in the request, see background_options.
+
+    Args:
+        app (Dash): Dashboard app.
+    """
+    manager = job_manager()
+
+    def report_progress(progress_id: str, value: int, label: str) -> None:
+        if manager is not None:
+            set_props(progress_id, {"value": value, "label": label})
+
     @app.callback(
         Output(component_id="day_plot_title", component_property="children"),
         Output(component_id="day_plot_fig", component_property="figure"),
         Input(component_id="day_callback", component_property="value"),
         Input(component_id="granularity_slider", component_property="value"),
+        Input(component_id="day_plot_fig", component_property="relayoutData"),
+        Input(component_id="date_range_picker", component_property="start_date"),
+        Input(component_id="date_range_picker", component_property="end_date"),
+        Input(component_id="cross_filter", component_property="data"),
+        # The zoom and its reset have the same inputs as the figure they replace, so the result is cached under what triggered it too
+        cache_ignore_triggered=False,
+        **background_options(manager, "day_progress")
     )
-    def update_day_fig(analytic: str, granularity: int) -> tuple:
-        """Callback function to update the 'days' title and figure.
+    @metrics.timed_callback
+    def update_day_fig(analytic: str, granularity: int, relayout_data: dict|None, start_date: str|None, end_date: str|None, filters: dict|None) -> tuple:
+        """Callback function to update the 'days' title and figure. Zooming into the figure re-bins the zoomed range at the finest granularity that keeps the number of bars within ZOOM_MAX_POINTS (config.json), and resetting the zoom goes back to the granularity of the slider.
 
         Args:
             analytic (str): Input from RadioItems where the input is 'orders' or 'revenue'.
             granularity (int): Input from a Slider widget where the input is 1, 2 or 3. The lower the input the higher the granularity is: 1 - daily, 2 - weekly, or 3 - monthly.
+            relayout_data (dict | None): relayoutData of the figure, set when it is zoomed, panned or reset.
+            start_date (str | None): Start date of the date range picker.
+            end_date (str | None): End date of the date range picker.
+            filters (dict | None): Value that each filtered dimension must have.
 
         Returns:
             tuple: Header element to update the title and a bar plot figure.
         """
-        if granularity == 1:
-            nbins = appdata.extractor.number_of_days()
-            output_title = "Daily"
-        elif granularity == 2:
-            nbins = appdata.extractor.number_of_weeks()
-            output_title = "Weekly"
-        else:
-            nbins = appdata.extractor.number_of_months()
-            output_title = "Monthly"
+        if ctx.triggered_id == "day_plot_fig" and "xaxis.autorange" not in (relayout_data or {}):
+            report_progress("day_progress", 50, "Re-binning")
+            return zoomed_day_fig(analytic, relayout_data, filters)
+
+        report_progress("day_progress", 50, "Aggregating")
+        snapshot = appdata.current()
+        fig = day_figure(
+            snapshot.extractor, snapshot.figure_cache, analytic, granularity, selected_range(start_date, end_date), filters or None
+        )
 
-        if analytic == "orders":
-            return html.H4(f"{output_title} Orders "), appdata.extractor.orders_per_day(bins=nbins)
-        elif analytic == "revenue":
-            return html.H4(f"{output_title} Revenue"), appdata.extractor.revenue_per_day(bins=nbins)
+        return html.H4(day_title(analytic, granularity)), fig
 
 
     @app.callback(
         Output(component_id="country_plot_title", component_property="children"),
         Output(component_id="country_plot_fig", component_property="figure"),
         Input(component_id="country_analytic_callback", component_property="value"),
-        Input(component_id="head_tail_country_callback", component_property="value")
+        Input(component_id="head_tail_country_callback", component_property="value"),
+        Input(component_id="date_range_picker", component_property="start_date"),
+        Input(component_id="date_range_picker", component_property="end_date"),
+        Input(component_id="cross_filter", component_property="data"),
+        **background_options(manager, "country_progress")
     )
-    def update_country_fig(analytic: str, head_tail: str) -> tuple:
+    @metrics.timed_callback
+    def update_country_fig(analytic: str, head_tail: str, start_date: str|None, end_date: str|None, filters: dict|None) -> tuple:
         """Callback function to update the 'country' title and figure.
 
         Args:
             analytic_input (str): Input from a Select widget where the inputs can be 'orders', 'total' or 'average'.
             top_bottom_input (str): Input from a Select widget where the inputs can be 'head' or 'tail'.
+            start_date (str | None): Start date of the date range picker.
+            end_date (str | None): End date of the date range picker.
+            filters (dict | None): Value that each filtered dimension must have - the figure is not filtered by country.
 
         Returns:
             tuple: Header element to update the title and a bar plot figure.
         """
-        country_plot = appdata.extractor.country_plots(analytic, head_tail)
-        label = country_plot["layout"]["xaxis"]["title"]["text"]
+        report_progress("country_progress", 50, "Aggregating")
+        snapshot = appdata.current()
+        country_plot = country_figure(
+            snapshot.extractor, snapshot.figure_cache, analytic, head_tail, selected_range(start_date, end_date),
+            without_filter(filters, "country")
+        )
+
+        return html.H4(country_title(country_plot)), country_plot
+
+
+def init_client_chart_callbacks(app: Dash) -> None:
+    """Registers the callbacks that switch the timeline and country charts in the browser, from the chart data held in the "chart_data" dcc.Store (see src/app/assets/clientside.js), and the server callbacks that fill the store with the charts of the selected date range and cross-filter and zoom into the timeline.
+
+    Args:
+        app (Dash): Dashboard app.
+    """
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="update_day_fig"),
+        Output(component_id="day_plot_title", component_property="children"),
+        Output(component_id="day_plot_fig", component_property="figure"),
+        Input(component_id="day_callback", component_property="value"),
+        Input(component_id="granularity_slider", component_property="value"),
+        Input(component_id="day_plot_fig", component_property="relayoutData"),
+        Input(component_id="chart_data", component_property="data"),
+    )
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="update_country_fig"),
+        Output(component_id="country_plot_title", component_property="children"),
+        Output(component_id="country_plot_fig", component_property="figure"),
+        Input(component_id="country_analytic_callback", component_property="value"),
+        Input(component_id="head_tail_country_callback", component_property="value"),
+        Input(component_id="chart_data", component_property="data"),
+    )
 
-        return html.H4(f"{label} per Country"), country_plot
-    
     @app.callback(
-        Output("date_off_canvas", "is_open"),
-        Input("date_off_canvas_button", "n_clicks"),
-        State("date_off_canvas", "is_open"),
+        Output(component_id="chart_data", component_property="data"),
+        Input(component_id="date_range_picker", component_property="start_date"),
+        Input(component_id="date_range_picker", component_property="end_date"),
+        Input(component_id="cross_filter", component_property="data"),
+        prevent_initial_call=True
     )
-    def toggle_date_off_canvas(n, is_open):
-        if n:
-            return not is_open
-        return is_open
-    
+    @metrics.timed_callback
+    def update_chart_data(start_date: str|None, end_date: str|None, filters: dict|None) -> dict:
+        """Callback function to fill the chart data held by the browser with the charts of the selected date range and cross-filter.
+
+        Args:
+            start_date (str | None): Start date of the date range picker.
+            end_date (str | None): End date of the date range picker.
+            filters (dict | None): Value that each filtered dimension must have.
+
+        Returns:
+            dict: Chart data, see client_chart_data.
+        """
+        snapshot = appdata.current()
+        date_range = selected_range(start_date, end_date)
+        if date_range is None and not filters:
+            return snapshot.client_data
+
+        return client_chart_data(snapshot.extractor, snapshot.figure_cache, date_range, filters or None)
+
     @app.callback(
-        Output("country_off_canvas", "is_open"),
-        Input("country_off_canvas_button", "n_clicks"),
-        State("country_off_canvas", "is_open"),
+        Output(component_id="day_plot_title", component_property="children", allow_duplicate=True),
+        Output(component_id="day_plot_fig", component_property="figure", allow_duplicate=True),
+        Input(component_id="day_plot_fig", component_property="relayoutData"),
+        State(component_id="day_callback", component_property="value"),
+        State(component_id="cross_filter", component_property="data"),
+        prevent_initial_call=True
     )
-    def toggle_country_off_canvas(n, is_open):
-        if n:
-            return not is_open
-        return is_open
\ No newline at end of file
+    @metrics.timed_callback
+    def zoom_day_fig(relayout_data: dict|None, analytic: str, filters: dict|None) -> tuple:
+        """Callback function to zoom into the 'days' figure, see zoomed_day_fig. Resetting the zoom is handled in the browser.
+
+        Args:
+            relayout_data (dict | None): relayoutData of the figure, set when it is zoomed, panned or reset.
+            analytic (str): Input from RadioItems where the input is 'orders' or 'revenue'.
+            filters (dict | None): Value that each filtered dimension must have.
+
+        Returns:
+            tuple: Header element to update the title and a bar plot figure.
+        """
+        if "xaxis.autorange" in (relayout_data or {}):
+            raise PreventUpdate
+
+        return zoomed_day_fig(analytic, relayout_data, filters)
@@ -1,61 +1,151 @@
 import sys
+from typing import TYPE_CHECKING
 
 from dash import Dash, dcc, html
 import dash_bootstrap_components as dbc
 
 sys.path.append("./")
 from src.app.appdata import appdata
+from src.app.appdata.appdata import Snapshot
+from src.app.appdata.figures import dispatch_figure, delivery_figure
 
+# Only imported for type checking, so that the server can start before pandas and plotly.express are imported, see appdata
+if TYPE_CHECKING:
+    from src.data_utils.extractor import KpiBundle
 
-def init_header() -> html.Div:
+
+# Id and title of each KPI card, in the order of kpi_values - the first five are on the overview tab, the next four on the winners tab and the last three on the percentiles tab
+KPI_CARDS = [
+    ("kpi_revenue", "Revenue"),
+    ("kpi_orders", "Orders"),
+    ("kpi_items", "Items Ordered"),
+    ("kpi_daily_revenue", "Daily Revenue"),
+    ("kpi_daily_orders", "Daily Orders"),
+    ("kpi_best_date", "Best Date"),
+    ("kpi_best_weekday", "Best Weekday"),
+    ("kpi_best_month", "Best Month"),
+    ("kpi_top_country", "Top Country"),
+    ("kpi_dispatch_percentiles", "Days to Dispatch"),
+    ("kpi_order_value_percentiles", "Order Value"),
+    ("kpi_items_percentiles", "Items per Order")
+]
+
+
+def filter_text(filters: dict|None) -> str:
+    """Description of the cross-filter of the dashboard.
+
+    Args:
+        filters (dict | None): Value that each filtered dimension must have.
+
+    Returns:
+        str: Description of the filter, or how to set one if there is none.
+    """
+    if not filters:
+        return "Click a country bar or a delivery slice to filter the dashboard."
+
+    labels = []
+    if "country" in filters:
+        labels.append(filters["country"])
+    if "paid" in filters:
+        labels.append("Paid delivery" if filters["paid"] else "Free delivery")
+
+    return f"Filtered to: {', '.join(labels)}"
+
+
+def init_header(snapshot: Snapshot|None) -> html.Div:
     """Header element for the dashboard.
 
+    Args:
+        snapshot (Snapshot | None): Loaded data to display, None for no data (see validation_layout).
+
     Returns:
         html.Div: Header Div component.
     """
+    start, end = (None, None) if snapshot is None else (snapshot.kpis.start, snapshot.kpis.end)
     title = html.H1("E-commerce Dashboard")
-    date_range = html.P(f"{appdata.START} to {appdata.END}")
+    date_range = dcc.DatePickerRange(
+        id="date_range_picker",
+        min_date_allowed=start,
+        max_date_allowed=end,
+        start_date=start,
+        end_date=end,
+        display_format="YYYY-MM-DD",
+        className="date_range_picker"
+    )
+
+    cross_filter = html.Div([
+        html.Span(filter_text(None), id="cross_filter_text"),
+        dbc.Button("Clear filters", id="clear_filters_button", color="secondary", size="sm", n_clicks=0, class_name="clear_filters_button")
+    ], className="cross_filter_div")
 
     header = html.Div([
         title,
-        date_range
+        date_range,
+        cross_filter
     ], className="header_div")
     
     return header
 
 
-def init_info() -> html.Div:
-    """Information element for the dashboard.
+def percentile_text(percentiles: tuple|None) -> str:
+    """Value of a percentiles KPI card.
+
+    Args:
+        percentiles (tuple | None): p50, p90 and p99 of a measure, None if they are not available for the cross-filter.
 
     Returns:
-        html.Div: Information div element.
+        str: The percentiles, e.g. "p50 3 · p90 7 · p99 9".
     """
-    revenue = appdata.TOT_REVENUE
-    revenue_card = dbc.Card(dbc.CardBody([html.H5("Revenue"), revenue]))
+    if percentiles is None:
+        return "-"
 
-    orders = appdata.TOT_ORDERS
-    orders_card = dbc.Card(dbc.CardBody([html.H5("Orders"), orders]))
+    values = [f"{value:,.0f}" if float(value).is_integer() else f"{value:,.2f}" for value in percentiles]
 
-    items = appdata.TOT_ITEMS
-    items_card = dbc.Card(dbc.CardBody([html.H5("Items Ordered"), items]))
+    return " · ".join(f"p{p} {value}" for p, value in zip([50, 90, 99], values))
 
-    daily_revenue = appdata.DAILY_REVENUE
-    daily_revenue_card = dbc.Card(dbc.CardBody([html.H5("Daily Revenue"), daily_revenue]))
 
-    daily_order = appdata.DAILY_ORDERS
-    daily_order_card = dbc.Card(dbc.CardBody([html.H5("Daily Orders"), daily_order]))
+def kpi_values(kpis: "KpiBundle|None") -> list:
+    """Value of each KPI card, see KPI_CARDS.
 
-    date = f"{appdata.TOP_ORDERS_DATE.strftime('%Y-%m-%d')} [{appdata.TOP_ORDERS_DATE_CT} orders]"
-    date_card = dbc.Card(dbc.CardBody([html.H5("Best Date"), date]))
+    Args:
+        kpis (KpiBundle | None): KPIs to display, None if there are no orders in the selected date range.
 
-    weekday = f"{appdata.TOP_ORDERS_DAY} [{appdata.TOP_ORDERS_DAY_CT} orders]"
-    weekday_card = dbc.Card(dbc.CardBody([html.H5("Best Weekday"), weekday]))
+    Returns:
+        list: Value of each KPI card.
+    """
+    if kpis is None:
+        return ["-"] * len(KPI_CARDS)
+
+    return [
+        kpis.total_revenue,
+        kpis.total_orders,
+        kpis.total_items,
+        kpis.daily_revenue,
+        kpis.daily_orders,
+        f"{kpis.top_orders_date.strftime('%Y-%m-%d')} [{kpis.top_orders_date_count} orders]",
+        f"{kpis.top_orders_weekday} [{kpis.top_orders_weekday_count} orders]",
+        f"{kpis.top_orders_month} [{kpis.top_orders_month_count} orders]",
+        f"{kpis.top_orders_country} [{kpis.top_orders_country_count} orders]",
+        percentile_text(kpis.dispatch_percentiles),
+        percentile_text(kpis.order_value_percentiles),
+        percentile_text(kpis.items_percentiles)
+    ]
+
+
+def init_info(snapshot: Snapshot|None) -> html.Div:
+    """Information element for the dashboard.
 
-    month = f"{appdata.TOP_ORDERS_MONTH} [{appdata.TOP_ORDERS_DAY_MONTH} orders]"
-    month_card = dbc.Card(dbc.CardBody([html.H5("Best Month"), month]))
+    Args:
+        snapshot (Snapshot | None): Loaded data to display, None for no data (see validation_layout).
 
-    country = f"{appdata.TOP_ORDERS_COUNTRY} [{appdata.TOP_ORDERS_COUNTRY_CT} orders]"
-    country_card = dbc.Card(dbc.CardBody([html.H5("Top Country"), country]))
+    Returns:
+        html.Div: Information div element.
+    """
+    cards = [
+        dbc.Card(dbc.CardBody([html.H5(card_title), html.Div(value, id=card_id)]))
+        for (card_id, card_title), value in zip(KPI_CARDS, kpi_values(None if snapshot is None else snapshot.kpis))
+    ]
+    revenue_card, orders_card, items_card, daily_revenue_card, daily_order_card, date_card, weekday_card, month_card, country_card, *percentile_cards = cards
 
     overview_tab = dbc.Tab([
         html.Br(),
@@ -78,10 +168,17 @@ def init_info() -> html.Div:
         ])
     ], label="Winners", label_class_name="tab_label")
 
+    # Approximate percentiles of each calendar month the date range overlaps, see DataExtractor.percentiles
+    percentiles_tab = dbc.Tab([
+        html.Br(),
+        dbc.Row([dbc.Col(card) for card in percentile_cards])
+    ], label="Percentiles", label_class_name="tab_label")
+
     info = html.Div([
         dbc.Tabs([
             overview_tab,
-            winners_tab
+            winners_tab,
+            percentiles_tab
         ]),
         html.Br()
     ], className="info_div")
@@ -97,6 +194,7 @@ def init_date_plot() -> html.Div:
     """
     title = html.Div(id="day_plot_title")
     graph = dcc.Graph(id="day_plot_fig", style={"height": "70%"})
+    progress = dbc.Progress(id="day_progress", value=0, striped=True, animated=True, className="chart_progress", style={"visibility": "hidden"})
     options_button = dbc.Button(
         "Options",
         id="date_off_canvas_button",
@@ -141,6 +239,7 @@ def init_date_plot() -> html.Div:
     day = html.Div([
         dbc.Row([dbc.Col(title), dbc.Col(options_button, width=1)]),
         options_off_canvas,
+        progress,
         graph
     ], className="day_div")
 
@@ -155,6 +254,7 @@ def init_country_plot() -> html.Div:
     """
     title = html.Div(id="country_plot_title")
     graph = dcc.Graph(id="country_plot_fig")
+    progress = dbc.Progress(id="country_progress", value=0, striped=True, animated=True, className="chart_progress", style={"visibility": "hidden"})
     options_button = dbc.Button(
         "Options",
         id="country_off_canvas_button",
@@ -198,6 +298,7 @@ def init_country_plot() -> html.Div:
 
     country = html.Div([
         dbc.Row([dbc.Col(options_button, width=1), dbc.Col(title)]),
+        progress,
         graph,
         options_off_canvas
     ], className="country_div")
@@ -205,14 +306,19 @@ def init_country_plot() -> html.Div:
     return country
 
 
-def init_dispatch() -> html.Div:
+def init_dispatch(snapshot: Snapshot|None) -> html.Div:
     """Dispatch plot element that displays the distribution of days taken to dispatch orders.
 
+    Args:
+        snapshot (Snapshot | None): Loaded data to display, None for no data (see validation_layout).
+
     Returns:
         html.Div: Dispatch plot div element.
     """
     dispatch_title = html.H4("Days to Dispatch")          
-    dispatch_graph = dcc.Graph(figure=appdata.extractor.days_to_dispatch())
+    dispatch_graph = dcc.Graph(
+        id="dispatch_fig", figure={} if snapshot is None else dispatch_figure(snapshot.extractor, snapshot.figure_cache)
+    )
 
     dispatch = html.Div([
         dispatch_title,
@@ -222,23 +328,75 @@ def init_dispatch() -> html.Div:
     return dispatch
 
 
+def init_delivery(snapshot: Snapshot|None) -> html.Div:
+    """Delivery plot element that displays the orders and revenue of free and paid deliveries.
+
+    Args:
+        snapshot (Snapshot | None): Loaded data to display, None for no data (see validation_layout).
+
+    Returns:
+        html.Div: Delivery plot div element.
+    """
+    figure = lambda analytic: {} if snapshot is None else delivery_figure(snapshot.extractor, snapshot.figure_cache, analytic)
+    orders_graph = dcc.Graph(id="delivery_orders_fig", figure=figure("orders"))
+    revenue_graph = dcc.Graph(id="delivery_revenue_fig", figure=figure("revenue"))
+
+    delivery = html.Div([
+        dbc.Row([
+            dbc.Col([html.H4("Orders by Delivery"), orders_graph]),
+            dbc.Col([html.H4("Revenue by Delivery"), revenue_graph])
+        ])
+    ], className="delivery_div")
+
+    return delivery
+
+
 def init_layout() -> html.Div:
     """Main application layout initialisation function. Used to initialise the layout and all elements contained within it.
 
     Returns:
         html.Div: Layout div element.
     """
-    layout = html.Div([
+    return page_layout(appdata.current())
+
+
+def validation_layout() -> html.Div:
+    """Every element of the layout, without any data. Dash checks the callbacks against it when the app is created - otherwise it would call init_layout to do so, which loads the data before the server can start.
+
+    Returns:
+        html.Div: Layout div element.
+    """
+    return page_layout(None)
+
+
+def page_layout(snapshot: Snapshot|None) -> html.Div:
+    """Layout of the dashboard, and all elements contained within it.
+
+    Args:
+        snapshot (Snapshot | None): Loaded data to display, None for no data (see validation_layout).
+
+    Returns:
+        html.Div: Layout div element.
+    """
+    # The charts of every input combination, held by the browser if "CLIENT_DATA" is enabled, see init_callbacks
+    chart_data = []
+    if snapshot is None or snapshot.client_data is not None:
+        chart_data = [dcc.Store(id="chart_data", data=None if snapshot is None else snapshot.client_data)]
+    # The value of each dimension that the dashboard is cross-filtered to, set by clicking the charts
+    cross_filter = [dcc.Store(id="cross_filter", data={})]
+    layout = html.Div(chart_data + cross_filter + [
         html.Div([
-            init_header(),
-            init_info(),
+            init_header(snapshot),
+            init_info(snapshot),
             html.Hr(),
             init_date_plot(),
             html.Hr(),
             dbc.Row([
                 dbc.Col(init_country_plot()),
-                dbc.Col(init_dispatch())
-            ])
+                dbc.Col(init_dispatch(snapshot))
+            ]),
+            html.Hr(),
+            init_delivery(snapshot)
         ], className="main_div")
     ], className="page_div")
 
@@ -0,0 +1,102 @@
+import sys
+import hashlib
+
+from dash import Dash
+from flask import Response, g, request
+
+sys.path.append("./")
+from src.app.appdata import appdata
+from src.app.appdata.response_cache import CachedResponse, compress_response
+
+
+def _encoding(response: CachedResponse) -> str:
+    """Best encoding of a response that the client of the current request accepts.
+
+    Args:
+        response (CachedResponse): Cached response.
+
+    Returns:
+        str: "br", "gzip" or "identity".
+    """
+    for encoding in ["br", "gzip"]:
+        if encoding in response.bodies and request.accept_encodings.quality(encoding) > 0:
+            return encoding
+
+    return "identity"
+
+
+def _respond(cached: CachedResponse, response: Response|None=None) -> Response:
+    """Response to the current request from a cached response, in the best encoding the client accepts - or 304 Not Modified, if the client already has it (its If-None-Match has the ETag of the response in any encoding).
+
+    Args:
+        cached (CachedResponse): Cached response.
+        response (Response | None, optional): Response of the view to update in place, so that any other headers it has are kept. Defaults to None, a new response.
+
+    Returns:
+        Response: Response to the request.
+    """
+    encoding = _encoding(cached)
+    if response is None:
+        response = Response(mimetype=cached.mimetype)
+
+    if any(request.if_none_match.contains(cached.encoding_etag(other)) for other in ["identity", "gzip", "br"]):
+        response.status_code = 304
+        response.set_data(b"")
+        response.headers.pop("Content-Type", None)
+    else:
+        response.set_data(cached.body(encoding))
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+
+    response.set_etag(cached.encoding_etag(encoding))
+    response.headers["Vary"] = "Accept-Encoding"
+    # Cached by the browser, but checked with the server (with the ETag) on every use, so a reload of the data is seen straight away
+    response.headers["Cache-Control"] = "no-cache"
+
+    return response
+
+
+def init_responses(app: Dash) -> None:
+    """Serves the page layout and the callback responses of the dashboard from the response cache of the current snapshot (see ResponseCache), compressed and with a strong ETag. The layout and each callback response are built, serialised and compressed once per load of the data - a repeat request gets the stored compressed body, or 304 Not Modified if the browser already has it.
+
+    Only requests that depend on nothing but the loaded data and the request body are cached - background callbacks, whose responses are jobs and their progress, are not (their results are cached by their job manager instead, see src/app/background.py).
+
+    Args:
+        app (Dash): Dashboard.
+    """
+    prefix = app.config.routes_pathname_prefix
+    routes = {f"{prefix}_dash-layout": "layout", f"{prefix}_dash-update-component": "callback"}
+    server = app.server
+
+    @server.before_request
+    def serve_cached() -> Response|None:
+        route = routes.get(request.path)
+        if route is None or request.args:
+            return None
+        if route == "callback":
+            callback = app.callback_map.get((request.get_json(silent=True) or {}).get("output"), {})
+            if callback.get("background"):
+                return None
+
+        snapshot = appdata.current()
+        key = (route, hashlib.blake2b(request.get_data(), digest_size=16).digest())
+        g.response_cache = (snapshot, key)
+        cached = snapshot.response_cache.get(key)
+        if cached is None:
+            return None
+        g.response_cached = True
+
+        return _respond(cached)
+
+    @server.after_request
+    def store_response(response: Response) -> Response:
+        if "response_cache" not in g or g.get("response_cached") or response.status_code != 200 or response.direct_passthrough:
+            return response
+
+        # Stored in the snapshot the request started with - if the data was reloaded in the meantime, that snapshot is no longer served
+        snapshot, key = g.response_cache
+        cached = compress_response(response.get_data(), response.mimetype, snapshot.fingerprint)
+        snapshot.response_cache.store(key, cached)
+
+        return _respond(cached, response)
+
@@ -0,0 +1,560 @@
+import gc
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import platform
+import statistics
+import tracemalloc
+from typing import Callable
+from dataclasses import dataclass, asdict
+
+import numpy as np
+import pandas as pd
+
+sys.path.append("./")
+from src.data_utils.generator import DataGenerator
+from src.data_utils.transformer import DataTransformer
+from src.data_utils.extractor import DataExtractor
+from src.data_utils.quantile_sketch import MEASURES, MIN_VALUE, PERCENTILES
+
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000, 10_000_000]
+# generate_n_rows builds rows one at a time in Python, so it is only benchmarked up to this size
+ROWWISE_MAX_ROWS = 100_000
+# Folder in src/data/ that the generated datasets are written to while benchmarking
+DATA_FOLDER = ".benchmarks"
+RESULTS_DIR = "src/benchmarks/results"
+# A benchmark only regresses if it is also slower by at least this many seconds, so that noise in very fast benchmarks is not flagged
+MIN_SECONDS_DELTA = 0.005
+# Configuration of the generated datasets
+CONFIG = {
+    "SALE_DATE": "date",
+    "QUANTITY": "quantity",
+    "PRICE": "price",
+    "PAID_DATE": None,
+    "POSTED_DATE": "post_date",
+    "COUNTRY": "country",
+    "DELIVERY_COST": "delivery_cost",
+    "DATE_FORMAT": None,
+    "CACHE": False,
+    "COMPACT": False,
+    "ROLLUP": False,
+    "PRERENDER_FIGURES": False,
+    "FIGURE_CACHE_MB": 64,
+    "ZOOM_MAX_POINTS": 400,
+    "RELOAD_INTERVAL": None,
+    "INCREMENTAL_FILES": None,
+    "WORKERS": None,
+    "STREAMING": False,
+    "STREAM_MEMORY_MB": 256
+}
+# Method and arguments of each DataExtractor call that is benchmarked
+EXTRACTOR_CALLS = [
+    ("total_orders", ()),
+    ("total_items", ()),
+    ("total_revenue", ()),
+    ("average_revenue", ()),
+    ("country_grouping", ("orders",)),
+    ("country_grouping", ("revenue",)),
+    ("country_grouping", ("mean_revenue",)),
+    ("country_plots", ("orders", "head")),
+    ("country_plots", ("revenue", "tail")),
+    ("country_plots", ("mean_revenue", "head")),
+    ("country_leaderboard", ("revenue", 10, True)),
+    ("days_to_dispatch", ()),
+    ("order_delivery_charge", ()),
+    ("revenue_delivery_charge", ()),
+    ("time_series", ("orders", "day")),
+    ("time_series", ("revenue", "month")),
+    ("orders_per_day", ("day",)),
+    ("orders_per_day", ("week",)),
+    ("revenue_per_day", ("month",)),
+    ("date_range", ()),
+    ("number_of_days", ()),
+    ("kpi_bundle", ()),
+    ("best_datetime_performance", ("orders", "weekday")),
+    ("best_datetime_performance", ("revenue", "month"))
+]
+
+
+@dataclass
+class BenchmarkResult:
+    """Timing and memory of one benchmark at one dataset size - and, for a benchmark of approximate results, their largest relative error against the exact results.
+    """
+    name: str
+    rows: int
+    seconds: float
+    min_seconds: float
+    repeat: int
+    peak_bytes: int|None
+    relative_error: float|None = None
+
+
+class BenchmarkSuite:
+    """Benchmarks the generator -> transformer -> extractor -> callbacks pipeline on generated datasets of several sizes. Every benchmark is timed over several runs (the median and minimum are kept), and run once more under tracemalloc for its peak memory - which is left out of the timed runs, as tracing slows every allocation down.
+
+    Args:
+        sizes (list): Number of rows of each dataset.
+        repeat (int, optional): Number of timed runs of each benchmark. Defaults to 3.
+        memory (bool, optional): Whether to measure the peak memory of each benchmark. Defaults to True.
+    """
+    def __init__(self, sizes: list, repeat: int=3, memory: bool=True) -> None:
+        self.sizes = sizes
+        self.repeat = repeat
+        self.memory = memory
+        self.results = []
+        self.generator = DataGenerator(start="2023-01-01", end="2023-12-31")
+
+    def measure(self, name: str, rows: int, fn: Callable, setup: Callable|None=None) -> BenchmarkResult:
+        """Times a function, and measures its peak memory. The setup, if any, is run before every run and is not measured - its return value is passed to the function.
+
+        Args:
+            name (str): Name of the benchmark.
+            rows (int): Number of rows of the dataset.
+            fn (Callable): Function to benchmark.
+            setup (Callable | None, optional): Function that returns the arguments of fn as a tuple. Defaults to None.
+
+        Returns:
+            BenchmarkResult: Result of the benchmark.
+        """
+        times = []
+        for _ in range(self.repeat):
+            args = setup() if setup is not None else ()
+            gc.collect()
+            start = time.perf_counter()
+            fn(*args)
+            times.append(time.perf_counter() - start)
+
+        peak_bytes = None
+        if self.memory:
+            args = setup() if setup is not None else ()
+            gc.collect()
+            tracemalloc.start()
+            fn(*args)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        result = BenchmarkResult(
+            name=name, rows=rows, seconds=statistics.median(times), min_seconds=min(times),
+            repeat=self.repeat, peak_bytes=peak_bytes
+        )
+        self.results.append(result)
+        memory = f"{peak_bytes / 1024**2:10.1f} MB" if peak_bytes is not None else ""
+        print(f"{name:<70} {rows:>11,} {result.seconds * 1000:12.2f} ms{memory}")
+
+        return result
+
+    def bench_generator(self, rows: int) -> pd.DataFrame:
+        """Benchmarks generating a dataset, row by row (up to ROWWISE_MAX_ROWS rows) and in bulk.
+
+        Args:
+            rows (int): Number of rows.
+
+        Returns:
+            pd.DataFrame: Generated dataset.
+        """
+        if rows <= ROWWISE_MAX_ROWS:
+            self.measure("DataGenerator.generate_n_rows()", rows, lambda: self.generator.generate_n_rows(rows))
+        self.measure(
+            "DataGenerator.generate_n_rows(bulk=True)", rows,
+            lambda: self.generator.generate_n_rows(rows, bulk=True, seed=0)
+        )
+
+        return self.generator.generate_n_rows(rows, bulk=True, seed=0)
+
+    def bench_transformer(self, rows: int, config: dict) -> tuple:
+        """Benchmarks loading a generated dataset from a CSV file, and transforming it with and without the rollup.
+
+        Args:
+            rows (int): Number of rows of the dataset.
+            config (dict): Configuration of the dataset.
+
+        Returns:
+            tuple: Transformed dataset, and its rollup.
+        """
+        self.measure("DataTransformer.load_file()", rows, lambda: DataTransformer(config=config))
+        raw = DataTransformer(config=config).df
+
+        for rollup in [False, True]:
+            variant_config = {**config, "ROLLUP": rollup}
+            self.measure(
+                f"DataTransformer.apply_transformations(ROLLUP={rollup})", rows,
+                lambda transformer: transformer.apply_transformations(),
+                setup=lambda: (DataTransformer(df=raw.copy(), config=variant_config),)
+            )
+
+        transformer = DataTransformer(df=raw, config={**config, "ROLLUP": True})
+        transformer.apply_transformations()
+
+        return transformer.df, transformer.rollup
+
+    def bench_extractor(self, rows: int, df: pd.DataFrame, rollup: pd.DataFrame) -> None:
+        """Benchmarks every DataExtractor method, answered from the rows and from the rollup.
+
+        Args:
+            rows (int): Number of rows of the dataset.
+            df (pd.DataFrame): Transformed dataset.
+            rollup (pd.DataFrame): Rollup of the dataset.
+        """
+        for variant, variant_rollup in [("rows", None), ("rollup", rollup)]:
+            extractor = DataExtractor(df, rollup=variant_rollup)
+            for method, args in EXTRACTOR_CALLS:
+                call = getattr(extractor, method)
+                self.measure(
+                    f"DataExtractor[{variant}].{method}({', '.join(map(repr, args))})", rows, lambda: call(*args)
+                )
+
+            self.measure(
+                f"DataExtractor[{variant}].time_pyramid()", rows,
+                lambda extractor: extractor.time_pyramid(),
+                setup=lambda: (DataExtractor(df, rollup=variant_rollup),)
+            )
+            start, end = extractor.date_range()
+            middle = pd.Timestamp(start) + (pd.Timestamp(end) - pd.Timestamp(start)) / 2
+            zoom = (str(middle.date()), str((middle + pd.Timedelta(days=30)).date()))
+            self.measure(
+                f"DataExtractor[{variant}].zoomed_plot('revenue', <30 days>)", rows,
+                lambda: extractor.zoomed_plot("revenue", *zoom, max_points=CONFIG["ZOOM_MAX_POINTS"])
+            )
+
+            self.measure(
+                f"DataExtractor[{variant}].time_index()", rows,
+                lambda extractor: extractor.time_index(),
+                setup=lambda: (DataExtractor(df, rollup=variant_rollup),)
+            )
+            self.measure(
+                f"DataExtractor[{variant}].kpi_bundle(<30 days>)", rows, lambda: extractor.kpi_bundle(*zoom)
+            )
+            self.measure(
+                f"DataExtractor[{variant}].country_grouping('revenue', <30 days>)", rows,
+                lambda: extractor.country_grouping("revenue", *zoom)
+            )
+
+            self.measure(
+                f"DataExtractor[{variant}].bitmap_index()", rows,
+                lambda extractor: extractor.bitmap_index(),
+                setup=lambda: (DataExtractor(df, rollup=variant_rollup),)
+            )
+            # Cross-filtered to the country with the most orders and paid delivery
+            filters = {"country": extractor.country_leaderboard("orders", 1).index[0], "paid": True}
+            self.measure(
+                f"DataExtractor[{variant}].kpi_bundle(<country, paid>)", rows, lambda: extractor.kpi_bundle(filters=filters)
+            )
+            self.measure(
+                f"DataExtractor[{variant}].time_series('revenue', 'week', <country, paid>)", rows,
+                lambda: extractor.time_series("revenue", "week", filters=filters)
+            )
+            self.measure(
+                f"DataExtractor[{variant}].country_leaderboard('revenue', <paid, 30 days>)", rows,
+                lambda: extractor.country_leaderboard("revenue", 10, False, *zoom, filters={"paid": True})
+            )
+
+    def bench_percentiles(self, rows: int, df: pd.DataFrame) -> None:
+        """Benchmarks the approximate percentiles of the sketch index against the exact percentiles of the rows (np.quantile with method="lower", which the sketches approximate) - of the whole data, of a cross-filter over whole calendar months, and of each country - and records the largest relative error of the approximate percentiles.
+
+        Args:
+            rows (int): Number of rows of the dataset.
+            df (pd.DataFrame): Transformed dataset.
+        """
+        quantiles = [p / 100 for p in PERCENTILES]
+        self.measure(
+            "DataExtractor.sketch_index()", rows,
+            lambda extractor: extractor.sketch_index(),
+            setup=lambda: (DataExtractor(df),)
+        )
+        extractor = DataExtractor(df)
+        extractor.sketch_index()
+
+        # Cross-filtered to the country with the most orders and paid delivery, over the first three months of the data
+        country = df["country"].value_counts().index[0]
+        filters = {"country": country, "paid": True}
+        months = df["date"].dt.to_period("M")
+        first = months.min()
+        window = (str(first.start_time.date()), str((first + 2).end_time.date()))
+        filtered = (months <= first + 2) & df["country"].eq(country) & df["delivery_cost"].ne(0)
+
+        for measure, column in MEASURES.items():
+            valid = df[column].notna()
+            cases = [
+                ("", (), df.loc[valid, column].to_numpy()),
+                (", <country, paid, 3 months>", (*window, filters), df.loc[valid & filtered, column].to_numpy())
+            ]
+            for label, args, values in cases:
+                result = self.measure(
+                    f"DataExtractor.percentiles('{measure}'{label})", rows, lambda: extractor.percentiles(measure, *args)
+                )
+                self.measure(f"np.quantile('{measure}'{label})", rows, lambda: np.quantile(values, quantiles, method="lower"))
+                self._record_error(result, extractor.percentiles(measure, *args), np.quantile(values, quantiles, method="lower"))
+
+            result = self.measure(
+                f"DataExtractor.country_percentiles('{measure}')", rows, lambda: extractor.country_percentiles(measure)
+            )
+            exact = lambda: df.groupby("country", observed=True)[column].quantile(quantiles, interpolation="lower").unstack()
+            self.measure(f"DataFrame.groupby('country').quantile('{measure}')", rows, exact)
+            approximate = extractor.country_percentiles(measure)
+            self._record_error(result, approximate.to_numpy(), exact().loc[approximate.index].to_numpy())
+
+    @staticmethod
+    def _record_error(result: BenchmarkResult, approximate: np.ndarray, exact: np.ndarray) -> None:
+        """Records the largest relative error of approximate results against the exact results, in the result of their benchmark. Exact results smaller than the smallest value the sketches tell apart are compared with that value instead, so that an exact 0 does not divide by zero.
+
+        Args:
+            result (BenchmarkResult): Result of the benchmark of the approximate results.
+            approximate (np.ndarray): Approximate results.
+            exact (np.ndarray): Exact results.
+        """
+        approximate, exact = np.asarray(approximate, dtype=np.float64), np.asarray(exact, dtype=np.float64)
+        result.relative_error = float(np.max(np.abs(approximate - exact) / np.maximum(np.abs(exact), MIN_VALUE), initial=0))
+        print(f"{'  relative error':<70} {result.rows:>11,} {result.relative_error:14.3%}")
+
+    def bench_callbacks(self, rows: int, config: dict) -> None:
+        """Benchmarks the update_day_fig and update_country_fig callbacks through the Dash server, as the browser calls them - cold (with empty figure and response caches), warm, zoomed into the timeline, and cross-filtered - and serving the page layout, cold, cached and unchanged (304 Not Modified).
+
+        Args:
+            rows (int): Number of rows of the dataset.
+            config (dict): Configuration of the dataset.
+        """
+        from src.app.app import app
+        from src.app.appdata import appdata
+
+        appdata.reload(config)
+        client = app.server.test_client()
+        start, end = appdata.current().kpis.start, appdata.current().kpis.end
+        middle = pd.Timestamp(start) + (pd.Timestamp(end) - pd.Timestamp(start)) / 2
+        zoom = {
+            "xaxis.range[0]": str(middle.date()),
+            "xaxis.range[1]": str((middle + pd.Timedelta(days=30)).date())
+        }
+
+        # The date range picker covers the whole data, and the dashboard is not cross-filtered
+        date_inputs = [
+            {"id": "date_range_picker", "property": "start_date", "value": start},
+            {"id": "date_range_picker", "property": "end_date", "value": end}
+        ]
+
+        def day_fig(relayout_data: dict|None, triggered: str) -> None:
+            self._post_callback(client, {
+                "output": "..day_plot_title.children...day_plot_fig.figure..",
+                "outputs": [
+                    {"id": "day_plot_title", "property": "children"}, {"id": "day_plot_fig", "property": "figure"}
+                ],
+                "inputs": [
+                    {"id": "day_callback", "property": "value", "value": "revenue"},
+                    {"id": "granularity_slider", "property": "value", "value": 2},
+                    {"id": "day_plot_fig", "property": "relayoutData", "value": relayout_data},
+                    *date_inputs,
+                    {"id": "cross_filter", "property": "data", "value": {}}
+                ],
+                "changedPropIds": [triggered],
+                "state": []
+            })
+
+        def country_fig(filters: dict) -> None:
+            self._post_callback(client, {
+                "output": "..country_plot_title.children...country_plot_fig.figure..",
+                "outputs": [
+                    {"id": "country_plot_title", "property": "children"},
+                    {"id": "country_plot_fig", "property": "figure"}
+                ],
+                "inputs": [
+                    {"id": "country_analytic_callback", "property": "value", "value": "revenue"},
+                    {"id": "head_tail_country_callback", "property": "value", "value": "head"},
+                    *date_inputs,
+                    {"id": "cross_filter", "property": "data", "value": filters}
+                ],
+                "changedPropIds": ["country_analytic_callback.value"],
+                "state": []
+            })
+
+        def clear_cache() -> tuple:
+            appdata.current().figure_cache.clear()
+            appdata.current().response_cache.clear()
+            return ()
+
+        def clear_responses() -> tuple:
+            appdata.current().response_cache.clear()
+            return ()
+
+        def layout(headers: dict) -> str|None:
+            response = client.get("/_dash-layout", headers={"Accept-Encoding": "gzip", **headers})
+            if response.status_code not in [200, 304]:
+                raise RuntimeError(f"Layout failed with status {response.status_code}: {response.data[:200]}")
+            return response.headers.get("ETag")
+
+        self.measure(
+            "update_day_fig(cold)", rows, lambda: day_fig(None, "granularity_slider.value"), setup=clear_cache
+        )
+        self.measure("update_day_fig(warm)", rows, lambda: day_fig(None, "granularity_slider.value"))
+        self.measure("update_day_fig(zoom)", rows, lambda: day_fig(zoom, "day_plot_fig.relayoutData"))
+        self.measure("update_country_fig(cold)", rows, lambda: country_fig({}), setup=clear_cache)
+        self.measure("update_country_fig(warm)", rows, lambda: country_fig({}))
+        self.measure(
+            "update_country_fig(cross-filtered)", rows, lambda: country_fig({"paid": True}), setup=clear_cache
+        )
+        self.measure("serve_layout(cold)", rows, lambda: layout({}), setup=clear_responses)
+        self.measure("serve_layout(cached)", rows, lambda: layout({}))
+        etag = layout({})
+        self.measure("serve_layout(304)", rows, lambda: layout({"If-None-Match": etag}))
+
+    @staticmethod
+    def _post_callback(client, body: dict) -> None:
+        """Calls a callback through the Dash server.
+
+        Args:
+            client (FlaskClient): Test client of the Dash server.
+            body (dict): Request body of the callback, as sent by the browser.
+        """
+        response = client.post("/_dash-update-component", json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"Callback failed with status {response.status_code}: {response.data[:200]}")
+
+    def run(self) -> list:
+        """Runs every benchmark at every dataset size. Each dataset is written to a CSV file in src/data/.benchmarks/, which is removed afterwards.
+
+        Returns:
+            list: BenchmarkResult of every benchmark.
+        """
+        data_dir = os.path.join("src/data", DATA_FOLDER)
+        os.makedirs(data_dir, exist_ok=True)
+        try:
+            for rows in self.sizes:
+                df = self.bench_generator(rows)
+                filename = f"{DATA_FOLDER}/orders_{rows}"
+                df.to_csv(f"src/data/{filename}.csv", index=False)
+                del df
+
+                config = {**CONFIG, "FILENAME": filename}
+                df, rollup = self.bench_transformer(rows, config)
+                self.bench_extractor(rows, df, rollup)
+                self.bench_percentiles(rows, df)
+                del df, rollup
+                self.bench_callbacks(rows, config)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+        return self.results
+
+
+def save_results(results: list, path: str, sizes: list, repeat: int) -> None:
+    """Writes benchmark results to a JSON file, along with the environment they were measured in.
+
+    Args:
+        results (list): BenchmarkResult of every benchmark.
+        path (str): Path of the JSON file.
+        sizes (list): Number of rows of each dataset.
+        repeat (int): Number of timed runs of each benchmark.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "sizes": sizes,
+            "repeat": repeat
+        },
+        "results": [asdict(result) for result in results]
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=4)
+
+
+def load_results(path: str) -> list:
+    """Reads benchmark results written by save_results.
+
+    Args:
+        path (str): Path of the JSON file.
+
+    Returns:
+        list: BenchmarkResult of every benchmark.
+    """
+    return [BenchmarkResult(**result) for result in json.load(open(path))["results"]]
+
+
+def compare_results(baseline: list, results: list, threshold: float=0.2, memory_threshold: float=0.2) -> list:
+    """Compares benchmark results against a baseline, and prints the change of every benchmark that is in both. Times are compared by their fastest run, which is the least affected by noise from the rest of the machine. A benchmark regresses if its fastest time grew by more than threshold (and MIN_SECONDS_DELTA), or its peak memory by more than memory_threshold.
+
+    Args:
+        baseline (list): BenchmarkResult of every benchmark of the baseline.
+        results (list): BenchmarkResult of every benchmark to compare.
+        threshold (float, optional): Relative growth of the time that is a regression. Defaults to 0.2.
+        memory_threshold (float, optional): Relative growth of the peak memory that is a regression. Defaults to 0.2.
+
+    Returns:
+        list: Name and number of rows of every benchmark that regressed.
+    """
+    baseline = {(result.name, result.rows): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = baseline.get((result.name, result.rows))
+        if before is None:
+            continue
+
+        time_change = result.min_seconds / before.min_seconds - 1 if before.min_seconds else 0.0
+        slower = time_change > threshold and result.min_seconds - before.min_seconds > MIN_SECONDS_DELTA
+        memory_change, larger = None, False
+        if result.peak_bytes is not None and before.peak_bytes:
+            memory_change = result.peak_bytes / before.peak_bytes - 1
+            larger = memory_change > memory_threshold
+
+        flag = "REGRESSION" if slower or larger else ""
+        memory = f"{memory_change:+9.1%}" if memory_change is not None else ""
+        print(f"{result.name:<70} {result.rows:>11,} {time_change:+9.1%}{memory} {flag}")
+        if slower or larger:
+            regressions.append((result.name, result.rows))
+
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks the generator, transformer, extractor and callbacks.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Runs the benchmarks and writes the results to a JSON file.")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Number of rows of each dataset.")
+    run_parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs of each benchmark.")
+    run_parser.add_argument("--no-memory", action="store_true", help="Skips measuring the peak memory.")
+    run_parser.add_argument("--output", default=None, help="Path of the JSON file of the results.")
+    run_parser.add_argument("--baseline", default=None, help="Results to compare against once the benchmarks are run.")
+
+    compare_parser = subparsers.add_parser("compare", help="Compares results against a baseline.")
+    compare_parser.add_argument("baseline", help="JSON file of the baseline results.")
+    compare_parser.add_argument("results", help="JSON file of the results to compare.")
+
+    for subparser in [run_parser, compare_parser]:
+        subparser.add_argument("--threshold", type=float, default=0.2, help="Relative growth of the time that is a regression.")
+        subparser.add_argument(
+            "--memory-threshold", type=float, default=0.2, help="Relative growth of the peak memory that is a regression."
+        )
+    args = parser.parse_args()
+
+    if args.command == "run":
+        suite = BenchmarkSuite(sizes=args.sizes, repeat=args.repeat, memory=not args.no_memory)
+        results = suite.run()
+        output = args.output or os.path.join(
+            RESULTS_DIR, f"benchmark-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+        )
+        save_results(results, output, args.sizes, args.repeat)
+        print(f"Results written to {output}")
+        baseline_path = args.baseline
+    else:
+        results = load_results(args.results)
+        baseline_path = args.baseline
+
+    if baseline_path is not None:
+        regressions = compare_results(load_results(baseline_path), results, args.threshold, args.memory_threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed.")
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
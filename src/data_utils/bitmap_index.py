@@ -0,0 +1,239 @@
+import sys
+import calendar
+
+import numpy as np
+import pandas as pd
+
+sys.path.append("./")
+from src.data_utils.pyramid import GRANULARITIES
+
+
+# Dimensions with at most this many values are indexed as packed bitmaps (one bit per row per value), and dimensions with more values as lists of row ids, which take less memory once each value only matches a small share of the rows
+BITMAP_MAX_VALUES = 64
+
+
+class BitmapIndex:
+    """Index of the rows of the data that match each value of each dimension (e.g. each country, delivery type, weekday and month), for cross-filtering. The rows of a filter (e.g. the orders of one country with paid delivery) are found by intersecting the precomputed rows of each of its values - a bitwise and of packed bitmaps, or a lookup of row ids - rather than by comparing every row. The rows are kept sorted by date, so a date range is a contiguous slice of the rows found with two binary searches.
+
+    Besides the given dimensions, the rows are indexed by "weekday" and "month" (derived from their dates), and can be grouped by "date" (their day).
+
+    Args:
+        dates (np.ndarray): Date of each order (or of each row of a rollup).
+        orders (np.ndarray | None): Number of orders of each row, None if every row is one order.
+        items (np.ndarray): Number of items of each row.
+        revenue (np.ndarray): Revenue of each row.
+        dimensions (dict): Value of each row of each dimension to index, keyed by the name of the dimension.
+    """
+    def __init__(self, dates: np.ndarray, orders: np.ndarray|None, items: np.ndarray, revenue: np.ndarray, dimensions: dict) -> None:
+        dates = np.asarray(dates, dtype="datetime64[ns]")
+        valid = np.flatnonzero(~np.isnat(dates))
+        rows = valid[np.argsort(dates[valid], kind="stable")]
+
+        self.dates = dates[rows]
+        self.size = len(rows)
+        self.measures = {
+            "orders": None if orders is None else np.asarray(orders)[rows],
+            "items": np.asarray(items)[rows],
+            "revenue": np.asarray(revenue)[rows]
+        }
+
+        # Every day from the first to the last date, and the row at which each day starts, plus the end of the last day
+        first_day = self.dates[0].astype("datetime64[D]")
+        self.days = pd.date_range(first_day, self.dates[-1].astype("datetime64[D]"), freq="D")
+        self.day_starts = np.append(np.searchsorted(self.dates, self.days.to_numpy()), self.size)
+
+        self.values = {"date": self.days}
+        self.codes = {"date": (self.dates.astype("datetime64[D]") - first_day).astype(np.int32)}
+        self.postings = {}
+
+        calendar_dates = pd.DatetimeIndex(self.dates)
+        dimension_codes = {
+            name: pd.factorize(pd.Series(values).iloc[rows], sort=True) for name, values in dimensions.items()
+        }
+        dimension_codes["weekday"] = (calendar_dates.weekday.to_numpy(), pd.Index(list(calendar.day_name)))
+        dimension_codes["month"] = (calendar_dates.month.to_numpy() - 1, pd.Index(list(calendar.month_name)[1:]))
+
+        for name, (codes, values) in dimension_codes.items():
+            values = pd.Index(np.asarray(values), name=name)
+            codes = codes.astype(np.int16 if len(values) < 2**15 else np.int32)
+            self.values[name] = values
+            self.codes[name] = codes
+            if len(values) <= BITMAP_MAX_VALUES:
+                self.postings[name] = np.stack([np.packbits(codes == code) for code in range(len(values))])
+            else:
+                # Rows sorted by value (rows with a missing value first), and the position at which each value starts
+                order = np.argsort(codes, kind="stable").astype(np.int32 if self.size < 2**31 else np.int64)
+                self.postings[name] = (order, np.searchsorted(codes[order], np.arange(len(values) + 1)))
+
+    def _day_span(self, start: str|None, end: str|None) -> tuple:
+        """Range of the days of the index that are within a date range.
+
+        Args:
+            start (str | None): First day of the range, None for the first day of the data.
+            end (str | None): Last day of the range, None for the last day of the data.
+
+        Returns:
+            tuple: Index of the first day, and one past the index of the last day.
+        """
+        first = 0 if start is None else np.searchsorted(self.days, pd.Timestamp(start).normalize())
+        last = len(self.days) if end is None else np.searchsorted(self.days, pd.Timestamp(end).normalize(), side="right")
+
+        return first, max(last, first)
+
+    def _row_span(self, start: str|None, end: str|None) -> tuple:
+        """Range of the rows that are within a date range.
+
+        Args:
+            start (str | None): First day of the range, None for the first day of the data.
+            end (str | None): Last day of the range, None for the last day of the data.
+
+        Returns:
+            tuple: Index of the first row, and one past the index of the last row.
+        """
+        first, last = self._day_span(start, end)
+
+        return self.day_starts[first], self.day_starts[last]
+
+    def mask(self, filters: dict|None=None, start: str|None=None, end: str|None=None) -> tuple:
+        """Rows that match a filter within a date range. The bitmaps of the filter are intersected packed, eight rows per byte, and only the bytes of the date range are unpacked.
+
+        Args:
+            filters (dict | None, optional): Value that each filtered dimension must have, keyed by the name of the dimension. Defaults to None, no filter.
+            start (str | None, optional): First day of the date range. Defaults to None, the first day of the data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the last day of the data.
+
+        Returns:
+            tuple: Index of the first row of the date range, one past the index of its last row, and whether each row of the range matches the filter (None if there is no filter).
+        """
+        first, last = self._row_span(start, end)
+        packed, row_ids = None, []
+        for name, value in (filters or {}).items():
+            values = self.values[name]
+            if value not in values:
+                return first, last, np.zeros(last - first, dtype=bool)
+            code = values.get_loc(value)
+            if isinstance(self.postings[name], tuple):
+                order, bounds = self.postings[name]
+                row_ids.append(order[bounds[code]:bounds[code + 1]])
+            else:
+                bitmap = self.postings[name][code]
+                packed = bitmap if packed is None else packed & bitmap
+
+        mask = None
+        if packed is not None:
+            offset = first % 8
+            unpacked = np.unpackbits(packed[first // 8:(last + 7) // 8])
+            mask = unpacked[offset:offset + last - first].view(bool)
+
+        for ids in row_ids:
+            # The row ids of a value are sorted, so those of the date range are a slice of them
+            ids = ids[np.searchsorted(ids, first):np.searchsorted(ids, last)] - first
+            matched = np.zeros(last - first, dtype=bool)
+            matched[ids] = True if mask is None else mask[ids]
+            mask = matched
+
+        return first, last, mask
+
+    def _select(self, array: np.ndarray|None, first: int, last: int, mask: np.ndarray|None) -> np.ndarray|None:
+        """Values of an array of the rows that match a filter within a date range, see mask.
+
+        Args:
+            array (np.ndarray | None): Value of each row.
+            first (int): Index of the first row of the date range.
+            last (int): One past the index of the last row of the date range.
+            mask (np.ndarray | None): Whether each row of the date range matches the filter.
+
+        Returns:
+            np.ndarray | None: Values of the matching rows, None if the array is None.
+        """
+        if array is None:
+            return None
+        array = array[first:last]
+
+        return array if mask is None else array[mask]
+
+    def totals(self, dimension: str, measure: str, filters: dict|None=None, start: str|None=None, end: str|None=None) -> pd.Series:
+        """Total of a measure for each value of a dimension, over the rows that match a filter within a date range.
+
+        Args:
+            dimension (str): Dimension to group by - an indexed dimension, "weekday", "month" or "date".
+            measure (str): Measure to total - must be "orders", "items" or "revenue".
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, no filter.
+            start (str | None, optional): First day of the date range. Defaults to None, the first day of the data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the last day of the data.
+
+        Returns:
+            pd.Series: Total of the measure for each value of the dimension that has matching rows.
+        """
+        first, last, mask = self.mask(filters, start, end)
+        values = self.values[dimension]
+        codes = self._select(self.codes[dimension], first, last, mask)
+        weights = self._select(self.measures[measure], first, last, mask)
+        known = codes >= 0
+        if not known.all():
+            codes, weights = codes[known], None if weights is None else weights[known]
+
+        counts = np.bincount(codes, minlength=len(values))
+        totals = counts if weights is None else np.bincount(codes, weights=weights, minlength=len(values))
+        if measure in ["orders", "items"]:
+            totals = totals.round().astype(np.int64)
+
+        return pd.Series(totals, index=values)[counts > 0]
+
+    def series(self, measure: str, granularity: str, filters: dict|None=None, start: str|None=None, end: str|None=None) -> pd.Series:
+        """A measure of the rows that match a filter over a date range, in calendar-aligned buckets, with empty buckets as 0.
+
+        Args:
+            measure (str): Measure to get - must be "orders", "items" or "revenue".
+            granularity (str): Bucket size - must be "day", "week", "month" or "quarter".
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, no filter.
+            start (str | None, optional): First day of the date range. Defaults to None, the first day of the data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the last day of the data.
+
+        Returns:
+            pd.Series: Measure for each bucket, indexed by the start of the bucket.
+        """
+        first, last = self._day_span(start, end)
+        daily = self.totals("date", measure, filters, start, end).reindex(self.days[first:last], fill_value=0)
+        if granularity == "day":
+            return daily
+
+        return daily.resample(GRANULARITIES[granularity]["rule"], label="left", closed="left").sum()
+
+    def rows(self, filters: dict|None=None, start: str|None=None, end: str|None=None) -> dict:
+        """Date, orders and revenue of the rows that match a filter within a date range.
+
+        Args:
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, no filter.
+            start (str | None, optional): First day of the date range. Defaults to None, the first day of the data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the last day of the data.
+
+        Returns:
+            dict: Date, orders (None if every row is one order) and revenue of each matching row.
+        """
+        first, last, mask = self.mask(filters, start, end)
+
+        return {
+            "date": self._select(self.dates, first, last, mask),
+            "orders": self._select(self.measures["orders"], first, last, mask),
+            "revenue": self._select(self.measures["revenue"], first, last, mask)
+        }
+
+
+def top_k(series: pd.Series, k: int, bottom: bool=False) -> pd.Series:
+    """The k largest (or smallest) values of a series, found with a partial sort rather than by sorting the whole series.
+
+    Args:
+        series (pd.Series): Series to rank.
+        k (int): Number of values to keep.
+        bottom (bool, optional): Whether to keep the smallest values instead. Defaults to False.
+
+    Returns:
+        pd.Series: The k largest values, largest first (or the k smallest values, smallest first).
+    """
+    keys = series.to_numpy() if bottom else -series.to_numpy()
+    positions = np.arange(len(keys))
+    if len(keys) > k > 0:
+        positions = np.argpartition(keys, k - 1)[:k]
+
+    return series.iloc[positions[np.argsort(keys[positions], kind="stable")]]
@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import threading
+import contextlib
+import importlib.util
+
+import pandas as pd
+
+sys.path.append("./")
+from src.data_utils.columnar import save_columnar, load_columnar, is_columnar
+
+
+CACHE_DIR = "src/data/.cache"
+# File locks are taken with fcntl, or with msvcrt on Windows, which has no fcntl
+if importlib.util.find_spec("fcntl") is not None:
+    import fcntl
+    msvcrt = None
+else:
+    import msvcrt
+    fcntl = None
+# Bump whenever the transformations change, so that frames cached by older code are not reused
+CACHE_VERSION = 2
+
+
+def file_fingerprint(path: str, mapping: dict) -> str:
+    """Fingerprints a source file together with the column mapping used to transform it. Any change to the size, modification time or content of the file, or to the mapping, results in a different fingerprint.
+
+    Args:
+        path (str): Path of the source file.
+        mapping (dict): Column mapping from config.json.
+
+    Returns:
+        str: Hex digest that identifies the file and mapping.
+    """
+    stat = os.stat(path)
+    content_hash = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            content_hash.update(block)
+
+    key = {
+        "version": CACHE_VERSION,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "hash": content_hash.hexdigest(),
+        "mapping": mapping
+    }
+
+    return hashlib.blake2b(json.dumps(key, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def _cache_path(name: str) -> str:
+    """Directory that the cached frames of a source are kept in, one subdirectory per fingerprint.
+
+    Args:
+        name (str): Name of the source (the configured filename).
+
+    Returns:
+        str: Cache directory of the source.
+    """
+    return os.path.join(CACHE_DIR, name.replace(os.sep, "_"))
+
+
+def _pid_running(pid: int) -> bool:
+    """Whether a process is running.
+
+    Args:
+        pid (int): Process id.
+
+    Returns:
+        bool: Whether the process is running.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+def load_cached(name: str, fingerprint: str) -> pd.DataFrame|None:
+    """Loads the cached, memory-mapped frame of a source if it was cached under the same fingerprint.
+
+    Args:
+        name (str): Name of the source (the configured filename).
+        fingerprint (str): Current fingerprint of the source, see file_fingerprint.
+
+    Returns:
+        pd.DataFrame | None: The cached frame, or None if there is no cache or it is stale.
+    """
+    path = os.path.join(_cache_path(name), fingerprint)
+    if not is_columnar(path):
+        return None
+
+    try:
+        return load_columnar(path)
+    except FileNotFoundError:
+        # Removed by a writer of a newer fingerprint while it was being loaded, so it is stale
+        return None
+
+
+def save_cached(df: pd.DataFrame, name: str, fingerprint: str) -> None:
+    """Caches the frame of a source under its fingerprint, and removes the frames cached under any other fingerprint. The frame is written to a temporary directory of the writer first, and then renamed to the directory of its fingerprint - which is atomic, and never replaces a directory - so a reader never sees a partially written cache, and writers that run at the same time (e.g. the workers of a preforked server) do not collide: the first to finish is kept, and the others are discarded as they are identical.
+
+    Args:
+        df (pd.DataFrame): Transformed frame to cache.
+        name (str): Name of the source (the configured filename).
+        fingerprint (str): Fingerprint of the source, see file_fingerprint.
+    """
+    root = _cache_path(name)
+    path = os.path.join(root, fingerprint)
+    tmp_path = os.path.join(root, f"{fingerprint}.tmp-{os.getpid()}-{threading.get_ident()}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    save_columnar(df, tmp_path)
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        if not is_columnar(path):
+            raise
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    for entry in os.listdir(root):
+        stale = os.path.join(root, entry)
+        if ".tmp-" in entry:
+            # Only the temporary directories of writers that died before finishing
+            if _pid_running(int(entry.split(".tmp-")[1].split("-")[0])):
+                continue
+        elif entry == fingerprint:
+            continue
+        if os.path.isdir(stale):
+            shutil.rmtree(stale, ignore_errors=True)
+        else:
+            os.remove(stale)
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """Holds an exclusive lock on a file, created if it does not exist, for as long as the context is entered - so that processes (e.g. the data reloaders of the workers of a preforked server) take turns at updating files on disk. The lock is released if the process dies.
+
+    Args:
+        path (str): Path of the lock file.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
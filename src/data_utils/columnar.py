@@ -0,0 +1,147 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+
+SCHEMA_FILENAME = "schema.json"
+
+
+class ColumnarWriter:
+    """Writes a dataframe to a directory of per-column .npy files, one chunk at a time, so that the full dataframe never has to be held in memory. String (object) and categorical columns are dictionary encoded as integer codes, everything else is stored as its NumPy array. The directory can be read back, memory-mapped, with load_columnar.
+
+    Args:
+        path (str): Directory to write the columns to, created if it does not exist.
+        rows (int): Total number of rows that will be written.
+        template (pd.DataFrame): Dataframe (e.g. the first chunk) used for the column names and dtypes.
+        categories (dict | None, optional): Categories of the object columns, keyed by column name. Needed when writing in chunks, as the categories of a single chunk are not necessarily the categories of the whole dataframe. Defaults to None, which uses the categories found in the template.
+    """
+    def __init__(
+            self, path: str, rows: int, template: pd.DataFrame, categories: dict|None=None
+        ) -> None:
+        self.path = path
+        self.rows = rows
+        self.offset = 0
+        self.schema = []
+        self.arrays = []
+
+        os.makedirs(path, exist_ok=True)
+        categories = categories or {}
+        for i, column in enumerate(template.columns):
+            series = template[column]
+            filename = os.path.join(path, f"{i}.npy")
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                cats = series.cat.categories
+                entry = {"kind": "category", "categories": cats.tolist(), "ordered": bool(series.cat.ordered)}
+            elif series.dtype == object:
+                cats = pd.Index(categories[column]) if column in categories else pd.Index(series.dropna().unique())
+                entry = {"kind": "object", "categories": cats.tolist(), "ordered": False}
+            else:
+                cats = None
+                entry = {"kind": "numpy"}
+            dtype = series.dtype if cats is None else self._code_dtype(len(cats))
+
+            entry.update({"name": column, "dtype": np.dtype(dtype).str})
+            self.schema.append((entry, cats))
+            self.arrays.append(np.lib.format.open_memmap(filename, mode="w+", dtype=dtype, shape=(rows,)))
+
+    @staticmethod
+    def _code_dtype(n_categories: int) -> np.dtype:
+        """Smallest signed integer dtype that can hold the codes of a number of categories (-1 is kept for missing values).
+
+        Args:
+            n_categories (int): Number of categories.
+
+        Returns:
+            np.dtype: Integer dtype for the codes.
+        """
+        for dtype in (np.int8, np.int16, np.int32):
+            if n_categories < np.iinfo(dtype).max:
+                return np.dtype(dtype)
+        return np.dtype(np.int64)
+
+    def write(self, df: pd.DataFrame) -> None:
+        """Writes the next chunk of rows.
+
+        Args:
+            df (pd.DataFrame): Chunk of rows, with the same columns as the template.
+        """
+        end = self.offset + df.shape[0]
+        if end > self.rows:
+            raise ValueError(f"Chunk overflows the {self.rows} rows the writer was created with.")
+
+        for (entry, cats), array in zip(self.schema, self.arrays):
+            values = df[entry["name"]]
+            if cats is not None:
+                values = pd.Categorical(values, categories=cats).codes
+            array[self.offset:end] = np.asarray(values)
+        self.offset = end
+
+    def close(self) -> None:
+        """Flushes the columns to disk and writes the schema, which marks the directory as complete.
+        """
+        if self.offset != self.rows:
+            raise ValueError(f"Only {self.offset} of {self.rows} rows were written.")
+
+        for array in self.arrays:
+            array.flush()
+        self.arrays = []
+
+        schema = {"rows": self.rows, "columns": [entry for entry, _ in self.schema]}
+        with open(os.path.join(self.path, SCHEMA_FILENAME), "w") as f:
+            json.dump(schema, f)
+
+
+def save_columnar(df: pd.DataFrame, path: str) -> None:
+    """Saves a dataframe to a directory of per-column .npy files.
+
+    Args:
+        df (pd.DataFrame): Dataframe to save.
+        path (str): Directory to save the dataframe to.
+    """
+    writer = ColumnarWriter(path, rows=df.shape[0], template=df)
+    writer.write(df)
+    writer.close()
+
+
+def is_columnar(path: str) -> bool:
+    """Checks whether a path is a complete columnar directory.
+
+    Args:
+        path (str): Path to check.
+
+    Returns:
+        bool: True if the path was written by ColumnarWriter/save_columnar.
+    """
+    return os.path.isfile(os.path.join(path, SCHEMA_FILENAME))
+
+
+def load_columnar(path: str, mmap: bool=True) -> pd.DataFrame:
+    """Loads a dataframe saved by save_columnar or ColumnarWriter.
+
+    Args:
+        path (str): Directory the dataframe was saved to.
+        mmap (bool, optional): Whether to memory-map the numeric and code columns rather than reading them into memory - the columns are then read-only and paged in on demand. Defaults to True.
+
+    Returns:
+        pd.DataFrame: The saved dataframe.
+    """
+    schema = json.load(open(os.path.join(path, SCHEMA_FILENAME)))
+    mmap_mode = "r" if mmap else None
+
+    columns = {}
+    for i, entry in enumerate(schema["columns"]):
+        values = np.load(os.path.join(path, f"{i}.npy"), mmap_mode=mmap_mode)
+        if entry["kind"] == "numpy":
+            columns[entry["name"]] = values
+        else:
+            categorical = pd.Categorical.from_codes(
+                values, categories=entry["categories"], ordered=entry["ordered"], validate=False
+            )
+            if entry["kind"] == "object":
+                categorical = np.asarray(categorical, dtype=object)
+            columns[entry["name"]] = categorical
+
+    # copy=False keeps one block per column, so memory-mapped columns are not copied into a consolidated block
+    return pd.DataFrame(columns, copy=False)
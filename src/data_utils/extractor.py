@@ -1,17 +1,89 @@
+import sys
 import math
+import calendar
+from dataclasses import dataclass
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
 
+sys.path.append("./")
+from src.data_utils.pyramid import GRANULARITIES, TimePyramid
+from src.data_utils.time_index import TimeIndex
+from src.data_utils.bitmap_index import BitmapIndex, top_k
+from src.data_utils.quantile_sketch import INTEGER_MEASURES, PERCENTILES, SKETCH_DIMENSIONS, SketchIndex, quantiles_of, sketch_frame
+
+@dataclass(frozen=True)
+class KpiBundle:
+    """The overview and winners KPIs of the dashboard, see DataExtractor.kpi_bundle.
+    """
+    start: str
+    end: str
+    number_of_days: int
+    total_revenue: float
+    total_orders: int
+    total_items: int
+    daily_revenue: float
+    daily_orders: float
+    top_orders_date: pd.Timestamp
+    top_orders_date_count: int
+    top_revenue_date: pd.Timestamp
+    top_revenue_date_amount: float
+    top_orders_weekday: str
+    top_orders_weekday_count: int
+    top_revenue_weekday: str
+    top_revenue_weekday_amount: float
+    top_orders_month: str
+    top_orders_month_count: int
+    top_revenue_month: str
+    top_revenue_month_amount: float
+    top_orders_country: str
+    top_orders_country_count: int
+    top_revenue_country: str
+    top_revenue_country_amount: float
+    dispatch_percentiles: tuple|None
+    order_value_percentiles: tuple|None
+    items_percentiles: tuple|None
+
 
 class DataExtractor:
     """Class that is able to extract various types of data from the input dataframe.
 
+    If a rollup is given (see DataTransformer._build_rollup), every KPI and chart is answered from the rollup instead of the row-level dataframe, so the cost depends on the number of distinct (date, country, delivery type, days to dispatch) combinations rather than the number of orders. Dates are then at the granularity of a day. The dataframe can then be None, e.g. when the data was streamed (see DataTransformer._stream_sources).
+
+    The KPIs and charts that take a start and end date are restricted to that (inclusive) date range, and answered from a TimeIndex of the data (see time_index) in time that does not depend on the number of orders. Those that also take filters (the value that each of "country", "paid", "days_to_dispatch", "weekday" or "month" must have, e.g. {"country": "Germany", "paid": True}) are restricted to the matching orders, which are found with a BitmapIndex of the data (see bitmap_index).
+
+    The percentiles of the days to dispatch, order values and items per order are approximate - within 1% of the exact percentiles - and answered from mergeable sketches of each month, country and delivery type (see sketch_index), so they are at the granularity of a calendar month and can only be filtered by "country", "paid" or "month".
+
     Args:
-        df (pd.DataFrame): Dataframe to extract data from.
+        df (pd.DataFrame | None): Dataframe to extract data from.
+        rollup (pd.DataFrame | None, optional): Rollup of the dataframe. Defaults to None.
+        sketches (pd.DataFrame | None, optional): Sketch frame of the dataframe, see quantile_sketch.sketch_frame. Defaults to None, sketched from the dataframe on first use.
     """
-    def __init__(self, df: pd.DataFrame) -> None:
+    def __init__(self, df: pd.DataFrame|None, rollup: pd.DataFrame|None=None, sketches: pd.DataFrame|None=None) -> None:
+        if df is None and rollup is None:
+            raise ValueError("Either a dataframe or a rollup must be given.")
+        if df is None and sketches is None:
+            raise ValueError("The sketches must be given along with a rollup that has no dataframe.")
         self.df = df
+        self.rollup = rollup
+        self.sketches = sketches
+        self._pyramid = None
+        self._time_index = None
+        self._bitmap_index = None
+        self._sketch_index = None
+
+    def _rollup_sum(self, by: str, measure: str) -> pd.Series:
+        """Sums a measure of the rollup for each value of a dimension.
+
+        Args:
+            by (str): Dimension (rollup column) to group by.
+            measure (str): Measure to sum - "orders", "items" or "revenue".
+
+        Returns:
+            pd.Series: Summed measure for each value of the dimension.
+        """
+        return self.rollup.groupby(by, observed=True)[measure].sum()
 
     def total_orders(self) -> int:
         """Extracts the total number of orders.
@@ -19,6 +91,8 @@ class DataExtractor:
         Returns:
             int: Number of orders.
         """
+        if self.rollup is not None:
+            return self.rollup["orders"].sum()
         return self.df.shape[0]
 
     def total_items(self) -> int:
@@ -27,6 +101,8 @@ class DataExtractor:
         Returns:
             int: Number of items ordered.
         """
+        if self.rollup is not None:
+            return self.rollup["items"].sum()
         return self.df["quantity"].sum()
 
     def total_revenue(self) -> float:
@@ -35,6 +111,8 @@ class DataExtractor:
         Returns:
             float: Total revenue.
         """
+        if self.rollup is not None:
+            return round(self.rollup["revenue"].sum(), 2)
         return round(self.df["price"].sum(), 2)
 
     def average_revenue(self) -> float:
@@ -43,47 +121,72 @@ class DataExtractor:
         Returns:
             float: Average revenue across orders.
         """
+        if self.rollup is not None:
+            return round(self.rollup["revenue"].sum() / self.rollup["orders"].sum(), 2)
         return round(self.df["price"].mean(), 2)
 
-    def country_grouping(self, analytic: str) -> pd.Series:
-        """Groups the countries based on an aggregate. Accepted aggregates are "orders", "revenue" and "mean_revenue".
+    def country_grouping(self, analytic: str, start: str|None=None, end: str|None=None, filters: dict|None=None) -> pd.Series:
+        """Groups the countries based on an aggregate. Accepted aggregates are "orders", "revenue" and "mean_revenue". The totals of each country are looked up in the time index (or the bitmap index, if filtered) rather than regrouping the data.
 
         Args:
             analytic (str): Aggregate to group the countries by. Accepted aggregates are "orders", "revenue" and "mean_revenue".
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
 
         Returns:
             pd.Series: Countries and their respective aggregates grouped.
         """
         if analytic not in ["orders", "revenue", "mean_revenue"]:
             raise ValueError("Invalid aggregate - must be 'orders', 'revenue' or 'mean_revenue'.")
-        
+
+        totals = lambda measure: self._breakdown("country", measure, start, end, filters)
         if analytic == "orders":
-            return self.df["country"].value_counts()
-        else:
-            grouped_data = self.df[["country", "price"]].groupby("country")["price"]
-            if analytic == "revenue":
-                return grouped_data.sum()
-            return grouped_data.mean()
+            return totals("orders").sort_values(ascending=False)
+        elif analytic == "revenue":
+            return totals("revenue")
+        return totals("revenue") / totals("orders")
 
-    def country_plots(self, analytic: str, order: str) -> px.bar:
+    def country_leaderboard(self, analytic: str, k: int=10, bottom: bool=False, start: str|None=None, end: str|None=None, filters: dict|None=None) -> pd.Series:
+        """The best (or worst) performing countries for an aggregate, found with a partial sort of the countries.
+
+        Args:
+            analytic (str): Aggregate to rank the countries by. Accepted aggregates are "orders", "revenue" and "mean_revenue".
+            k (int, optional): Number of countries. Defaults to 10.
+            bottom (bool, optional): Whether to get the worst performing countries instead. Defaults to False.
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+
+        Returns:
+            pd.Series: Aggregate of the k best countries, best first (or of the k worst countries, worst first).
+        """
+        return top_k(self.country_grouping(analytic, start, end, filters), k, bottom)
+
+    def country_plots(self, analytic: str, order: str, start: str|None=None, end: str|None=None, filters: dict|None=None) -> px.bar:
         """Country plots that are used for the dashboard.
 
         Args:
             analytic (str): Aggregate to group the countries by. Accepted aggregates are "orders", "revenue" and "mean_revenue".
             order (str): Used to order the data - only "head" or "tail" are accepted.
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
 
         Returns:
             px.bar: Bar plot of the country data based on the analytic.
         """
-        ascending = True if order == "head" else False
         axis_map = {
             "orders": "Orders", "revenue": "Revenue", "mean_revenue": "Average revenue"
         }
 
-        grouped_country_series = self.country_grouping(analytic)
-        sorted_grouping =grouped_country_series.sort_values(ascending=ascending).tail(10)
+        # Horizontal bars are drawn bottom up, so the leaderboard is reversed to put its first country on top
+        sorted_grouping = self.country_leaderboard(analytic, 10, order != "head", start, end, filters).iloc[::-1]
 
-        fig = px.bar(sorted_grouping, x=sorted_grouping.values, y=sorted_grouping.index)
+        # Named columns rather than bare arrays, which plotly rejects when a filter leaves no countries
+        data = {axis_map[analytic]: sorted_grouping.values, "Country": sorted_grouping.index}
+
+        fig = px.bar(data, x=axis_map[analytic], y="Country")
         fig.update_layout(
             margin=dict(l=0, r=0, t=0, b=0), 
             xaxis_title=axis_map[analytic], 
@@ -92,13 +195,23 @@ class DataExtractor:
 
         return fig
         
-    def days_to_dispatch(self) -> px.bar:
+    def days_to_dispatch(self, start: str|None=None, end: str|None=None, filters: dict|None=None) -> px.bar:
         """Bar plot of the distribution of the days taken to dispatch orders.
 
+        Args:
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+
         Returns:
             px.bar: Distribution of days taken to dispatch.
         """
-        time_to_dispatch = self.df["days_to_dispatch"].value_counts().sort_index()
+        if filters or start is not None or end is not None:
+            time_to_dispatch = self._breakdown("days_to_dispatch", "orders", start, end, filters)
+        elif self.rollup is not None:
+            time_to_dispatch = self._rollup_sum("days_to_dispatch", "orders")
+        else:
+            time_to_dispatch = self.df["days_to_dispatch"].value_counts().sort_index()
         data = {
             "Days to Dispatch": time_to_dispatch.keys(),
             "Orders": time_to_dispatch.values
@@ -109,14 +222,18 @@ class DataExtractor:
         
         return fig
 
-    def order_delivery_charge(self) -> px.pie:
+    def order_delivery_charge(self, start: str|None=None, end: str|None=None, filters: dict|None=None) -> px.pie:
         """Pie chart of the total number of orders across free and paid deliveries.
 
+        Args:
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+
         Returns:
             px.pie: Orders across paid and free deliveries.
         """
-        orders_per_delivery = self.df["delivery_cost"].apply(
-            lambda x: "Paid" if x else "Free").value_counts()
+        orders_per_delivery = self._breakdown("paid", "orders", start, end, filters).rename({True: "Paid", False: "Free"})
         data = {
             "Delivery Type": orders_per_delivery.keys(),
             "Orders": orders_per_delivery.values
@@ -127,16 +244,18 @@ class DataExtractor:
 
         return fig
 
-    def revenue_delivery_charge(self) -> px.pie:
+    def revenue_delivery_charge(self, start: str|None=None, end: str|None=None, filters: dict|None=None) -> px.pie:
         """Pie chart of the total revenue across free and paid deliveries.
 
+        Args:
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+
         Returns:
             px.pie: Revenue across paid and free deliveries.
         """
-        revenue_per_delivery = self.df[["delivery_cost", "price"]]
-        revenue_per_delivery["delivery_cost"] = revenue_per_delivery["delivery_cost"].apply(
-            lambda x: "Paid" if x else "Free")
-        revenue_per_delivery = revenue_per_delivery.groupby("delivery_cost")["price"].sum()
+        revenue_per_delivery = self._breakdown("paid", "revenue", start, end, filters).rename({True: "Paid", False: "Free"})
         data = {
             "Delivery Type": revenue_per_delivery.keys(),
             "Revenue": revenue_per_delivery.values
@@ -147,52 +266,287 @@ class DataExtractor:
 
         return fig
 
-    def orders_per_day(self, bins: int) -> px.histogram:
-        """Histogram plot of the count of orders over the time range of the data.
-        
+    def time_series(self, measure: str, granularity: str, start: str|None=None, end: str|None=None, filters: dict|None=None) -> pd.Series:
+        """Aggregates orders or revenue into calendar-aligned day, week (starting on Monday) or month buckets, with empty buckets as 0.
+
         Args:
-            bins (int): Number of bins in the histogram - acts like the granularity.
+            measure (str): Measure to aggregate - must be "orders" or "revenue".
+            granularity (str): Bucket size - must be "day", "week", "month" or "quarter".
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
 
         Returns:
-            px.histogram: Histogram plot of the count of orders over the time range of the data.
+            pd.Series: Aggregated measure for each bucket, indexed by the start date of the bucket.
         """
-        fig = px.histogram(self.df, x="date", nbins=bins)
-        fig.update_layout(
-            xaxis_title_text = "Date", 
-            yaxis_title_text = "Orders",
-            bargap=0.25,
-            margin=dict(l=0, r=0, t=0, b=0)
+        allowed_granularities = ["day", "week", "month", "quarter"]
+        if measure not in ["orders", "revenue"]:
+            raise ValueError("Invalid measure - must be 'orders' or 'revenue'.")
+        if granularity not in allowed_granularities:
+            raise ValueError(f"Invalid granularity - must be in {allowed_granularities}.")
+
+        if filters:
+            return self.bitmap_index().series(measure, granularity, filters, start, end)
+        if start is not None or end is not None:
+            return self.time_index().series(measure, granularity, start, end)
+
+        daily = self._daily_series(measure)
+        if granularity == "day":
+            return daily
+        return daily.resample(GRANULARITIES[granularity]["rule"], label="left", closed="left").sum()
+
+    def _daily_series(self, measure: str) -> pd.Series:
+        """Aggregates orders or revenue per day in a single O(n) pass, by counting (or summing prices) into one slot per day since the first date, rather than sorting the data.
+
+        Args:
+            measure (str): Measure to aggregate - must be "orders" or "revenue".
+
+        Returns:
+            pd.Series: Aggregated measure for each day between the first and last date.
+        """
+        if self.rollup is not None:
+            frame, weights = self.rollup, self.rollup[measure].to_numpy()
+        else:
+            frame, weights = self.df, (None if measure == "orders" else self.df["price"].to_numpy())
+
+        days = frame["date"].to_numpy().astype("datetime64[D]")
+        valid = ~np.isnat(days)
+        if not valid.all():
+            days = days[valid]
+            weights = None if weights is None else weights[valid]
+
+        first_day = days.min()
+        totals = np.bincount((days - first_day).astype(np.int64), weights=weights)
+        if measure == "orders":
+            totals = totals.astype(np.int64)
+
+        return pd.Series(totals, index=pd.date_range(first_day, periods=len(totals), freq="D"))
+
+    def time_pyramid(self) -> TimePyramid:
+        """Multi-resolution view of the orders and revenue over time, built on first use.
+
+        Returns:
+            TimePyramid: Time pyramid of the data.
+        """
+        if self._pyramid is None:
+            if self.rollup is not None:
+                self._pyramid = TimePyramid(
+                    self.rollup["date"].to_numpy(), self.rollup["orders"].to_numpy(), self.rollup["revenue"].to_numpy()
+                )
+            else:
+                self._pyramid = TimePyramid(self.df["date"].to_numpy(), None, self.df["price"].to_numpy())
+
+        return self._pyramid
+
+    def _index_columns(self) -> tuple:
+        """Columns of the rollup (or of the data, if there is no rollup) that the time and bitmap indexes are built from.
+
+        Returns:
+            tuple: Date, orders (None if every row is one order), items and revenue of each row, and the value of each row of the country, delivery type ("paid") and days to dispatch dimensions.
+        """
+        if self.rollup is not None:
+            frame = self.rollup
+            orders, items, revenue, paid = frame["orders"].to_numpy(), frame["items"].to_numpy(), frame["revenue"].to_numpy(), frame["paid"]
+        else:
+            frame = self.df
+            orders, items, revenue, paid = None, frame["quantity"].to_numpy(), frame["price"].to_numpy(), frame["delivery_cost"].ne(0)
+        dimensions = {"country": frame["country"], "paid": paid, "days_to_dispatch": frame["days_to_dispatch"]}
+
+        return frame["date"].to_numpy(), orders, items, revenue, dimensions
+
+    def time_index(self) -> TimeIndex:
+        """Date-range index of the orders, items and revenue, broken down by country, delivery type and days to dispatch, built on first use.
+
+        Returns:
+            TimeIndex: Time index of the data.
+        """
+        if self._time_index is None:
+            self._time_index = TimeIndex(*self._index_columns())
+
+        return self._time_index
+
+    def bitmap_index(self) -> BitmapIndex:
+        """Cross-filtering index of the rows of each country, delivery type, days to dispatch, weekday and month, built on first use.
+
+        Returns:
+            BitmapIndex: Bitmap index of the data.
+        """
+        if self._bitmap_index is None:
+            self._bitmap_index = BitmapIndex(*self._index_columns())
+
+        return self._bitmap_index
+
+    def sketch_index(self) -> SketchIndex:
+        """Index of the sketches of the days to dispatch, order values and items per order of each month, country and delivery type, built on first use - from the given sketch frame, or else by sketching the dataframe.
+
+        Returns:
+            SketchIndex: Sketch index of the data.
+        """
+        if self._sketch_index is None:
+            self._sketch_index = SketchIndex(self.sketches if self.sketches is not None else sketch_frame(self.df))
+
+        return self._sketch_index
+
+    def percentiles(self, measure: str, start: str|None=None, end: str|None=None, filters: dict|None=None) -> tuple:
+        """Approximate p50, p90 and p99 of a measure, from the sketch index. Each is within 1% of the exact percentile (np.quantile with method="lower") before it is rounded - to a whole number for whole-number measures, which makes those exact, and to cents otherwise.
+
+        Args:
+            measure (str): "days_to_dispatch", "order_value" or "items".
+            start (str | None, optional): First day of the date range - the percentiles are those of every calendar month the range overlaps. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+            filters (dict | None, optional): Value that "country", "paid" or "month" must have. Defaults to None, every order.
+
+        Returns:
+            tuple: p50, p90 and p99 of the measure, NaN if no orders match.
+        """
+        values = self.sketch_index().sketch(measure, filters, start, end).quantiles([p / 100 for p in PERCENTILES])
+
+        return tuple(self._round_percentiles(measure, values))
+
+    def country_percentiles(self, measure: str, start: str|None=None, end: str|None=None, filters: dict|None=None) -> pd.DataFrame:
+        """Approximate p50, p90 and p99 of a measure for each country, see percentiles.
+
+        Args:
+            measure (str): "days_to_dispatch", "order_value" or "items".
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+            filters (dict | None, optional): Value that "paid" or "month" must have. Defaults to None, every order.
+
+        Returns:
+            pd.DataFrame: p50, p90 and p99 of the measure for each country with matching orders.
+        """
+        countries, counts = self.sketch_index().country_sketches(measure, filters, start, end)
+        has_orders = counts.sum(axis=1) > 0
+        values = quantiles_of(counts[has_orders], [p / 100 for p in PERCENTILES], measure in INTEGER_MEASURES)
+
+        return pd.DataFrame(
+            self._round_percentiles(measure, values), index=countries[has_orders], columns=[f"p{p}" for p in PERCENTILES]
         )
 
-        return fig
+    @staticmethod
+    def _round_percentiles(measure: str, values: np.ndarray) -> np.ndarray:
+        """Rounds the percentiles of a measure - to whole numbers for whole-number measures, which are exact up to EXACT_INTEGERS and within 1% of a whole number beyond (see sketch_keys), and to cents otherwise.
+
+        Args:
+            measure (str): Measure of the percentiles.
+            values (np.ndarray): Percentiles.
+
+        Returns:
+            np.ndarray: Rounded percentiles.
+        """
+        return values.round(0 if measure in INTEGER_MEASURES else 2)
 
-    def revenue_per_day(self, bins: int) -> px.histogram:
-        """Histogram plot of the sum of prices over the time range of the data.
+    def _breakdown(self, dimension: str, measure: str, start: str|None, end: str|None, filters: dict|None) -> pd.Series:
+        """Total of a measure for each value of a dimension, over a date range and the orders that match a filter - from the bitmap index if filtered, and the time index otherwise.
 
         Args:
-            bins (int): Number of bins in the histogram - acts like the granularity.
+            dimension (str): Dimension to break down by - "country", "paid" or "days_to_dispatch".
+            measure (str): Measure to total - must be "orders", "items" or "revenue".
+            start (str | None): First day of the date range, None for the first day of the data.
+            end (str | None): Last day of the date range, None for the last day of the data.
+            filters (dict | None): Value that each filtered dimension must have, None for every order.
 
         Returns:
-            px.histogram: Histogram plot of the sum of prices over the time range of the data.
+            pd.Series: Total of the measure for each value of the dimension that has orders.
         """
-        fig = px.histogram(self.df, x="date", y="price", nbins=bins)
+        if filters:
+            return self.bitmap_index().totals(dimension, measure, filters, start, end)
+
+        return self.time_index().breakdown(dimension, measure, start, end)
+
+    def zoomed_plot(self, measure: str, start: str, end: str, max_points: int, filters: dict|None=None) -> tuple:
+        """Bar plot of a measure over a zoomed in time range, at the finest granularity that keeps the number of bars in the range within max_points.
+
+        Args:
+            measure (str): Measure to plot - must be "orders" or "revenue".
+            start (str): Start of the time range.
+            end (str): End of the time range.
+            max_points (int): Maximum number of bars.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+
+        Returns:
+            tuple: Granularity of the bars, and the bar plot of the measure over the time range.
+        """
+        if filters:
+            # A pyramid of only the matching orders of the zoomed range
+            rows = self.bitmap_index().rows(filters, start, end)
+            if len(rows["date"]) == 0:
+                # The buckets of the unfiltered range, all empty
+                granularity, series = self.time_pyramid().query(measure, start, end, max_points)
+                series = series * 0
+            else:
+                pyramid = TimePyramid(rows["date"], rows["orders"], rows["revenue"])
+                granularity, series = pyramid.query(measure, start, end, max_points)
+        else:
+            granularity, series = self.time_pyramid().query(measure, start, end, max_points)
+        fig = self._time_series_plot(series, measure, granularity)
+        fig.update_layout(xaxis_range=[start, end])
+
+        return granularity, fig
+
+    def _time_series_plot(self, series: pd.Series, measure: str, granularity: str) -> px.bar:
+        """Bar plot of a measure over time, with one bar per bucket, each spanning its bucket.
+
+        Args:
+            series (pd.Series): Measure of each bucket, indexed by the start of the bucket.
+            measure (str): Measure that is plotted - "orders" or "revenue".
+            granularity (str): Bucket size - "hour", "day", "week", "month" or "quarter".
+
+        Returns:
+            px.bar: Bar plot of the measure over time.
+        """
+        fig = px.bar(x=series.index, y=series.values)
+        fig.update_traces(
+            xperiod=GRANULARITIES[granularity]["period"],
+            xperiod0=GRANULARITIES[granularity]["period0"],
+            xperiodalignment="middle"
+        )
         fig.update_layout(
             xaxis_title_text = "Date", 
-            yaxis_title_text = "Revenue",
+            yaxis_title_text = measure.capitalize(),
             bargap=0.25,
             margin=dict(l=0, r=0, t=0, b=0)
         )
 
         return fig
 
+    def orders_per_day(self, granularity: str="day", start: str|None=None, end: str|None=None, filters: dict|None=None) -> px.bar:
+        """Bar plot of the count of orders over the time range of the data. The orders are binned on the server, so only one point per bucket is sent to the browser.
+        
+        Args:
+            granularity (str, optional): Bucket size - must be "day", "week" or "month". Defaults to "day".
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+
+        Returns:
+            px.bar: Bar plot of the count of orders over the time range of the data.
+        """
+        return self._time_series_plot(self.time_series("orders", granularity, start, end, filters), "orders", granularity)
+
+    def revenue_per_day(self, granularity: str="day", start: str|None=None, end: str|None=None, filters: dict|None=None) -> px.bar:
+        """Bar plot of the sum of prices over the time range of the data. The prices are binned on the server, so only one point per bucket is sent to the browser.
+
+        Args:
+            granularity (str, optional): Bucket size - must be "day", "week" or "month". Defaults to "day".
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+
+        Returns:
+            px.bar: Bar plot of the sum of prices over the time range of the data.
+        """
+        return self._time_series_plot(self.time_series("revenue", granularity, start, end, filters), "revenue", granularity)
+
     def date_range(self) -> tuple:
         """Extracts the date range from the data.
 
         Returns:
             tuple: Start and end dates of the data, in the format of yyyy-mm-dd.
         """
-        start = self.df["date"].min().date()
-        end = self.df["date"].max().date()
+        dates = self.df["date"] if self.rollup is None else self.rollup["date"]
+        start = dates.min().date()
+        end = dates.max().date()
 
         return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
     
@@ -202,34 +556,109 @@ class DataExtractor:
         Returns:
             int: The number of days that the data covers.
         """
-        start = self.df["date"].min().date()
-        end = self.df["date"].max().date()
+        dates = self.df["date"] if self.rollup is None else self.rollup["date"]
+        start = dates.min().date()
+        end = dates.max().date()
         days = math.ceil((end - start).days)
 
         return days
     
-    def number_of_weeks(self) -> int:
-        """Gets the number of weeks that the data covers.
+    def kpi_bundle(self, start: str|None=None, end: str|None=None, filters: dict|None=None) -> KpiBundle|None:
+        """Computes all of the overview and winners KPIs at once. Rather than scanning the data once per KPI, the orders, items and revenue are grouped by date and country in a single pass, and every KPI is derived from that (much smaller) table. The KPIs of a date range are derived from the time index instead, per day and per country of the range, without scanning the data at all - and those of a filter from the matching rows of the bitmap index. The percentiles come from the sketch index, see percentiles.
+
+        Args:
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
 
         Returns:
-            int: The number of weeks that the data covers.
+            KpiBundle | None: The overview and winners KPIs, or None if there are no orders in the date range that match the filter.
         """
-        days = self.number_of_days()
-        weeks = math.ceil(days / 7)
+        if filters or start is not None or end is not None:
+            per_date, per_country = self._range_tables(start, end, filters)
+            if per_date.empty:
+                return None
+        else:
+            if self.rollup is not None:
+                table = self.rollup.groupby(["date", "country"], observed=True)[["orders", "items", "revenue"]].sum()
+            else:
+                table = self.df.groupby(["date", "country"], observed=True).agg(
+                    orders=("quantity", "size"), items=("quantity", "sum"), revenue=("price", "sum")
+                )
+            per_date = table.groupby(level="date").sum()
+            per_country = table.groupby(level="country", observed=True).sum()
+
+        dates = per_date.index
+        weekdays = pd.Categorical.from_codes(dates.weekday, categories=list(calendar.day_name))
+        months = pd.Categorical.from_codes(dates.month - 1, categories=list(calendar.month_name)[1:])
+        per_weekday = per_date.groupby(weekdays, observed=True).sum()
+        per_month = per_date.groupby(months, observed=True).sum()
+
+        # The sketches are not kept per weekday or days to dispatch, so there are no percentiles for those filters
+        sketched = all(name in SKETCH_DIMENSIONS for name in filters or {})
+        percentiles = {
+            measure: self.percentiles(measure, start, end, filters) if sketched else None
+            for measure in ["days_to_dispatch", "order_value", "items"]
+        }
+
+        start, end = dates.min().date(), dates.max().date()
+        # A filter can leave orders on a single day, which still counts as one day for the daily averages
+        number_of_days = max(math.ceil((end - start).days), 1)
+        total_revenue = round(per_date["revenue"].sum(), 2)
+        total_orders = per_date["orders"].sum()
+
+        return KpiBundle(
+            start=start.strftime("%Y-%m-%d"),
+            end=end.strftime("%Y-%m-%d"),
+            number_of_days=number_of_days,
+            total_revenue=total_revenue,
+            total_orders=total_orders,
+            total_items=per_date["items"].sum(),
+            daily_revenue=round(total_revenue / number_of_days, 2),
+            daily_orders=round(total_orders / number_of_days, 2),
+            top_orders_date=per_date["orders"].idxmax(),
+            top_orders_date_count=per_date["orders"].max(),
+            top_revenue_date=per_date["revenue"].idxmax(),
+            top_revenue_date_amount=per_date["revenue"].max(),
+            top_orders_weekday=per_weekday["orders"].idxmax(),
+            top_orders_weekday_count=per_weekday["orders"].max(),
+            top_revenue_weekday=per_weekday["revenue"].idxmax(),
+            top_revenue_weekday_amount=per_weekday["revenue"].max(),
+            top_orders_month=per_month["orders"].idxmax(),
+            top_orders_month_count=per_month["orders"].max(),
+            top_revenue_month=per_month["revenue"].idxmax(),
+            top_revenue_month_amount=per_month["revenue"].max(),
+            top_orders_country=per_country["orders"].idxmax(),
+            top_orders_country_count=per_country["orders"].max(),
+            top_revenue_country=per_country["revenue"].idxmax(),
+            top_revenue_country_amount=per_country["revenue"].max(),
+            dispatch_percentiles=percentiles["days_to_dispatch"],
+            order_value_percentiles=percentiles["order_value"],
+            items_percentiles=percentiles["items"]
+        )
 
-        return weeks
+    def _range_tables(self, start: str|None, end: str|None, filters: dict|None=None) -> tuple:
+        """The orders, items and revenue of each day and of each country of a date range, from the time index - or from the bitmap index, if filtered.
 
-    def number_of_months(self) -> int:
-        """Gets the number of months that the data covers.
+        Args:
+            start (str | None): First day of the date range.
+            end (str | None): Last day of the date range.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
 
         Returns:
-            int: The number of months that the data covers.
+            tuple: Measures of each day with orders, and measures of each country with orders.
         """
-        days = self.number_of_days()
-        months = math.ceil(days / (365/12))
+        measures = ["orders", "items", "revenue"]
+        if filters:
+            index = self.bitmap_index()
+            per_date = pd.DataFrame({measure: index.totals("date", measure, filters, start, end) for measure in measures})
+        else:
+            index = self.time_index()
+            per_date = pd.DataFrame({measure: index.series(measure, "day", start, end) for measure in measures})
+        per_country = pd.DataFrame({measure: self._breakdown("country", measure, start, end, filters) for measure in measures})
+
+        return per_date[per_date["orders"] > 0].rename_axis("date"), per_country
 
-        return months
-    
     def best_datetime_performance(self, aggregate: str, decomposer: str) -> pd.Series:
         """Extracts information about the best performing date object - works for "dates", "weekday" and "months".
 
@@ -244,10 +673,12 @@ class DataExtractor:
         if decomposer not in ["date", "weekday", "month"]:
             raise ValueError(f"Invalid decomposer used - must be in {allowed_decomposers}.")
         
-        if aggregate == "orders":
+        if self.rollup is not None and aggregate in ["orders", "revenue"]:
+            return self._rollup_sum(decomposer, aggregate).agg(["idxmax", "max"])
+        elif aggregate == "orders":
             return self.df[decomposer].value_counts().agg(["idxmax", "max"])
         elif aggregate == "revenue":
-            return self.df.groupby(decomposer)["price"].sum().agg(["idxmax", "max"])
+            return self.df.groupby(decomposer, observed=True)["price"].sum().agg(["idxmax", "max"])
         else:
             raise ValueError("Invalid aggregate used.")
         
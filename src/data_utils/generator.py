@@ -1,8 +1,15 @@
+import os
+import sys
 import random
 import datetime
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import pandas as pd
 
+sys.path.append("./")
+from src.data_utils.columnar import ColumnarWriter
+
 
 class DataGenerator:
     """Generator class that is capable of generating the necessary sample data for use with the dashboard - can serve to experiment, use as an example, or analyse.
@@ -81,20 +88,70 @@ class DataGenerator:
 
         return row
     
-    def generate_n_rows(self, rows: int) -> pd.DataFrame:
+    def generate_n_rows(
+            self, rows: int, bulk: bool=False, seed: int|None=None
+        ) -> pd.DataFrame:
         """Generates a dataframe, of a given number of rows, of random data.
 
         Args:
             rows (int): Number of rows.
+            bulk (bool, optional): Whether to use the vectorised bulk path (see generate_bulk_rows) instead of generating row by row. Defaults to False.
+            seed (int | None, optional): Seed for the bulk path, ignored otherwise. Defaults to None.
 
         Returns:
             pd.DataFrame: Dataframe with a given number of rows.
         """
+        if bulk:
+            return self.generate_bulk_rows(rows, seed=seed)
+
         data = [self.generate_row() for i in range(rows)]
         df = pd.DataFrame(data, columns=["date", "quantity", "price", "post_date", "country", "delivery_cost"])
 
         return df
 
+    def generate_bulk_rows(
+            self, rows: int, seed: int|np.random.SeedSequence|None=None
+        ) -> pd.DataFrame:
+        """Generates a dataframe of random data by drawing every column as a whole NumPy array, rather than building each row in Python. Follows the same distributions as generate_row and returns the same columns and dtypes as generate_n_rows.
+
+        Args:
+            rows (int): Number of rows.
+            seed (int | np.random.SeedSequence | None, optional): Seed for the random number generator, the same seed always produces the same data. Defaults to None.
+
+        Returns:
+            pd.DataFrame: Dataframe with a given number of rows.
+        """
+        rng = np.random.default_rng(seed)
+        start_date = np.datetime64(self.start, "D")
+        end_date = np.datetime64(self.end, "D")
+        days_diff = int((end_date - start_date) / np.timedelta64(1, "D"))
+
+        sale_offsets = rng.integers(0, days_diff, size=rows, endpoint=True)
+        # Dispatch is at most 7 days after the sale, and never after the end date
+        max_dispatch = np.minimum(7, days_diff - sale_offsets)
+        dispatch_offsets = rng.integers(0, max_dispatch, endpoint=True)
+
+        quantity = rng.integers(1, 5, size=rows, endpoint=True)
+        price = np.round(rng.integers(1, 100, size=rows, endpoint=True) + rng.random(rows), 2)
+        countries = np.asarray(self.countries, dtype=object)
+        country = countries[rng.integers(0, len(countries), size=rows)]
+        paid = rng.integers(0, 1, size=rows, endpoint=True).astype(bool)
+        delivery_cost = np.where(paid, np.round(price*0.2, 2), 0.0)
+
+        sale_date = (start_date + sale_offsets).astype("datetime64[ns]")
+        post_date = (start_date + sale_offsets + dispatch_offsets).astype("datetime64[ns]")
+
+        df = pd.DataFrame({
+            "date": sale_date,
+            "quantity": quantity,
+            "price": price,
+            "post_date": post_date,
+            "country": country,
+            "delivery_cost": delivery_cost
+        })
+
+        return df
+
     @staticmethod
     def save_csv(df: pd.DataFrame, filename: str) -> None:
         """Saves the cleaned dataframe to a CSV.
@@ -104,10 +161,98 @@ class DataGenerator:
             filename (str): Filename to save the df as.
         """
         df.to_csv(f"src/data/{filename}.csv", index=False)
+
+    def generate_shards(
+            self, rows: int, filename: str, shard_rows: int=1_000_000, chunk_rows: int=100_000,
+            seed: int=0, file_format: str="csv", workers: int|None=None
+        ) -> list:
+        """Generates a dataset too large to hold in memory by splitting it into shards, that are generated in parallel across a process pool and streamed to src/data/{filename}/ in fixed-size chunks. Only one chunk per worker is ever in memory. Every shard gets its own seed derived from the given seed, so the same arguments always produce the same files, regardless of the number of workers.
+
+        Args:
+            rows (int): Total number of rows.
+            filename (str): Name of the directory, in src/data/, to write the shards to.
+            shard_rows (int, optional): Maximum number of rows per shard (file). Defaults to 1_000_000.
+            chunk_rows (int, optional): Number of rows generated and written at a time. Defaults to 100_000.
+            seed (int, optional): Seed from which the per-shard seeds are derived. Defaults to 0.
+            file_format (str, optional): "csv" for CSV shards or "columnar" for per-column .npy shards (see src/data_utils/columnar.py). Defaults to "csv".
+            workers (int | None, optional): Number of worker processes, uses the number of CPUs if None. Defaults to None.
+
+        Returns:
+            list: Paths of the written shards, in order.
+        """
+        if file_format not in ["csv", "columnar"]:
+            raise ValueError("Invalid file format - must be 'csv' or 'columnar'.")
+
+        directory = f"src/data/{filename}"
+        os.makedirs(directory, exist_ok=True)
+
+        n_shards = -(-rows // shard_rows)
+        shard_seeds = np.random.SeedSequence(seed).spawn(n_shards)
+        extension = ".csv" if file_format == "csv" else ""
+        shards = [
+            (
+                os.path.join(directory, f"part-{i:05d}{extension}"),
+                min(shard_rows, rows - i*shard_rows),
+                shard_seeds[i]
+            )
+            for i in range(n_shards)
+        ]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    _write_shard, self.start, self.end, path, shard_size, chunk_rows, shard_seed, file_format
+                )
+                for path, shard_size, shard_seed in shards
+            ]
+            paths = [future.result() for future in futures]
+
+        return paths
+
+
+def _write_shard(
+        start: str, end: str, path: str, rows: int, chunk_rows: int,
+        seed: np.random.SeedSequence, file_format: str
+    ) -> str:
+    """Generates a single shard chunk by chunk, writing each chunk to disk before generating the next. Runs inside the worker processes of DataGenerator.generate_shards.
+
+    Args:
+        start (str): Start date in the format of 'YYYY-MM-DD'.
+        end (str): End date in the format of 'YYYY-MM-DD'.
+        path (str): Path of the shard.
+        rows (int): Number of rows in the shard.
+        chunk_rows (int): Number of rows generated and written at a time.
+        seed (np.random.SeedSequence): Seed of the shard.
+        file_format (str): "csv" or "columnar".
+
+    Returns:
+        str: Path of the written shard.
+    """
+    generator = DataGenerator(start=start, end=end)
+    n_chunks = -(-rows // chunk_rows)
+    chunk_seeds = seed.spawn(n_chunks)
+
+    writer = None
+    for i, chunk_seed in enumerate(chunk_seeds):
+        chunk = generator.generate_bulk_rows(min(chunk_rows, rows - i*chunk_rows), seed=chunk_seed)
+        if file_format == "csv":
+            chunk.to_csv(path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+        else:
+            if writer is None:
+                writer = ColumnarWriter(path, rows=rows, template=chunk, categories={"country": generator.countries})
+            writer.write(chunk)
+
+    if writer is not None:
+        writer.close()
+
+    return path
    
 
 if __name__ == "__main__":
     # This can be used to generate your own sample data
     generator = DataGenerator(start="2023-01-01", end="2023-12-31")
     df = generator.generate_n_rows(rows=1000)
-    generator.save_csv(df, filename="sample_data")
\ No newline at end of file
+    generator.save_csv(df, filename="sample_data")
+
+    # Larger datasets can be streamed to disk in shards instead, e.g.
+    # generator.generate_shards(rows=100_000_000, filename="load_test_data")
\ No newline at end of file
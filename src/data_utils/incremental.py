@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+
+import pandas as pd
+
+sys.path.append("./")
+from src.data_utils.columnar import save_columnar, load_columnar
+
+
+MANIFEST_FILENAME = "manifest.json"
+# Number of bytes at the end of the processed part of a file that are hashed, to check that the file was appended to rather than rewritten
+TAIL_BYTES = 4096
+
+
+def tail_hash(path: str, size: int) -> str:
+    """Hashes the last TAIL_BYTES bytes of the first size bytes of a file.
+
+    Args:
+        path (str): Path of the file.
+        size (int): Number of bytes of the file to consider.
+
+    Returns:
+        str: Hex digest of the bytes.
+    """
+    with open(path, "rb") as f:
+        f.seek(max(size - TAIL_BYTES, 0))
+        tail = f.read(min(size, TAIL_BYTES))
+
+    return hashlib.blake2b(tail, digest_size=16).hexdigest()
+
+
+class IncrementalStore:
+    """On-disk store of incrementally ingested data. The transformed rows are kept as a list of memory-mapped columnar segments, one per ingested file or range of appended rows, alongside a manifest of how many rows (and bytes) of each source file have been ingested and, optionally, the merged rollup and sketch frame.
+
+    Nothing that is written is part of the store until the manifest that lists it is written, see save_manifest. The rollup and sketch frame are written to a new directory each time, named in the manifest, so the manifest always names the rollup and sketch frame of exactly the segments it lists - even if the process dies before writing it. The store is not safe to read and update from several processes at once - hold a lock while doing so, see cache.file_lock.
+
+    Args:
+        path (str): Directory of the store.
+        settings (dict): Settings the data is transformed with (e.g. the column mapping) - the store is reset if they change.
+    """
+    def __init__(self, path: str, settings: dict) -> None:
+        self.path = path
+        self.settings = settings
+        self.manifest = {"settings": settings, "files": {}, "segments": []}
+
+        manifest_path = os.path.join(path, MANIFEST_FILENAME)
+        if os.path.isfile(manifest_path):
+            manifest = json.load(open(manifest_path))
+            if manifest["settings"] == settings:
+                self.manifest = manifest
+            else:
+                self.reset()
+
+    @property
+    def files(self) -> dict:
+        """Ingested files, with the number of rows and bytes ingested, the modification time and the hash of the tail of the ingested bytes of each.
+        """
+        return self.manifest["files"]
+
+    def reset(self) -> None:
+        """Removes everything that was ingested.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.manifest = {"settings": self.settings, "files": {}, "segments": []}
+
+    def load_segments(self) -> list:
+        """Loads the ingested segments, memory-mapped, in the order they were ingested.
+
+        Returns:
+            list: Dataframe of each segment.
+        """
+        return [load_columnar(os.path.join(self.path, segment["name"])) for segment in self.manifest["segments"]]
+
+    def append_segment(self, df: pd.DataFrame, source: str, start: int, stop: int) -> None:
+        """Stores the transformed rows of a range of rows of a source file as a new segment.
+
+        Args:
+            df (pd.DataFrame): Transformed rows.
+            source (str): Path of the source file.
+            start (int): Index of the first row of the range in the source file.
+            stop (int): Index one past the last row of the range in the source file.
+        """
+        name = f"segment-{len(self.manifest['segments']):05d}"
+        # A segment of the same name may have been written by a process that died before writing the manifest
+        shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        save_columnar(df, os.path.join(self.path, name))
+        self.manifest["segments"].append({"name": name, "source": source, "start": start, "stop": stop})
+
+    def _load_frame(self, kind: str) -> pd.DataFrame|None:
+        """Loads the stored frame of a kind, named in the manifest.
+
+        Args:
+            kind (str): "rollup" or "sketches".
+
+        Returns:
+            pd.DataFrame | None: The frame, None if the manifest names none.
+        """
+        name = self.manifest.get(kind)
+        return None if name is None else load_columnar(os.path.join(self.path, name), mmap=False)
+
+    def _save_frame(self, df: pd.DataFrame, kind: str) -> None:
+        """Writes the frame of a kind to a new directory, that replaces the stored frame once the manifest is written.
+
+        Args:
+            df (pd.DataFrame): The frame.
+            kind (str): "rollup" or "sketches".
+        """
+        name = f"{kind}-{self.manifest.get('generation', 0) + 1:05d}"
+        path = os.path.join(self.path, name)
+        shutil.rmtree(path, ignore_errors=True)
+        save_columnar(df, path)
+        self.manifest[kind] = name
+
+    def load_rollup(self) -> pd.DataFrame|None:
+        """Loads the stored rollup.
+
+        Returns:
+            pd.DataFrame | None: The rollup of every ingested row, None if there is none.
+        """
+        return self._load_frame("rollup")
+
+    def save_rollup(self, rollup: pd.DataFrame) -> None:
+        """Replaces the stored rollup.
+
+        Args:
+            rollup (pd.DataFrame): The rollup of every ingested row.
+        """
+        self._save_frame(rollup, "rollup")
+
+    def load_sketches(self) -> pd.DataFrame|None:
+        """Loads the stored sketch frame, see quantile_sketch.sketch_frame.
+
+        Returns:
+            pd.DataFrame | None: The sketch frame of every ingested row, None if there is none.
+        """
+        return self._load_frame("sketches")
+
+    def save_sketches(self, sketches: pd.DataFrame) -> None:
+        """Replaces the stored sketch frame.
+
+        Args:
+            sketches (pd.DataFrame): The sketch frame of every ingested row.
+        """
+        self._save_frame(sketches, "sketches")
+
+    def save_manifest(self) -> None:
+        """Writes the manifest - the segments, rollup and sketch frame are only part of the store once the manifest that lists them is written, which replaces the previous manifest atomically. The rollups, sketch frames and segments that it does not list (those it replaced, or written by a process that died) are then removed.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        self.manifest["generation"] = self.manifest.get("generation", 0) + 1
+        tmp_path = os.path.join(self.path, f"{MANIFEST_FILENAME}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST_FILENAME))
+
+        listed = {segment["name"] for segment in self.manifest["segments"]}
+        listed.update(self.manifest[kind] for kind in ["rollup", "sketches"] if kind in self.manifest)
+        for entry in os.listdir(self.path):
+            if entry != MANIFEST_FILENAME and entry not in listed and os.path.isdir(os.path.join(self.path, entry)):
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
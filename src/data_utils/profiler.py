@@ -0,0 +1,139 @@
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from typing import Any, Callable
+from dataclasses import dataclass, asdict
+
+import pandas as pd
+
+sys.path.append("./")
+
+
+@dataclass(frozen=True)
+class StageProfile:
+    """Resources used by one stage of loading or transforming the data.
+    """
+    stage: str
+    wall_seconds: float
+    cpu_seconds: float
+    peak_memory_bytes: int|None
+    retained_memory_bytes: int|None
+    rows_in: int|None
+    rows_out: int|None
+
+
+class StageProfiler:
+    """Records the wall time, CPU time, memory and rows in and out of every stage it runs. Memory is traced with tracemalloc only while a stage runs, and is measured relative to the start of the stage - the peak is the most memory the stage allocated at once, and the retained memory what it still held at the end.
+
+    Args:
+        memory (bool, optional): Whether to trace memory, which slows every stage down (so inflates their wall and CPU times). Defaults to True.
+    """
+    def __init__(self, memory: bool=True) -> None:
+        self.memory = memory
+        self.stages = []
+
+    def run(self, name: str, stage: Callable[[], Any], rows: Callable[[], int|None]) -> Any:
+        """Runs a stage and records its profile.
+
+        Args:
+            name (str): Name of the stage.
+            stage (Callable[[], Any]): Function that runs the stage.
+            rows (Callable[[], int | None]): Function that counts the rows of the data, called before and after the stage. The rows out are those of the result instead, if the stage returns a dataframe.
+
+        Returns:
+            Any: Result of the stage.
+        """
+        rows_in = rows()
+        tracing = tracemalloc.is_tracing()
+        if self.memory:
+            if tracing:
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        result = stage()
+        wall_seconds, cpu_seconds = time.perf_counter() - start_wall, time.process_time() - start_cpu
+
+        peak_bytes = retained_bytes = None
+        if self.memory:
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            if not tracing:
+                tracemalloc.stop()
+            peak_bytes, retained_bytes = peak_bytes - start_bytes, current_bytes - start_bytes
+
+        self.stages.append(StageProfile(
+            stage=name,
+            wall_seconds=wall_seconds,
+            cpu_seconds=cpu_seconds,
+            peak_memory_bytes=peak_bytes,
+            retained_memory_bytes=retained_bytes,
+            rows_in=rows_in,
+            rows_out=result.shape[0] if isinstance(result, pd.DataFrame) else rows()
+        ))
+
+        return result
+
+    def to_dicts(self) -> list:
+        """Profile of every stage, in the order they ran.
+
+        Returns:
+            list: Dictionary of each StageProfile.
+        """
+        return [asdict(stage) for stage in self.stages]
+
+    def report(self) -> str:
+        """Table of the profile of every stage, with each stage's share of the total wall time.
+
+        Returns:
+            str: Report of the stages.
+        """
+        total = sum(stage.wall_seconds for stage in self.stages)
+        format_rows = lambda rows: f"{rows:,}" if rows is not None else "-"
+        format_bytes = lambda size: f"{size / 1024**2:.1f}" if size is not None else "-"
+
+        lines = [
+            f"{'Stage':<28} {'Wall ms':>10} {'Share':>7} {'CPU ms':>10} {'Peak MB':>9} {'Kept MB':>9} {'Rows in':>12} {'Rows out':>12}"
+        ]
+        for stage in self.stages:
+            share = stage.wall_seconds / total if total else 0.0
+            lines.append(
+                f"{stage.stage:<28} {stage.wall_seconds * 1000:>10.1f} {share:>7.1%} {stage.cpu_seconds * 1000:>10.1f} "
+                f"{format_bytes(stage.peak_memory_bytes):>9} {format_bytes(stage.retained_memory_bytes):>9} "
+                f"{format_rows(stage.rows_in):>12} {format_rows(stage.rows_out):>12}"
+            )
+        lines.append(f"{'Total':<28} {total * 1000:>10.1f}")
+
+        return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Profiles loading and transforming the data configured in config.json, stage by stage.")
+    parser.add_argument("--filename", default=None, help="Data file to profile instead of the FILENAME in config.json.")
+    parser.add_argument("--no-cache", action="store_true", help="Profiles loading the data file even if it is cached.")
+    parser.add_argument("--no-memory", action="store_true", help="Skips tracing memory, which inflates the times of the stages.")
+    parser.add_argument("--json", default=None, help="Path to also write the profile to, as JSON.")
+    args = parser.parse_args()
+
+    from src.data_utils.transformer import DataTransformer
+
+    config = json.load(open("config.json"))
+    if args.filename is not None:
+        config["FILENAME"] = args.filename
+    if args.no_cache:
+        config["CACHE"] = False
+
+    transformer = DataTransformer(config=config, profiler=StageProfiler(memory=not args.no_memory))
+    transformer.apply_transformations()
+
+    print(transformer.profiler.report())
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(transformer.profiler.to_dicts(), f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
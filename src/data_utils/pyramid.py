@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+
+# Resampling rule, period alias (used to find the start of a bucket) and bar period (ms, or a plotly period string) of each timeline granularity, finest first
+GRANULARITIES = {
+    "hour": {"rule": "h", "alias": "h", "period": 3_600_000, "period0": "2000-01-03"},
+    "day": {"rule": "D", "alias": "D", "period": 86_400_000, "period0": "2000-01-03"},
+    "week": {"rule": "W-MON", "alias": "W-SUN", "period": 7 * 86_400_000, "period0": "2000-01-03"},
+    "month": {"rule": "MS", "alias": "M", "period": "M1", "period0": "2000-01-01"},
+    "quarter": {"rule": "QS", "alias": "Q", "period": "M3", "period0": "2000-01-01"}
+}
+
+
+class TimePyramid:
+    """Multi-resolution view of the orders and revenue over time. The orders and revenue are counted into hourly (if the dates have times) or daily leaves, and kept as cumulative sums, so the total of any bucket of any coarser level (days, weeks, months and quarters) is the difference of two cumulative sums. Only the bucket boundaries of each level are precomputed, so a query costs time proportional to the number of buckets it returns rather than the number of orders.
+
+    Args:
+        dates (np.ndarray): Date of each order (or of each row of a rollup).
+        orders (np.ndarray | None): Number of orders of each row, None if every row is one order.
+        revenue (np.ndarray): Revenue of each row.
+    """
+    def __init__(self, dates: np.ndarray, orders: np.ndarray|None, revenue: np.ndarray) -> None:
+        dates = np.asarray(dates, dtype="datetime64[ns]")
+        valid = ~np.isnat(dates)
+        dates, revenue = dates[valid], np.asarray(revenue)[valid]
+        orders = None if orders is None else np.asarray(orders)[valid]
+
+        has_times = (dates.astype(np.int64) % (86_400 * 10**9) != 0).any()
+        self.leaf = "hour" if has_times else "day"
+        unit = "h" if has_times else "D"
+
+        leaves = dates.astype(f"datetime64[{unit}]")
+        first_leaf = leaves.min()
+        leaf_index = (leaves - first_leaf).astype(np.int64)
+        self.leaf_times = pd.date_range(
+            first_leaf, periods=leaf_index.max() + 1, freq=GRANULARITIES[self.leaf]["rule"]
+        ).to_numpy()
+
+        self.cumulative = {}
+        for measure, weights in [("orders", orders), ("revenue", revenue)]:
+            totals = np.bincount(leaf_index, weights=weights, minlength=len(self.leaf_times))
+            self.cumulative[measure] = np.concatenate([[0], np.cumsum(totals)])
+        self.cumulative["orders"] = self.cumulative["orders"].round().astype(np.int64)
+
+        self.levels = {}
+        names = list(GRANULARITIES)
+        for name in names[names.index(self.leaf):]:
+            first = pd.Timestamp(self.leaf_times[0]).to_period(GRANULARITIES[name]["alias"]).start_time
+            starts = pd.date_range(first, self.leaf_times[-1], freq=GRANULARITIES[name]["rule"]).to_numpy()
+            # Leaf index at which each bucket starts, plus the end of the last bucket
+            bounds = np.append(np.searchsorted(self.leaf_times, starts), len(self.leaf_times))
+            self.levels[name] = (starts, bounds)
+
+    def _visible(self, level: str, start: np.datetime64, end: np.datetime64) -> tuple:
+        """Range of the buckets of a level that overlap a time range.
+
+        Args:
+            level (str): Level of the pyramid.
+            start (np.datetime64): Start of the time range.
+            end (np.datetime64): End of the time range.
+
+        Returns:
+            tuple: Index of the first bucket, and one past the index of the last bucket.
+        """
+        starts = self.levels[level][0]
+        first = max(np.searchsorted(starts, start, side="right") - 1, 0)
+        last = np.searchsorted(starts, end, side="right")
+
+        return first, max(last, first)
+
+    def query(self, measure: str, start: str, end: str, max_points: int) -> tuple:
+        """Gets a measure over a time range at the finest level that has at most max_points buckets in the range (or at the coarsest level, if no level does).
+
+        Args:
+            measure (str): Measure to get - must be "orders" or "revenue".
+            start (str): Start of the time range.
+            end (str): End of the time range.
+            max_points (int): Maximum number of buckets to return.
+
+        Returns:
+            tuple: Name of the chosen level, and the measure of each bucket in the range indexed by the start of the bucket.
+        """
+        if measure not in self.cumulative:
+            raise ValueError("Invalid measure - must be 'orders' or 'revenue'.")
+
+        start, end = np.datetime64(pd.Timestamp(start)), np.datetime64(pd.Timestamp(end))
+        for level in self.levels:
+            first, last = self._visible(level, start, end)
+            if last - first <= max_points:
+                break
+
+        starts, bounds = self.levels[level]
+        cumulative = self.cumulative[measure]
+        totals = cumulative[bounds[first + 1:last + 1]] - cumulative[bounds[first:last]]
+
+        return level, pd.Series(totals, index=pd.DatetimeIndex(starts[first:last]))
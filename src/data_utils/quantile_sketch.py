@@ -0,0 +1,329 @@
+import math
+import calendar
+
+import numpy as np
+import pandas as pd
+
+
+# Every quantile of a sketch is within this fraction of the exact quantile, see QuantileSketch
+RELATIVE_ACCURACY = 0.01
+# Smallest and largest magnitude that the sketches tell apart - smaller non-zero magnitudes are counted as MIN_VALUE, and larger ones as MAX_VALUE
+MIN_VALUE = 1e-2
+MAX_VALUE = 1e9
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+_MIN_EXPONENT = math.ceil(math.log(MIN_VALUE) / _LOG_GAMMA)
+# Number of buckets of each sign - every sketch is an array of 2 * KEYS + 1 counts (the negative buckets, zero, then the positive buckets)
+KEYS = math.ceil(math.log(MAX_VALUE) / _LOG_GAMMA) - _MIN_EXPONENT + 1
+BINS = 2 * KEYS + 1
+
+# Whole-number measures count each whole number up to this magnitude in a bucket of its own, so their quantiles are exact up to it, see sketch_keys
+EXACT_INTEGERS = 500
+
+# Column of the transformed data that each sketched measure is taken from
+MEASURES = {"days_to_dispatch": "days_to_dispatch", "order_value": "price", "items": "quantity"}
+# Measures whose values are whole numbers, so they are sketched with a bucket per whole number up to EXACT_INTEGERS
+INTEGER_MEASURES = ["days_to_dispatch", "items"]
+PERCENTILES = (50, 90, 99)
+# Dimensions that the sketches are kept per, and so can be filtered by - the "month" filter is the calendar month of the sketch
+SKETCH_DIMENSIONS = ["country", "paid", "month"]
+
+
+def _log_keys(magnitudes: np.ndarray) -> np.ndarray:
+    """Bucket of each magnitude among the powers of GAMMA.
+
+    Args:
+        magnitudes (np.ndarray): Magnitudes, without NaNs.
+
+    Returns:
+        np.ndarray: Key of the bucket of each magnitude, between 1 and KEYS.
+    """
+    magnitudes = np.clip(magnitudes, MIN_VALUE, MAX_VALUE)
+
+    return np.ceil(np.log(magnitudes) / _LOG_GAMMA).astype(np.int64) - _MIN_EXPONENT + 1
+
+
+def _log_magnitudes(keys: np.ndarray) -> np.ndarray:
+    """Estimate of the magnitudes of each bucket among the powers of GAMMA, the inverse of _log_keys - the magnitude that is within RELATIVE_ACCURACY of both ends of the bucket.
+
+    Args:
+        keys (np.ndarray): Keys of the buckets, positive.
+
+    Returns:
+        np.ndarray: Estimate of each bucket.
+    """
+    return 2 * GAMMA ** (keys + _MIN_EXPONENT - 1) / (GAMMA + 1)
+
+
+# Shift of the buckets of whole numbers larger than EXACT_INTEGERS, so that they follow the bucket of EXACT_INTEGERS - the largest key still fits within KEYS
+_INTEGER_SHIFT = EXACT_INTEGERS + 1 - int(_log_keys(np.array([EXACT_INTEGERS + 1.0]))[0])
+
+
+def sketch_keys(values: np.ndarray, integer: bool=False) -> np.ndarray:
+    """Bucket of each value - the buckets of a sign are powers of GAMMA, so each holds the values within RELATIVE_ACCURACY of its estimate (see sketch_values). Zero has a bucket of its own, and negative values are mirrored into negative keys.
+
+    The values of a whole-number measure are rounded to whole numbers, and those up to EXACT_INTEGERS in magnitude are their own key, so that their estimate is the value itself - the buckets of the powers of GAMMA are narrower than 1 only below around 50. Larger values take the buckets of the powers of GAMMA, shifted to follow.
+
+    Args:
+        values (np.ndarray): Values, without NaNs.
+        integer (bool, optional): Whether the values are of a whole-number measure, see INTEGER_MEASURES. Defaults to False.
+
+    Returns:
+        np.ndarray: Key of the bucket of each value, between -KEYS and KEYS.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    magnitudes = np.abs(values)
+    if integer:
+        magnitudes = np.round(magnitudes)
+        keys = np.where(magnitudes <= EXACT_INTEGERS, magnitudes, _log_keys(magnitudes) + _INTEGER_SHIFT).astype(np.int64)
+    else:
+        keys = _log_keys(magnitudes)
+
+    return (np.sign(values).astype(np.int64) * keys).astype(np.int16)
+
+
+def sketch_values(keys: np.ndarray, integer: bool=False) -> np.ndarray:
+    """Estimate of the values of each bucket, the inverse of sketch_keys.
+
+    Args:
+        keys (np.ndarray): Keys of the buckets.
+        integer (bool, optional): Whether the buckets are of a whole-number measure, see sketch_keys. Defaults to False.
+
+    Returns:
+        np.ndarray: Estimate of each bucket.
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    magnitudes = np.abs(keys)
+    if integer:
+        magnitudes = np.where(magnitudes <= EXACT_INTEGERS, magnitudes, _log_magnitudes(magnitudes - _INTEGER_SHIFT))
+    else:
+        magnitudes = _log_magnitudes(magnitudes)
+
+    return np.where(keys == 0, 0.0, np.sign(keys) * magnitudes)
+
+
+def quantiles_of(counts: np.ndarray, quantiles: list, integer: bool=False) -> np.ndarray:
+    """Quantiles of one or more sketches, each an array of BINS counts. The quantile q of n values is the value of rank floor(q * (n - 1)), as np.quantile(method="lower") - which is a value that was counted, so its estimate is within RELATIVE_ACCURACY of it (and is exact for a whole-number measure up to EXACT_INTEGERS).
+
+    Args:
+        counts (np.ndarray): Counts of a sketch, or one sketch per row.
+        quantiles (list): Quantiles, between 0 and 1.
+        integer (bool, optional): Whether the sketches are of a whole-number measure, see sketch_keys. Defaults to False.
+
+    Returns:
+        np.ndarray: Each quantile of the sketch, or of each sketch per row - NaN for a sketch with no values.
+    """
+    counts = np.atleast_2d(counts)
+    cumulative = np.cumsum(counts, axis=1)
+    totals = cumulative[:, -1]
+    result = np.full((counts.shape[0], len(quantiles)), np.nan)
+    counted = totals > 0
+
+    for i, quantile in enumerate(quantiles):
+        ranks = np.floor(quantile * (totals[counted] - 1))
+        bins = (cumulative[counted] > ranks[:, None]).argmax(axis=1)
+        result[counted, i] = sketch_values(bins - KEYS, integer)
+
+    return result
+
+
+class QuantileSketch:
+    """Mergeable sketch of the distribution of a measure, for approximate quantiles (a DDSketch with a dense store). Each value is counted in a bucket of values within RELATIVE_ACCURACY of each other, so every quantile is within RELATIVE_ACCURACY of the exact quantile, e.g. a p90 order value of 50.00 is reported between 49.50 and 50.50. Values smaller than MIN_VALUE (but not 0) and larger than MAX_VALUE are the exceptions, as they share the first and last bucket. The quantiles of a whole-number measure are exact up to EXACT_INTEGERS, see sketch_keys.
+
+    A sketch takes BINS counts (around 20KB) however many values it has, and two sketches are merged by adding their counts - so the sketches of separately ingested parts of the data merge into exactly the sketch of all of it.
+
+    Args:
+        counts (np.ndarray | None, optional): Counts of each bucket. Defaults to None, an empty sketch.
+        integer (bool, optional): Whether the sketch is of a whole-number measure, see sketch_keys. Defaults to False.
+    """
+    def __init__(self, counts: np.ndarray|None=None, integer: bool=False) -> None:
+        self.counts = np.zeros(BINS, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        self.integer = integer
+
+    @property
+    def count(self) -> int:
+        """Number of values counted.
+        """
+        return int(self.counts.sum())
+
+    def add(self, values: np.ndarray) -> "QuantileSketch":
+        """Counts values into the sketch. NaNs are left out.
+
+        Args:
+            values (np.ndarray): Values to count.
+
+        Returns:
+            QuantileSketch: The sketch.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        keys = sketch_keys(values[~np.isnan(values)], self.integer)
+        self.counts += np.bincount(keys.astype(np.int64) + KEYS, minlength=BINS)
+
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Merges another sketch into the sketch.
+
+        Args:
+            other (QuantileSketch): Sketch to merge, of the same measure.
+
+        Returns:
+            QuantileSketch: The sketch.
+        """
+        self.counts += other.counts
+
+        return self
+
+    def quantiles(self, quantiles: list) -> np.ndarray:
+        """Approximate quantiles of the values counted, see quantiles_of.
+
+        Args:
+            quantiles (list): Quantiles, between 0 and 1.
+
+        Returns:
+            np.ndarray: Each quantile, NaN if the sketch has no values.
+        """
+        return quantiles_of(self.counts, quantiles, self.integer)[0]
+
+
+def sketch_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Sketches each measure of MEASURES of a transformed dataframe, per calendar month, country and delivery type (paid or free), as a frame with the count of each (month, country, paid, measure, key) bucket. Like the rollup, its size depends on the number of distinct values (at RELATIVE_ACCURACY) per month, country and delivery type rather than the number of orders, and the frames of separate parts of the data merge into the frame of all of it, see DataTransformer.merge_sketches.
+
+    Args:
+        df (pd.DataFrame): Transformed dataframe.
+
+    Returns:
+        pd.DataFrame: Sketch frame of the dataframe.
+    """
+    months = df["date"].to_numpy().astype("datetime64[M]")
+    dated = ~np.isnat(months)
+    month_codes, month_values = pd.factorize(months[dated], sort=True)
+    countries = df["country"].astype("category")
+    # Rows without a country have the code 0 rather than -1, so every code is positive
+    country_codes = countries.cat.codes.to_numpy()[dated].astype(np.int64) + 1
+    paid = df["delivery_cost"].ne(0).to_numpy()[dated]
+    groups = (month_codes.astype(np.int64) * (len(countries.cat.categories) + 1) + country_codes) * 2 + paid
+
+    parts = []
+    for measure, column in MEASURES.items():
+        values = df[column].to_numpy(dtype=np.float64)[dated]
+        valid = ~np.isnan(values)
+        buckets = groups[valid] * BINS + sketch_keys(values[valid], measure in INTEGER_MEASURES).astype(np.int64) + KEYS
+        buckets, counts = np.unique(buckets, return_counts=True)
+        groups_of, keys = np.divmod(buckets, BINS)
+        groups_of, paid_of = np.divmod(groups_of, 2)
+        month_of, country_of = np.divmod(groups_of, len(countries.cat.categories) + 1)
+        parts.append(pd.DataFrame({
+            "month": month_values[month_of].astype("datetime64[ns]"),
+            "country": pd.Categorical.from_codes(country_of - 1, categories=countries.cat.categories),
+            "paid": paid_of.astype(bool),
+            "measure": pd.Categorical.from_codes(np.full(len(keys), list(MEASURES).index(measure)), categories=list(MEASURES)),
+            "key": (keys - KEYS).astype(np.int16),
+            "count": counts.astype(np.int64)
+        }))
+
+    return pd.concat(parts, ignore_index=True)
+
+
+class SketchIndex:
+    """Index of a sketch frame (see sketch_frame), for the approximate percentiles of a measure over a date range and filter. The buckets of each measure are kept sorted by month, so the months of a date range are a contiguous slice found with two binary searches, and the sketch of the range is a single weighted count of the buckets of that slice that match the filter. Its cost depends on the size of the sketch frame rather than the number of orders.
+
+    Date ranges are at the granularity of a calendar month - the percentiles of a date range are those of every month it overlaps. Only the dimensions of SKETCH_DIMENSIONS can be filtered by.
+
+    Args:
+        frame (pd.DataFrame): Sketch frame of the data.
+    """
+    def __init__(self, frame: pd.DataFrame) -> None:
+        countries = frame["country"].astype("category")
+        self.countries = pd.Index(np.asarray(countries.cat.categories), name="country")
+        country_codes = countries.cat.codes.to_numpy()
+        months = frame["month"].to_numpy().astype("datetime64[M]")
+        measures = frame["measure"].astype(str).to_numpy()
+
+        self.columns = {}
+        for measure in MEASURES:
+            rows = np.flatnonzero(measures == measure)
+            rows = rows[np.argsort(months[rows], kind="stable")]
+            self.columns[measure] = {
+                "month": months[rows],
+                "country": country_codes[rows],
+                "paid": frame["paid"].to_numpy()[rows],
+                "key": frame["key"].to_numpy()[rows].astype(np.int64) + KEYS,
+                "count": frame["count"].to_numpy()[rows]
+            }
+
+    def _rows(self, measure: str, filters: dict|None, start: str|None, end: str|None) -> tuple:
+        """Buckets of a measure within a date range that match a filter.
+
+        Args:
+            measure (str): Measure of MEASURES.
+            filters (dict | None): Value that each filtered dimension must have, None for every order.
+            start (str | None): First day of the date range, None for the first day of the data.
+            end (str | None): Last day of the date range, None for the last day of the data.
+
+        Returns:
+            tuple: Columns of the buckets of the measure, the slice of the buckets within the date range, and whether each bucket of the slice matches the filter.
+        """
+        if measure not in MEASURES:
+            raise ValueError(f"Invalid measure - must be in {list(MEASURES)}.")
+        unsupported = [name for name in (filters or {}) if name not in SKETCH_DIMENSIONS]
+        if unsupported:
+            raise ValueError(f"Percentiles cannot be filtered by {unsupported} - only by {SKETCH_DIMENSIONS}.")
+
+        columns = self.columns[measure]
+        first = 0 if start is None else np.searchsorted(columns["month"], np.datetime64(pd.Timestamp(start), "M"))
+        last = len(columns["month"]) if end is None else np.searchsorted(columns["month"], np.datetime64(pd.Timestamp(end), "M"), side="right")
+        if start is not None and end is not None and pd.Timestamp(start) > pd.Timestamp(end):
+            # An inverted date range has no orders, even within a single month
+            last = first
+        span = slice(first, last)
+
+        matches = np.ones(last - first, dtype=bool)
+        for name, value in (filters or {}).items():
+            if name == "country":
+                # A country that is not in the data matches no buckets, rather than those without a country (-1)
+                code = self.countries.get_indexer([value])[0]
+                matches &= (columns["country"][span] == code) & (code >= 0)
+            elif name == "paid":
+                matches &= columns["paid"][span] == bool(value)
+            else:
+                matches &= columns["month"][span].astype(int) % 12 == list(calendar.month_name).index(value) - 1
+
+        return columns, span, matches
+
+    def sketch(self, measure: str, filters: dict|None=None, start: str|None=None, end: str|None=None) -> QuantileSketch:
+        """Sketch of a measure over a date range and the orders that match a filter.
+
+        Args:
+            measure (str): Measure of MEASURES.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+
+        Returns:
+            QuantileSketch: Sketch of the measure.
+        """
+        columns, span, matches = self._rows(measure, filters, start, end)
+        counts = np.bincount(columns["key"][span][matches], weights=columns["count"][span][matches], minlength=BINS)
+
+        return QuantileSketch(counts.round().astype(np.int64), measure in INTEGER_MEASURES)
+
+    def country_sketches(self, measure: str, filters: dict|None=None, start: str|None=None, end: str|None=None) -> tuple:
+        """Sketch of a measure for each country, over a date range and the orders that match a filter, counted in a single pass.
+
+        Args:
+            measure (str): Measure of MEASURES.
+            filters (dict | None, optional): Value that each filtered dimension must have. Defaults to None, every order.
+            start (str | None, optional): First day of the date range. Defaults to None, the whole data.
+            end (str | None, optional): Last day of the date range. Defaults to None, the whole data.
+
+        Returns:
+            tuple: Countries, and the counts of the sketch of each country (one row per country).
+        """
+        columns, span, matches = self._rows(measure, filters, start, end)
+        # Buckets without a country are left out
+        matches &= columns["country"][span] >= 0
+        cells = columns["country"][span][matches].astype(np.int64) * BINS + columns["key"][span][matches]
+        counts = np.bincount(cells, weights=columns["count"][span][matches], minlength=len(self.countries) * BINS)
+
+        return self.countries, counts.reshape(len(self.countries), BINS).round().astype(np.int64)
@@ -0,0 +1,143 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append("./")
+from src.data_utils.pyramid import GRANULARITIES
+
+
+MEASURES = ["orders", "items", "revenue"]
+
+
+class TimeIndex:
+    """Date-range index of the orders, items and revenue. The distinct dates are kept sorted, along with the cumulative orders, items and revenue up to each of them, so the total of any date range is the difference of two cumulative sums found with two binary searches - the cost of a range query depends on neither the number of orders nor the length of the range. The totals of each value of the dimensions (e.g. each country) are kept cumulatively per day too, so a range is broken down by a dimension with two lookups per value.
+
+    Date ranges are inclusive and at the granularity of a day, e.g. ("2023-01-01", "2023-01-31") is the whole of January.
+
+    Args:
+        dates (np.ndarray): Date of each order (or of each row of a rollup).
+        orders (np.ndarray | None): Number of orders of each row, None if every row is one order.
+        items (np.ndarray): Number of items of each row.
+        revenue (np.ndarray): Revenue of each row.
+        dimensions (dict, optional): Value of each row of each dimension to break ranges down by, keyed by the name of the dimension. Defaults to None.
+    """
+    def __init__(self, dates: np.ndarray, orders: np.ndarray|None, items: np.ndarray, revenue: np.ndarray, dimensions: dict|None=None) -> None:
+        dates = np.asarray(dates, dtype="datetime64[ns]")
+        valid = ~np.isnat(dates)
+        dates = dates[valid]
+        weights = {
+            "orders": None if orders is None else np.asarray(orders)[valid],
+            "items": np.asarray(items)[valid],
+            "revenue": np.asarray(revenue)[valid]
+        }
+
+        # Sorted distinct dates, and the distinct date of each row
+        self.times, time_index = np.unique(dates, return_inverse=True)
+        self.cumulative = {}
+        for measure in MEASURES:
+            totals = np.bincount(time_index, weights=weights[measure], minlength=len(self.times))
+            self.cumulative[measure] = np.concatenate([[0], np.cumsum(totals)])
+        for measure in ["orders", "items"]:
+            self.cumulative[measure] = self.cumulative[measure].round().astype(np.int64)
+
+        # Every day from the first to the last date, and the distinct date index at which each day starts, plus the end of the last day
+        first_day = self.times[0].astype("datetime64[D]")
+        self.days = pd.date_range(first_day, self.times[-1].astype("datetime64[D]"), freq="D").to_numpy()
+        self.day_bounds = np.append(np.searchsorted(self.times, self.days), len(self.times))
+
+        day_index = (dates.astype("datetime64[D]") - first_day).astype(np.int64)
+        self.dimensions = {}
+        for name, values in (dimensions or {}).items():
+            codes, categories = pd.factorize(pd.Series(values)[valid], sort=True)
+            categories = pd.Index(np.asarray(categories), name=name)
+            # Rows with a missing value are left out of the breakdown, but still counted in the totals
+            known = codes >= 0
+            flat = day_index[known] * len(categories) + codes[known]
+            cumulative = {}
+            for measure in MEASURES:
+                measure_weights = None if weights[measure] is None else weights[measure][known]
+                totals = np.bincount(flat, weights=measure_weights, minlength=len(self.days) * len(categories))
+                totals = totals.reshape(len(self.days), len(categories))
+                cumulative[measure] = np.vstack([np.zeros((1, len(categories))), np.cumsum(totals, axis=0)])
+            for measure in ["orders", "items"]:
+                cumulative[measure] = cumulative[measure].round().astype(np.int64)
+            self.dimensions[name] = (categories, cumulative)
+
+    def _day_span(self, start: str|None, end: str|None) -> tuple:
+        """Range of the days of the index that are within a date range.
+
+        Args:
+            start (str | None): First day of the range, None for the first day of the data.
+            end (str | None): Last day of the range, None for the last day of the data.
+
+        Returns:
+            tuple: Index of the first day, and one past the index of the last day.
+        """
+        first = 0 if start is None else np.searchsorted(self.days, np.datetime64(pd.Timestamp(start).normalize()))
+        last = len(self.days) if end is None else np.searchsorted(self.days, np.datetime64(pd.Timestamp(end).normalize()), side="right")
+
+        return first, max(last, first)
+
+    def total(self, measure: str, start: str|None=None, end: str|None=None) -> float:
+        """Total of a measure over a date range.
+
+        Args:
+            measure (str): Measure to total - must be "orders", "items" or "revenue".
+            start (str | None, optional): First day of the range. Defaults to None, the first day of the data.
+            end (str | None, optional): Last day of the range. Defaults to None, the last day of the data.
+
+        Returns:
+            float: Total of the measure.
+        """
+        first, last = self._day_span(start, end)
+        cumulative = self.cumulative[measure]
+
+        return cumulative[self.day_bounds[last]] - cumulative[self.day_bounds[first]]
+
+    def series(self, measure: str, granularity: str, start: str|None=None, end: str|None=None) -> pd.Series:
+        """A measure over a date range, in calendar-aligned buckets. The first and last buckets only count the days within the range.
+
+        Args:
+            measure (str): Measure to get - must be "orders", "items" or "revenue".
+            granularity (str): Bucket size - must be "day", "week", "month" or "quarter".
+            start (str | None, optional): First day of the range. Defaults to None, the first day of the data.
+            end (str | None, optional): Last day of the range. Defaults to None, the last day of the data.
+
+        Returns:
+            pd.Series: Measure for each bucket, indexed by the start of the bucket.
+        """
+        first, last = self._day_span(start, end)
+        cumulative = self.cumulative[measure]
+        if first == last:
+            return pd.Series([], index=pd.DatetimeIndex([]), dtype=cumulative.dtype)
+
+        days = self.days[first:last]
+        aligned = pd.Timestamp(days[0]).to_period(GRANULARITIES[granularity]["alias"]).start_time
+        starts = pd.date_range(aligned, days[-1], freq=GRANULARITIES[granularity]["rule"]).to_numpy()
+        # Day index at which each bucket starts within the range, plus the end of the range
+        bounds = self.day_bounds[np.append(np.maximum(np.searchsorted(self.days, starts), first), last)]
+
+        return pd.Series(cumulative[bounds[1:]] - cumulative[bounds[:-1]], index=pd.DatetimeIndex(starts))
+
+    def breakdown(self, dimension: str, measure: str, start: str|None=None, end: str|None=None) -> pd.Series:
+        """Total of a measure over a date range for each value of a dimension.
+
+        Args:
+            dimension (str): Name of the dimension.
+            measure (str): Measure to total - must be "orders", "items" or "revenue".
+            start (str | None, optional): First day of the range. Defaults to None, the first day of the data.
+            end (str | None, optional): Last day of the range. Defaults to None, the last day of the data.
+
+        Returns:
+            pd.Series: Total of the measure for each value of the dimension that has orders in the range.
+        """
+        first, last = self._day_span(start, end)
+        categories, cumulative = self.dimensions[dimension]
+        totals = pd.Series(cumulative[measure][last] - cumulative[measure][first], index=categories)
+        if first == last:
+            return totals.iloc[:0]
+
+        orders = cumulative["orders"][last] - cumulative["orders"][first]
+
+        return totals[orders > 0]
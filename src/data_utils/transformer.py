@@ -1,27 +1,268 @@
+import io
+import os
 import sys
+import glob
 import json
+import hashlib
 import logging
+import calendar
+import importlib.util
+from typing import Any, Callable
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
+from pandas.tseries.api import guess_datetime_format
 
 sys.path.append("./")
 from src.data_utils.generator import DataGenerator
+from src.data_utils.cache import CACHE_DIR, CACHE_VERSION, file_fingerprint, file_lock, load_cached, save_cached
+from src.data_utils.incremental import IncrementalStore, tail_hash
+from src.data_utils.profiler import StageProfiler
+from src.data_utils.quantile_sketch import sketch_frame
+
+
+COLUMN_KEYS = ["SALE_DATE", "QUANTITY", "PRICE", "PAID_DATE", "POSTED_DATE", "COUNTRY", "DELIVERY_COST"]
+DATE_KEYS = ["SALE_DATE", "PAID_DATE", "POSTED_DATE"]
+MONEY_KEYS = ["PRICE", "DELIVERY_COST"]
+MONTHS = list(calendar.month_name)[1:]
+WEEKDAYS = list(calendar.day_name)
+# Rows sampled from a data file to estimate the memory of each row when streaming it
+SAMPLE_ROWS = 10_000
+# Peak memory of transforming a chunk, relative to the memory of the raw chunk (the added columns and intermediate copies)
+TRANSFORM_OVERHEAD = 4
+# CSV files are parsed with the multi-threaded pyarrow engine if pyarrow is installed
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") is not None else "c"
+# Randomly generated data is saved to (and reused from) this file, see load_file
+SAMPLE_PATH = "src/data/sample_data.csv"
 
 
 class DataTransformer:
-    """Class that loads a data file from src/data/, based on the filename in config.json, that can apply various methods to standardise the data. If there is no filename specified, data will be randomly generated. 
+    """Class that loads a data file from src/data/, based on the filename in config.json, that can apply various methods to standardise the data. If there is no filename specified, data will be randomly generated - once, and then reused from src/data/sample_data.csv until that file is deleted.
+
+    The filename can also be a glob pattern (e.g. "monthly/orders_*"), or a list of filenames and patterns, to load several data files - which are then loaded and transformed in parallel, across "WORKERS" processes (config.json, all CPUs if null). A list entry can be an object with a "FILENAME" and any of the column names, for files whose column names differ from the rest.
+
+    If "CACHE" is enabled in config.json, the transformed data is cached in src/data/.cache/ and reused, memory-mapped, for as long as the data file and its column mapping are unchanged - in which case the data is already transformed once instantiated.
+
+    If "COMPACT" is enabled in config.json, the transformed data uses a compact schema (see _compact_schema), and memory_report holds the bytes saved per column.
+
+    If "ROLLUP" is enabled in config.json, a rollup of the transformed data is built alongside it (see _build_rollup), which DataExtractor can answer every KPI and chart from - along with sketches of the dispatch times, order values and items per order (see _build_sketches), which it answers the percentiles from.
+
+    If "STREAMING" is enabled in config.json, the data files are streamed rather than loaded (see _stream_sources) - only the rollup and sketches are kept, df is None, and the memory used stays within "STREAM_MEMORY_MB" (config.json), so data files larger than the available memory can be served. The data is then already transformed once instantiated.
+
+    If "INCREMENTAL_FILES" is set in config.json, to a glob pattern (relative to src/data/) of exports that are added next to the data file over time, the data is ingested incrementally (see _ingest_incremental) - only files and appended rows that have not been ingested before are read and transformed. The data is then already transformed once instantiated.
+
+    If a profiler is given, every stage of loading and transforming the data is profiled with it (see StageProfiler), e.g. to find which stage a slow data file spends its time in.
+
+    Args:
+        df (pd.DataFrame | None, optional): Raw data to transform instead of the configured data file. Defaults to None.
+        config (dict | None, optional): Configuration to use instead of config.json. Defaults to None.
+        profiler (StageProfiler | None, optional): Profiler to record the stages with. Defaults to None.
     """
-    def __init__(self) -> None:
+    def __init__(self, df: pd.DataFrame|None=None, config: dict|None=None, profiler: StageProfiler|None=None) -> None:
+        self.profiler = profiler
         self.random = False
+        self.transformed = False
+        self.fingerprint = None
+        self.memory_report = None
+        self.rollup = None
+        self.sketches = None
+        self.cached = False
+        self.cached_rollup = False
+        self.cached_sketches = False
+
+        self.config = config if config is not None else json.load(open("config.json"))
+        self.compact = bool(self.config.get("COMPACT"))
+        self.streaming = bool(self.config.get("STREAMING")) and df is None and self.config["FILENAME"] is not None
+        self.use_rollup = bool(self.config.get("ROLLUP")) or self.streaming
+        if df is not None:
+            self.df = df
+            return
+        if self.streaming:
+            self.df = None
+            self.transformed = True
+            if self.config.get("CACHE"):
+                self.fingerprint = self._stage("fingerprint", self._fingerprint)
+                self.rollup = self._stage(
+                    "load_cached:rollup", lambda: load_cached(f"{self._cache_name()}.rollup", self.fingerprint)
+                )
+                self.cached_rollup = self.rollup is not None
+                self.sketches = self._stage(
+                    "load_cached:sketches", lambda: load_cached(f"{self._cache_name()}.sketches", self.fingerprint)
+                )
+                self.cached_sketches = self.sketches is not None
+            if self.rollup is None or self.sketches is None:
+                self._stage("_stream_sources", self._stream_sources)
+            return
+        if self.config.get("INCREMENTAL_FILES") and self.config["FILENAME"] is not None:
+            self._stage("_ingest_incremental", self._ingest_incremental)
+            return
+        if self.config.get("CACHE") and self.config["FILENAME"] is not None:
+            self.fingerprint = self._stage("fingerprint", self._fingerprint)
+            cached_df = self._stage("load_cached", lambda: load_cached(self._cache_name(), self.fingerprint))
+            if cached_df is not None:
+                self.df = cached_df
+                self.transformed = True
+                self.cached = True
+                if self.use_rollup:
+                    self.rollup = self._stage(
+                        "load_cached:rollup", lambda: load_cached(f"{self._cache_name()}.rollup", self.fingerprint)
+                    )
+                    self.cached_rollup = self.rollup is not None
+                    self.sketches = self._stage(
+                        "load_cached:sketches", lambda: load_cached(f"{self._cache_name()}.sketches", self.fingerprint)
+                    )
+                    self.cached_sketches = self.sketches is not None
+                return
 
-        self.config = json.load(open("config.json"))
         self.df = self.load_file()
 
+    def _stage(self, name: str, stage: Callable[[], Any], rows: Callable[[], int|None]|None=None) -> Any:
+        """Runs a stage of loading or transforming the data, profiling it if a profiler was given.
+
+        Args:
+            name (str): Name of the stage.
+            stage (Callable[[], Any]): Function that runs the stage.
+            rows (Callable[[], int | None] | None, optional): Function that counts the rows going into the stage. Defaults to None, for the rows of df (if it is loaded).
+
+        Returns:
+            Any: Result of the stage.
+        """
+        if self.profiler is None:
+            return stage()
+
+        return self.profiler.run(name, stage, rows or self._rows)
+
+    def _rows(self) -> int|None:
+        """Number of rows of df.
+
+        Returns:
+            int | None: Number of rows, None if no data is loaded.
+        """
+        df = getattr(self, "df", None)
+        return df.shape[0] if df is not None else None
+
+    def _column_mapping(self) -> dict:
+        """Column names of the data file, as configured in config.json.
+
+        Returns:
+            dict: Configured column name for each column key.
+        """
+        return {key: self.config.get(key) for key in COLUMN_KEYS}
+
+    @staticmethod
+    def _match_files(name: str) -> list:
+        """Finds the data files, in src/data/, of a configured filename. The filename can have its extension left out, in which case the .csv file is used if there is both a .csv and .xlsx file, and can be a glob pattern.
+
+        Args:
+            name (str): Configured filename or pattern.
+
+        Returns:
+            list: Paths of the matching data files, sorted.
+        """
+        if name.endswith((".csv", ".xlsx")):
+            candidates = [f"src/data/{name}"]
+        else:
+            candidates = [f"src/data/{name}.csv", f"src/data/{name}.xlsx"]
+
+        paths = {}
+        for candidate in candidates:
+            matches = glob.glob(candidate) if glob.has_magic(candidate) else [candidate]
+            for path in filter(os.path.isfile, matches):
+                paths.setdefault(os.path.splitext(path)[0], path)
+
+        return sorted(paths.values())
+
+    def _sources(self) -> list:
+        """Data files of the configured filename(s), with the column names of each that differ from the configured ones.
+
+        Returns:
+            list: Path and column name overrides of each data file, empty if the data is randomly generated.
+        """
+        return self._config_sources(self.config)
+
+    @staticmethod
+    def _config_sources(config: dict) -> list:
+        """Data files of the filename(s) of a configuration, with the column names of each that differ from the configured ones.
+
+        Args:
+            config (dict): Configuration, as in config.json.
+
+        Returns:
+            list: Path and column name overrides of each data file, empty if the data is randomly generated.
+        """
+        filenames = config["FILENAME"]
+        if filenames is None:
+            return []
+
+        sources = {}
+        for entry in (filenames if isinstance(filenames, list) else [filenames]):
+            name = entry["FILENAME"] if isinstance(entry, dict) else entry
+            overrides = {key: value for key, value in entry.items() if key in COLUMN_KEYS} if isinstance(entry, dict) else {}
+            paths = DataTransformer._match_files(name)
+            if not paths:
+                raise FileNotFoundError(f"File {name} is not .csv or .xlsx format, or does not exist.")
+            for path in paths:
+                sources.setdefault(path, overrides)
+
+        return list(sources.items())
+
+    def _cache_name(self) -> str:
+        """Name the data of the configured filename(s) is cached under.
+
+        Returns:
+            str: Cache name.
+        """
+        filenames = self.config["FILENAME"]
+        if isinstance(filenames, str) and not glob.has_magic(filenames):
+            return filenames
+
+        return "sources-" + hashlib.blake2b(json.dumps(filenames).encode(), digest_size=8).hexdigest()
+
+    def _fingerprint(self) -> str:
+        """Fingerprints every configured data file, together with the settings it is transformed with, see file_fingerprint.
+
+        Returns:
+            str: Hex digest that identifies the data files and settings.
+        """
+        settings = {**self._column_mapping(), "COMPACT": self.compact, "DATE_FORMAT": self.config.get("DATE_FORMAT")}
+        fingerprints = [file_fingerprint(path, {**settings, **overrides}) for path, overrides in self._sources()]
+        if len(fingerprints) == 1:
+            return fingerprints[0]
+
+        return hashlib.blake2b("".join(fingerprints).encode(), digest_size=16).hexdigest()
+
+    def source_paths(self) -> list:
+        """Paths of every configured data file - including, with incremental ingestion, the exports added next to them.
+
+        Returns:
+            list: Paths of the data files, empty if the data is randomly generated.
+        """
+        return self.config_source_paths(self.config)
+
+    @staticmethod
+    def config_source_paths(config: dict) -> list:
+        """Paths of every data file of a configuration, see source_paths. Nothing is loaded, so this is cheap enough to check a configuration before loading its data.
+
+        Args:
+            config (dict): Configuration, as in config.json.
+
+        Returns:
+            list: Paths of the data files, empty if the data is randomly generated.
+        """
+        paths = [path for path, _ in DataTransformer._config_sources(config)]
+        if paths and config.get("INCREMENTAL_FILES"):
+            exports = sorted(glob.glob(os.path.join("src/data", config["INCREMENTAL_FILES"])))
+            paths += [path for path in exports if path not in paths]
+
+        return paths
+
     def _limit_columns(self) -> None:
         """Limits the columns only to columns that are used.
         """
         if not self.random:
-            columns = list(self.config.values())[1:]
+            columns = [column for column in self._column_mapping().values() if column is not None]
             self.df = self.df[columns]
 
     def _normalise_column_names(self) -> None:
@@ -43,23 +284,228 @@ class DataTransformer:
         self.df["days_to_dispatch"] = (self.df["post_date"] - self.df["date"]).dt.days
 
     def _decompose_sale_date(self) -> None:
-        """Decomposes the sale date into year, month and day.
+        """Decomposes the sale date into year, month and day. With the compact schema, the month and weekday are categoricals in calendar order, built from the month and weekday numbers rather than formatting every date as a string.
         """
         self.df["year"] = self.df["date"].dt.year
-        self.df["month"] = self.df["date"].dt.strftime("%B")
-        self.df["weekday"] = self.df["date"].dt.strftime("%A")
+        if self.compact:
+            self.df["month"] = pd.Categorical.from_codes(
+                self.df["date"].dt.month.to_numpy() - 1, categories=MONTHS, ordered=True
+            )
+            self.df["weekday"] = pd.Categorical.from_codes(
+                self.df["date"].dt.weekday.to_numpy(), categories=WEEKDAYS, ordered=True
+            )
+        else:
+            self.df["month"] = self.df["date"].dt.strftime("%B")
+            self.df["weekday"] = self.df["date"].dt.strftime("%A")
         self.df["day"] = self.df["date"].dt.day
+
+    def _compact_schema(self) -> None:
+        """Narrows the dtypes of the dataframe when the compact schema is enabled, and records the bytes saved per column in memory_report. Countries are dictionary encoded as a categorical, and quantity, year, day and days_to_dispatch are stored as the narrowest integers that hold them.
+
+        Money columns (price and delivery_cost) are deliberately kept as float64. float32 only holds ~7 significant digits, so summing millions of prices would be off by whole currency units, and the revenue figures are what the dashboard is for.
+        """
+        if not self.compact:
+            return
+
+        before = {}
+        for column in ["month", "weekday"]:
+            # Bytes of the strftime strings these categoricals replace, as counted by memory_usage(deep=True)
+            counts = self.df[column].value_counts()
+            string_bytes = sum(count * sys.getsizeof(name) for name, count in counts.items())
+            before[column] = self.df.shape[0] * np.dtype(object).itemsize + string_bytes
+        for column in ["country", "quantity", "year", "day", "days_to_dispatch"]:
+            before[column] = self.df[column].memory_usage(index=False, deep=True)
+
+        self.df["country"] = self.df["country"].astype("category")
+        self.df["quantity"] = pd.to_numeric(self.df["quantity"], downcast="integer")
+        self.df["year"] = self.df["year"].astype(np.int16)
+        self.df["day"] = self.df["day"].astype(np.int8)
+        self.df["days_to_dispatch"] = pd.to_numeric(self.df["days_to_dispatch"], downcast="integer")
+
+        after = {column: self.df[column].memory_usage(index=False, deep=True) for column in before}
+        report = pd.DataFrame({"before": before, "after": after})
+        report.loc["total"] = report.sum()
+        report["saved"] = report["before"] - report["after"]
+        self.memory_report = report
     
+    @staticmethod
+    def _rollup_of(df: pd.DataFrame) -> pd.DataFrame:
+        """Rolls up a transformed dataframe - the number of orders, items and revenue for every combination of sale day, country, paid/free delivery and days to dispatch, along with the weekday and month of each day. Its size depends on the number of these combinations rather than the number of orders.
+
+        Args:
+            df (pd.DataFrame): Transformed dataframe.
+
+        Returns:
+            pd.DataFrame: Rollup of the dataframe.
+        """
+        dimensions = {
+            "date": df["date"].dt.normalize(),
+            "country": df["country"],
+            "paid": df["delivery_cost"].ne(0),
+            "days_to_dispatch": df["days_to_dispatch"]
+        }
+        measures = pd.DataFrame({
+            "orders": 1,
+            "items": df["quantity"],
+            "revenue": df["price"]
+        }, index=df.index)
+
+        rollup = measures.groupby(
+            list(dimensions.values()), observed=True, dropna=False, sort=True
+        ).sum().reset_index()
+        rollup.columns = list(dimensions.keys()) + list(measures.columns)
+
+        return DataTransformer._add_calendar_columns(rollup)
+
+    @staticmethod
+    def _empty_frame() -> pd.DataFrame:
+        """Transformed dataframe without any rows, with the columns that the rollup and sketches are built from - so that data without any orders (e.g. a stream of empty chunks) has an empty rollup and sketch frame, rather than none.
+
+        Returns:
+            pd.DataFrame: Empty transformed dataframe.
+        """
+        return pd.DataFrame({
+            "date": pd.Series(dtype="datetime64[ns]"),
+            "country": pd.Series(dtype=object),
+            "delivery_cost": pd.Series(dtype=np.float64),
+            "days_to_dispatch": pd.Series(dtype=np.float64),
+            "quantity": pd.Series(dtype=np.int64),
+            "price": pd.Series(dtype=np.float64)
+        })
+
+    @staticmethod
+    def _add_calendar_columns(rollup: pd.DataFrame) -> pd.DataFrame:
+        """Adds the month and weekday of each day of a rollup.
+
+        Args:
+            rollup (pd.DataFrame): Rollup without the month and weekday.
+
+        Returns:
+            pd.DataFrame: Rollup with the month and weekday.
+        """
+        rollup["month"] = pd.Categorical.from_codes(
+            rollup["date"].dt.month.to_numpy() - 1, categories=MONTHS, ordered=True
+        )
+        rollup["weekday"] = pd.Categorical.from_codes(
+            rollup["date"].dt.weekday.to_numpy(), categories=WEEKDAYS, ordered=True
+        )
+
+        return rollup
+
+    @staticmethod
+    def merge_rollups(rollups: list) -> pd.DataFrame:
+        """Merges the rollups of separate parts of the data into the rollup of all of the data. Costs time proportional to the size of the rollups, not the number of orders. The countries of the merged rollup are a categorical, with the union of the countries of the rollups.
+
+        Args:
+            rollups (list): Rollups to merge, None for a part without one.
+
+        Returns:
+            pd.DataFrame: Merged rollup, empty if there are no rollups to merge.
+        """
+        rollups = [rollup for rollup in rollups if rollup is not None]
+        if not rollups:
+            return DataTransformer._rollup_of(DataTransformer._empty_frame())
+        if len(rollups) == 1:
+            return rollups[0]
+
+        dimensions = ["date", "country", "paid", "days_to_dispatch"]
+        rollups = [
+            part if isinstance(part["country"].dtype, pd.CategoricalDtype)
+            else part.assign(country=part["country"].astype("category"))
+            for part in rollups
+        ]
+        rollup = DataTransformer.concat_frames(rollups).groupby(
+            dimensions, observed=True, dropna=False, sort=True
+        )[["orders", "items", "revenue"]].sum().reset_index()
+
+        return DataTransformer._add_calendar_columns(rollup)
+
+    @staticmethod
+    def merge_sketches(frames: list) -> pd.DataFrame:
+        """Merges the sketch frames of separate parts of the data (see quantile_sketch.sketch_frame) into the sketch frame of all of it, by adding up the counts of each bucket - so, unlike the percentiles of the parts, they merge exactly. Costs time proportional to the size of the sketch frames, not the number of orders.
+
+        Args:
+            frames (list): Sketch frames to merge, None for a part without one.
+
+        Returns:
+            pd.DataFrame: Merged sketch frame, empty if there are no sketch frames to merge.
+        """
+        frames = [frame for frame in frames if frame is not None]
+        if not frames:
+            return sketch_frame(DataTransformer._empty_frame())
+        if len(frames) == 1:
+            return frames[0]
+
+        return DataTransformer.concat_frames(frames).groupby(
+            ["month", "country", "paid", "measure", "key"], observed=True, dropna=False, sort=True
+        )["count"].sum().reset_index()
+
+    @staticmethod
+    def concat_frames(frames: list) -> pd.DataFrame:
+        """Concatenates transformed dataframes. Categorical columns whose categories differ between the dataframes (e.g. the countries with the compact schema) stay categorical, with the union of the categories.
+
+        Args:
+            frames (list): Transformed dataframes.
+
+        Returns:
+            pd.DataFrame: Concatenated dataframe, a dataframe without columns if there are no dataframes.
+        """
+        if not frames:
+            return pd.DataFrame()
+        if len(frames) == 1:
+            return frames[0]
+
+        df = pd.concat(frames, ignore_index=True)
+        for column in frames[0].columns:
+            dtypes = [frame[column].dtype for frame in frames]
+            if isinstance(dtypes[0], pd.CategoricalDtype) and any(dtype != dtypes[0] for dtype in dtypes):
+                df[column] = union_categoricals([frame[column] for frame in frames])
+
+        return df
+
+    def _build_rollup(self) -> None:
+        """Builds the rollup of the transformed dataframe, see _rollup_of.
+        """
+        self.rollup = self._rollup_of(self.df)
+
+    def _build_sketches(self) -> None:
+        """Builds the sketch frame of the transformed dataframe, see quantile_sketch.sketch_frame.
+        """
+        self.sketches = sketch_frame(self.df)
+
     def apply_transformations(self) -> None:
-        """Applies all transformation methods to the instantiated dataframe.
+        """Applies all transformation methods to the instantiated dataframe, and builds the rollup and sketches if the rollup is enabled, caching the results if caching is enabled. Steps that are already done (e.g. loaded from the cache) are skipped.
         """
-        self._limit_columns()
-        self._normalise_column_names()
-        self._decompose_sale_date()
-        self._time_to_dispatch()
+        if not self.transformed:
+            self._stage("_limit_columns", self._limit_columns)
+            self._stage("_normalise_column_names", self._normalise_column_names)
+            self._stage("_decompose_sale_date", self._decompose_sale_date)
+            self._stage("_time_to_dispatch", self._time_to_dispatch)
+            self._stage("_compact_schema", self._compact_schema)
+            self.transformed = True
+
+        if self.use_rollup and self.rollup is None:
+            self._stage("_build_rollup", self._build_rollup)
+        if self.use_rollup and self.sketches is None:
+            self._stage("_build_sketches", self._build_sketches)
+
+        if self.fingerprint is not None:
+            if self.df is not None and not self.cached:
+                self._stage("save_cached", lambda: save_cached(self.df, self._cache_name(), self.fingerprint))
+                self.cached = True
+            if self.rollup is not None and not self.cached_rollup:
+                self._stage(
+                    "save_cached:rollup", lambda: save_cached(self.rollup, f"{self._cache_name()}.rollup", self.fingerprint)
+                )
+                self.cached_rollup = True
+            if self.sketches is not None and not self.cached_sketches:
+                self._stage(
+                    "save_cached:sketches", lambda: save_cached(self.sketches, f"{self._cache_name()}.sketches", self.fingerprint)
+                )
+                self.cached_sketches = True
 
     def load_file(self) -> pd.DataFrame:
-        """Loads the data using the filename from the config.json file (.csv or .xlsx format), or randomly generates data using a generator and saves it as 'sample_data' in src/data/.
+        """Loads the data using the filename from the config.json file (.csv or .xlsx format), or randomly generates data using a generator and saves it as 'sample_data' in src/data/. Generated data that was saved before is reused rather than generated again.
 
         Returns:
             pd.DataFrame: Data in the form of a pandas dataframe.
@@ -67,29 +513,348 @@ class DataTransformer:
         filename = self.config["FILENAME"]
         # User data
         if filename is not None:
-            try:
-                df = pd.read_csv(f"src/data/{filename}.csv")
-            except:
-                try:
-                    df = pd.read_excel(f"src/data/{filename}.xlsx")
-                except Exception as e:
-                    logging.error(f"File {filename} is not .csv or .xlsx format, or does not exist. Error: {e}")
+            sources = self._sources()
+            if len(sources) > 1:
+                return self._stage("load_file:load_sources", lambda: self._load_sources(sources))
+
+            path, overrides = sources[0]
+            self.config = {**self.config, **overrides}
+            raw = self._stage("load_file:read", lambda: self._read_raw(path, self.config))
+            return self._stage(
+                "load_file:parse_dates", lambda: self._parse_read_dates(raw, self.config), rows=lambda: raw.shape[0]
+            )
         # Randomly generated data
+        elif os.path.isfile(SAMPLE_PATH):
+            df = self._stage("load_file:read_sample", lambda: pd.read_csv(SAMPLE_PATH))
+            self.random = True
         else:
             generator = DataGenerator(start="2023-01-01", end="2023-12-31")
-            df = generator.generate_n_rows(rows=1000)
+            df = self._stage("load_file:generate", lambda: generator.generate_n_rows(rows=1000))
             generator.save_csv(df, filename="sample_data")
 
             self.random = True
             
 
+        return self._stage("load_file:parse_dates", lambda: self._parse_dates(df), rows=lambda: df.shape[0])
+
+    def _load_sources(self, sources: list) -> pd.DataFrame:
+        """Loads and transforms several data files in parallel, across a process pool, and concatenates the transformed data in the order of the files. Each file is transformed with its own column names. If the rollup is enabled, each process also rolls up and sketches its file, and the rollups and sketches are merged.
+
+        Args:
+            sources (list): Path and column name overrides of each data file.
+
+        Returns:
+            pd.DataFrame: Transformed data of all of the files.
+        """
+        configs = [{**self.config, **overrides} for _, overrides in sources]
+        with ProcessPoolExecutor(max_workers=self.config.get("WORKERS")) as executor:
+            frames, rollups, sketches = zip(*executor.map(_load_source, [path for path, _ in sources], configs))
+
+        self.transformed = True
+        if self.use_rollup:
+            self.rollup = self.merge_rollups(list(rollups))
+            self.sketches = self.merge_sketches(list(sketches))
+
+        return self.concat_frames(list(frames))
+
+    def _stream_sources(self) -> None:
+        """Streams every data file through the transformations in chunks, and folds the rollup and sketches of each chunk (see _rollup_of and _build_sketches) into those of all of the data, without ever holding more than one chunk of rows. The rollups and sketches of the chunks are merged whenever they take up a quarter of "STREAM_MEMORY_MB", and each chunk is sized to take up at most half of it once transformed. The files are streamed one after another, so the memory ceiling holds for the whole load.
+
+        The merged rollup itself must fit in memory - its size depends on the number of distinct (date, country, delivery type, days to dispatch) combinations rather than the number of orders.
+        """
+        memory_bytes = self.config.get("STREAM_MEMORY_MB", 256) * 1024**2
+        rollup, partials, partial_bytes = None, [], 0
+        sketches, partial_sketches = None, []
+
+        for path, overrides in self._sources():
+            # Only the rollups of the chunks are kept, so the chunks are transformed with the (cheaper to build) compact schema
+            config = {**self.config, **overrides, "COMPACT": True, "ROLLUP": True, "STREAMING": False}
+            for chunk in self._read_chunks(path, config, memory_bytes // 2):
+                transformer = DataTransformer(df=chunk, config=config)
+                transformer.apply_transformations()
+                partials.append(transformer.rollup)
+                partial_sketches.append(transformer.sketches)
+                partial_bytes += transformer.rollup.memory_usage(index=False, deep=True).sum()
+                partial_bytes += transformer.sketches.memory_usage(index=False, deep=True).sum()
+
+                if partial_bytes > memory_bytes // 4:
+                    rollup = self.merge_rollups([rollup] + partials)
+                    sketches = self.merge_sketches([sketches] + partial_sketches)
+                    partials, partial_sketches, partial_bytes = [], [], 0
+
+        self.rollup = self.merge_rollups([rollup] + partials)
+        self.sketches = self.merge_sketches([sketches] + partial_sketches)
+
+    @staticmethod
+    def _read_chunks(path: str, config: dict, chunk_bytes: int):
+        """Reads a data file, see _read_file, in chunks of rows that take up at most chunk_bytes once transformed, estimated from the memory of the first SAMPLE_ROWS rows. CSV files are read with the "c" engine, as the pyarrow engine cannot read in chunks, and .xlsx files cannot be read in chunks at all, and are read whole.
+
+        Args:
+            path (str): Path of the data file.
+            config (dict): Configuration the data file is read with.
+            chunk_bytes (int): Maximum memory of a transformed chunk.
+
+        Yields:
+            pd.DataFrame: Raw data of each chunk, with parsed dates.
+        """
+        if not path.endswith(".csv"):
+            yield DataTransformer._read_file(path, config)
+            return
+
+        options = DataTransformer._read_options(config)
+        sample = pd.read_csv(path, nrows=SAMPLE_ROWS, **options)
+        row_bytes = sample.memory_usage(index=False, deep=True).sum() / max(sample.shape[0], 1)
+        chunk_rows = max(int(chunk_bytes / (row_bytes * TRANSFORM_OVERHEAD)), 1)
+
+        with pd.read_csv(path, chunksize=chunk_rows, **options) as reader:
+            for chunk in reader:
+                yield DataTransformer._parse_read_dates(chunk, config)
+
+    @staticmethod
+    def _read_file(path: str, config: dict) -> pd.DataFrame:
+        """Reads a .csv or .xlsx data file, with the reader chosen by its extension. Only the columns mapped in the configuration are parsed, see _read_options, and the dates are parsed as they are read, see _parse_read_dates.
+
+        Args:
+            path (str): Path of the data file.
+            config (dict): Configuration the data file is read with.
+
+        Returns:
+            pd.DataFrame: Raw data of the file, with parsed dates.
+        """
+        return DataTransformer._parse_read_dates(DataTransformer._read_raw(path, config), config)
+
+    @staticmethod
+    def _read_raw(path: str, config: dict) -> pd.DataFrame:
+        """Reads a .csv or .xlsx data file like _read_file, but leaves the dates unparsed.
+
+        Args:
+            path (str): Path of the data file.
+            config (dict): Configuration the data file is read with.
+
+        Returns:
+            pd.DataFrame: Raw data of the file, with the dates as categoricals.
+        """
+        if path.endswith(".csv"):
+            return pd.read_csv(path, engine=CSV_ENGINE, **DataTransformer._read_options(config))
+
+        return pd.read_excel(path, **DataTransformer._read_options(config))
+
+    @staticmethod
+    def _read_options(config: dict) -> dict:
+        """Reader options for the columns mapped in a configuration. The money columns are declared as floats, and the date columns are read as categoricals - dates repeat across many orders, so each distinct date is then parsed only once.
+
+        Args:
+            config (dict): Configuration the data is read with.
+
+        Returns:
+            dict: usecols and dtype keyword arguments of pd.read_csv and pd.read_excel.
+        """
+        dtypes = {config[key]: np.float64 for key in MONEY_KEYS if config.get(key) is not None}
+        dtypes.update({config[key]: "category" for key in DATE_KEYS if config.get(key) is not None})
+
+        return {"usecols": [config[key] for key in COLUMN_KEYS if config.get(key) is not None], "dtype": dtypes}
+
+    @staticmethod
+    def _parse_read_dates(df: pd.DataFrame, config: dict) -> pd.DataFrame:
+        """Parses the mapped date columns of data read with _read_options. Only the distinct dates of each column are parsed, with the "DATE_FORMAT" of the configuration or else the format detected from them (see _detect_date_format), and then expanded to every row.
+
+        Args:
+            df (pd.DataFrame): Raw data.
+            config (dict): Configuration the data was read with.
+
+        Returns:
+            pd.DataFrame: Raw data with parsed dates.
+        """
+        for column in [config[key] for key in DATE_KEYS if config.get(key) is not None]:
+            if pd.api.types.is_datetime64_any_dtype(df[column]):
+                continue
+
+            values = df[column].astype("category")
+            categories = values.cat.categories
+            date_format = config.get("DATE_FORMAT") or DataTransformer._detect_date_format(categories)
+            # Missing dates have the code -1, which picks the trailing NaT
+            dates = np.append(
+                pd.to_datetime(categories, format=date_format).to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns")
+            )
+            df[column] = dates[values.cat.codes.to_numpy()]
+
+        return df
+
+    @staticmethod
+    def _detect_date_format(values: pd.Index) -> str|None:
+        """Detects the format of dates, guessed from the first date. A format is only detected if every date matches it - month first formats are tried before day first ones, as pd.to_datetime does.
+
+        Args:
+            values (pd.Index): Distinct dates, as strings.
+
+        Returns:
+            str | None: Format of the dates, None if none was detected.
+        """
+        if values.empty:
+            return None
+
+        for dayfirst in [False, True]:
+            date_format = guess_datetime_format(str(values[0]), dayfirst=dayfirst)
+            if date_format is not None and pd.to_datetime(values, format=date_format, errors="coerce").notna().all():
+                return date_format
+
+        return None
+
+    @staticmethod
+    def _parse_dates(df: pd.DataFrame) -> pd.DataFrame:
+        """Parses every column with "date" in its name as dates.
+
+        Args:
+            df (pd.DataFrame): Raw data.
+
+        Returns:
+            pd.DataFrame: Raw data with parsed dates.
+        """
         date_columns = list(filter(lambda x: "date" in x.lower(), df.columns))
         df[date_columns] = df[date_columns].apply(pd.to_datetime)
 
         return df
+
+    @staticmethod
+    def _read_csv_bytes(path: str, start: int, end: int, config: dict) -> tuple:
+        """Reads the complete rows between two byte offsets of a CSV file, using the header of the file, see _read_file. A trailing incomplete row (e.g. one that is still being written) is left out - unless the rows are read up to the end of the file, as the last row of a file need not end with a newline.
+
+        Args:
+            path (str): Path of the CSV file.
+            start (int): Byte offset to start reading from - 0, or the end of a previously read row.
+            end (int): Byte offset to stop reading at.
+            config (dict): Configuration the CSV file is read with.
+
+        Returns:
+            tuple: Rows read, with parsed dates, and the byte offset of the end of the last complete row.
+        """
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+            size = os.fstat(f.fileno()).st_size
+        # The end of the file ends its last row, even without a newline
+        if end < size:
+            data = data[:data.rfind(b"\n") + 1]
+
+        options = DataTransformer._read_options(config)
+        if start == 0:
+            df = pd.read_csv(io.BytesIO(data), **options)
+        else:
+            df = pd.read_csv(io.BytesIO(data), header=None, names=pd.read_csv(path, nrows=0).columns, **options)
+
+        return DataTransformer._parse_read_dates(df, config), start + len(data)
+
+    def _ingest_incremental(self) -> None:
+        """Ingests the data file and the exports added next to it incrementally. Every file, and every range of rows appended to a CSV file, is read and transformed only once - the transformed rows are stored in src/data/.cache/ and reused, memory-mapped, along with the rollup and sketches if the rollup is enabled, which are merged with those of the new rows. A file that was changed other than by appending rows, or a change to the column mapping or schema, causes everything to be ingested again.
+
+        The store is locked while it is read and updated, so that processes that ingest at the same time (e.g. the data reloaders of the workers of a preforked server) take turns - the second then finds the rows ingested by the first, rather than ingesting them again.
+        """
+        settings = {
+            **self._column_mapping(), "COMPACT": self.compact, "DATE_FORMAT": self.config.get("DATE_FORMAT"), "VERSION": CACHE_VERSION,
+            "FILENAME": self.config["FILENAME"]
+        }
+        path = os.path.join(CACHE_DIR, f"{self._cache_name()}.incremental")
+        # The lock file is next to the store rather than in it, so that it outlives a reset of the store
+        with file_lock(f"{path}.lock"):
+            self._ingest_store(IncrementalStore(path, settings))
+
+    def _ingest_store(self, store: IncrementalStore) -> None:
+        """Ingests the data files into an incremental store, see _ingest_incremental. Must be called with the store locked.
+
+        Args:
+            store (IncrementalStore): Store of the ingested data.
+        """
+        overrides = dict(self._sources())
+        stored_rollup = store.load_rollup() if self.use_rollup else None
+        stored_sketches = store.load_sketches() if self.use_rollup else None
+        previous_segments = len(store.manifest["segments"])
+        new_rollups, new_sketches = [], []
+        changed = False
+
+        for path in self.source_paths():
+            stat = os.stat(path)
+            record = store.files.get(path)
+            if record is not None and (record["size"], record["mtime"]) == (stat.st_size, stat.st_mtime_ns):
+                continue
+
+            if record is None:
+                start_row, start_byte = 0, 0
+            elif (
+                path.endswith(".csv") and stat.st_size > record["size"]
+                and tail_hash(path, record["size"]) == record["tail"]
+            ):
+                start_row, start_byte = record["rows"], record["size"]
+            else:
+                logging.info(f"File {path} was rewritten, ingesting all files again.")
+                store.reset()
+                return self._ingest_store(store)
+
+            config = {**self.config, **overrides.get(path, {})}
+            if path.endswith(".csv"):
+                raw, end_byte = self._read_csv_bytes(path, start_byte, stat.st_size, config)
+            else:
+                raw, end_byte = self._read_file(path, config), stat.st_size
+
+            if raw.shape[0]:
+                transformer = DataTransformer(df=raw, config=config)
+                transformer.apply_transformations()
+                store.append_segment(transformer.df, path, start_row, start_row + raw.shape[0])
+                new_rollups.append(transformer.rollup)
+                new_sketches.append(transformer.sketches)
+
+            changed = True
+            store.files[path] = {
+                "rows": start_row + raw.shape[0],
+                "size": end_byte,
+                "mtime": stat.st_mtime_ns if end_byte == stat.st_size else None,
+                "tail": tail_hash(path, end_byte)
+            }
+
+        self.df = self.concat_frames(store.load_segments())
+        self.transformed = True
+
+        if self.use_rollup:
+            if stored_rollup is None and previous_segments:
+                # The rollup was enabled after some of the data was ingested
+                self._build_rollup()
+            else:
+                self.rollup = self.merge_rollups([stored_rollup] + new_rollups)
+            if new_rollups or stored_rollup is None:
+                store.save_rollup(self.rollup)
+                changed = True
+
+            if stored_sketches is None and previous_segments:
+                # The sketches were added after some of the data was ingested
+                self._build_sketches()
+            else:
+                self.sketches = self.merge_sketches([stored_sketches] + new_sketches)
+            if new_sketches or stored_sketches is None:
+                store.save_sketches(self.sketches)
+                changed = True
+
+        if changed:
+            store.save_manifest()
     
 
+def _load_source(path: str, config: dict) -> tuple:
+    """Loads and transforms a single data file. Runs inside the worker processes of DataTransformer._load_sources.
+
+    Args:
+        path (str): Path of the data file.
+        config (dict): Configuration to transform the data file with.
+
+    Returns:
+        tuple: Transformed data of the file, its rollup and its sketches (None if the rollup is disabled).
+    """
+    transformer = DataTransformer(df=DataTransformer._read_file(path, config), config=config)
+    transformer.apply_transformations()
+
+    return transformer.df, transformer.rollup, transformer.sketches
+
+
 if __name__ == "__main__":
     t = DataTransformer()
     t.apply_transformations()
-    print(t.df)
\ No newline at end of file
+    print(t.df if t.df is not None else t.rollup)
+    if t.memory_report is not None:
+        print(t.memory_report)
\ No newline at end of file
@@ -0,0 +1,97 @@
+import sys
+import threading
+
+import pytest
+from flask import Flask
+
+sys.path.append("./")
+from src.app.appdata import appdata
+from src.app.health import init_health
+
+
+@pytest.fixture
+def state(tmp_path, monkeypatch):
+    """Fresh loading state of the dashboard, in a temporary working directory with an empty config.json.
+    """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.json").write_text("{}")
+    monkeypatch.setattr(appdata, "_snapshot", None)
+    monkeypatch.setattr(appdata, "_warmer", None)
+    for event in ["_served", "_ready", "_failed"]:
+        monkeypatch.setattr(appdata, event, threading.Event())
+    monkeypatch.setattr(appdata, "_save_startup", lambda snapshot: None)
+
+
+def fail_to_load(config: dict|None=None) -> appdata.Snapshot:
+    raise FileNotFoundError("src/data/orders.csv")
+
+
+def loaded_snapshot(config: dict|None=None) -> appdata.Snapshot:
+    return appdata.Snapshot(
+        transformer="transformer", extractor="extractor", kpis=None, figure_cache=None, source_stat=(), fingerprint="loaded",
+        response_cache=None
+    )
+
+
+def startup_snapshot(config: dict) -> appdata.Snapshot:
+    return appdata.Snapshot(
+        transformer=appdata._Deferred("transformer"), extractor=appdata._Deferred("extractor"), kpis=None, figure_cache=None,
+        source_stat=(), fingerprint="startup", response_cache=None
+    )
+
+
+def health() -> tuple:
+    server = Flask(__name__)
+    init_health(server)
+    response = server.test_client().get("/health")
+
+    return response.status_code, response.get_json()["status"]
+
+
+def test_failed_load_is_not_ready(state, monkeypatch):
+    monkeypatch.setattr(appdata, "load_startup_snapshot", lambda config: None)
+    monkeypatch.setattr(appdata, "build_snapshot", fail_to_load)
+    appdata.warm_up().join()
+
+    assert not appdata.ready()
+    assert health() == (503, "error")
+
+    # The first use of the data loads it again
+    with pytest.raises(FileNotFoundError):
+        appdata.current()
+    monkeypatch.setattr(appdata, "build_snapshot", loaded_snapshot)
+    assert appdata.current().fingerprint == "loaded"
+    assert health() == (200, "ready")
+
+
+def test_failed_load_behind_startup_snapshot_is_retried(state, monkeypatch):
+    monkeypatch.setattr(appdata, "load_startup_snapshot", startup_snapshot)
+    monkeypatch.setattr(appdata, "build_snapshot", fail_to_load)
+    appdata.warm_up().join()
+    snapshot = appdata.current()
+
+    assert snapshot.fingerprint == "startup"
+    assert health() == (503, "error")
+    with pytest.raises(FileNotFoundError):
+        snapshot.transformer.config
+    monkeypatch.setattr(appdata, "build_snapshot", loaded_snapshot)
+    assert snapshot.transformer.upper() == "TRANSFORMER"
+    assert appdata.current().fingerprint == "loaded"
+    assert health() == (200, "ready")
+
+
+def test_reloader_outlives_failed_loads(state, monkeypatch):
+    monkeypatch.setattr(appdata, "build_snapshot", fail_to_load)
+    reloader = appdata.DataReloader(interval=0.01)
+    reloader.start()
+    try:
+        reloader._stop_event.wait(0.1)
+        assert reloader.is_alive()
+
+        monkeypatch.setattr(appdata, "build_snapshot", loaded_snapshot)
+        reloader._stop_event.wait(0.1)
+        assert reloader.is_alive()
+        assert appdata.ready()
+    finally:
+        reloader.stop()
+        reloader.join()
@@ -0,0 +1,97 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.append("./")
+from src.data_utils.transformer import DataTransformer
+
+
+HEADER = "date,quantity,price,post_date,country,delivery_cost\n"
+ROWS = [
+    "2023-01-02,1,10.0,2023-01-03,Germany,0.0",
+    "2023-01-03,2,20.0,2023-01-05,France,4.99",
+    "2023-01-04,3,30.0,2023-01-04,Spain,0.0",
+    "2023-01-05,4,40.0,2023-01-07,Italy,4.99"
+]
+CONFIG = {
+    "FILENAME": "orders",
+    "SALE_DATE": "date",
+    "QUANTITY": "quantity",
+    "PRICE": "price",
+    "PAID_DATE": None,
+    "POSTED_DATE": "post_date",
+    "COUNTRY": "country",
+    "DELIVERY_COST": "delivery_cost",
+    "DATE_FORMAT": None,
+    "CACHE": False,
+    "COMPACT": False,
+    "ROLLUP": True,
+    "INCREMENTAL_FILES": "exports/*.csv",
+    "STREAMING": False
+}
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Empty src/data/ in a temporary working directory, as the data and cache paths are relative to the repository root.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("src/data")
+
+    return tmp_path / "src" / "data"
+
+
+def ingest() -> DataTransformer:
+    transformer = DataTransformer(config=CONFIG)
+    transformer.apply_transformations()
+
+    return transformer
+
+
+def test_read_csv_bytes_keeps_last_row_without_newline(data_dir):
+    path = data_dir / "orders.csv"
+    path.write_text(HEADER + "\n".join(ROWS[:2]))
+
+    df, end = DataTransformer._read_csv_bytes(str(path), 0, path.stat().st_size, CONFIG)
+
+    assert df.shape[0] == 2
+    assert end == path.stat().st_size
+
+
+def test_read_csv_bytes_leaves_out_incomplete_row_before_end(data_dir):
+    path = data_dir / "orders.csv"
+    path.write_text(HEADER + "\n".join(ROWS[:2]))
+    partial_end = path.stat().st_size - 5
+
+    df, end = DataTransformer._read_csv_bytes(str(path), 0, partial_end, CONFIG)
+
+    assert df.shape[0] == 1
+    assert end == len(HEADER) + len(ROWS[0]) + 1
+
+
+def test_appended_row_without_newline_is_ingested_once(data_dir):
+    path = data_dir / "orders.csv"
+    path.write_text(HEADER + ROWS[0] + "\n")
+    assert ingest().df.shape[0] == 1
+
+    with open(path, "a") as f:
+        f.write(ROWS[1])
+    transformer = ingest()
+    assert transformer.df.shape[0] == 2
+    assert transformer.rollup["orders"].sum() == 2
+
+    # Nothing new, so nothing is ingested again
+    transformer = ingest()
+    assert transformer.df.shape[0] == 2
+    assert transformer.rollup["orders"].sum() == 2
+
+    with open(path, "a") as f:
+        f.write("\n" + "\n".join(ROWS[2:]) + "\n")
+    transformer = ingest()
+    assert sorted(transformer.df["quantity"]) == [1, 2, 3, 4]
+    assert transformer.rollup["orders"].sum() == 4
+    sketched_items = transformer.sketches[transformer.sketches["measure"] == "items"]["count"].sum()
+    assert sketched_items == 4
+    assert pd.Series(transformer.df["price"]).sum() == 100.0
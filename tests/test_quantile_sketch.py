@@ -0,0 +1,46 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append("./")
+from src.data_utils.quantile_sketch import EXACT_INTEGERS, KEYS, QuantileSketch, SketchIndex, sketch_frame, sketch_keys, sketch_values
+
+
+def test_whole_numbers_are_exact_up_to_limit():
+    values = np.arange(-EXACT_INTEGERS, EXACT_INTEGERS + 1)
+
+    assert np.array_equal(sketch_values(sketch_keys(values, integer=True), integer=True), values)
+
+
+def test_whole_numbers_beyond_limit_are_within_accuracy():
+    values = np.arange(EXACT_INTEGERS + 1, 100 * EXACT_INTEGERS)
+    keys = sketch_keys(values, integer=True)
+
+    assert np.all(np.diff(keys) >= 0)
+    assert keys[0] == EXACT_INTEGERS + 1 and sketch_keys([1e12], integer=True)[0] <= KEYS
+    assert np.max(np.abs(sketch_values(keys, integer=True) / values - 1)) <= 0.01
+
+
+def test_quantiles_of_whole_numbers_are_exact():
+    values = np.random.default_rng(0).geometric(0.02, 10000)
+    quantiles = [0.5, 0.9, 0.99]
+
+    sketched = QuantileSketch(integer=True).add(values).quantiles(quantiles)
+
+    assert np.array_equal(sketched, np.quantile(values, quantiles, method="lower"))
+
+
+def test_inverted_date_range_has_no_values():
+    dates = pd.to_datetime(["2023-01-05", "2023-02-10", "2023-04-10", "2023-04-20"])
+    df = pd.DataFrame({
+        "date": dates, "country": "France", "delivery_cost": 0.0, "days_to_dispatch": [1, 2, 3, 4], "quantity": [1, 2, 3, 4],
+        "price": [10.0, 20.0, 30.0, 40.0]
+    })
+    index = SketchIndex(sketch_frame(df))
+
+    for start, end in [("2023-04-10", "2023-01-05"), ("2023-04-20", "2023-04-10")]:
+        assert index.sketch("order_value", start=start, end=end).count == 0
+        countries, counts = index.country_sketches("items", start=start, end=end)
+        assert counts.sum() == 0
+    assert index.sketch("order_value", start="2023-04-10", end="2023-04-10").count == 2